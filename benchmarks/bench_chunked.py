@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# execute the in-memory query item by item or chunk by chunk:
+# `IterableQuery(items, chunk_size=?).where(...).select(...).where(...).to_list()`
+#
+# run: python -m benchmarks.bench_chunked
+# ----------
+
+import timeit
+
+from lquery.iterable import IterableQuery
+
+SIZE = 100000
+CHUNK_SIZES = [None, 1, 16, 256, 1024, 4096, 65536]
+
+def run_query(items, chunk_size):
+    return IterableQuery(items, chunk_size=chunk_size) \
+        .where(lambda x: x % 3 == 0) \
+        .select(lambda x: x * 2) \
+        .where(lambda x: x % 4 == 0) \
+        .to_list()
+
+def main():
+    items = list(range(SIZE))
+    sources = {
+        'list': lambda: items,
+        'iterator': lambda: iter(items),
+    }
+    expected = run_query(items, None)
+    print(f'items: {SIZE}')
+    print(f'{"source":>10}{"chunk size":>12}{"time (ms)":>12}{"per item (ns)":>16}')
+    for name, make_source in sources.items():
+        for chunk_size in CHUNK_SIZES:
+            assert run_query(make_source(), chunk_size) == expected
+            number = 5
+            cost = min(timeit.repeat(lambda: run_query(make_source(), chunk_size),
+                                     number=number, repeat=3)) / number
+            print(f'{name:>10}{str(chunk_size):>12}{cost * 1e3:>12.2f}{cost / SIZE * 1e9:>16.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# compare `ByteCodeEmitter` and `AstEmitter`:
+# the emission time and the speed of the generated functions.
+#
+# run: python -m benchmarks.bench_emitter
+# ----------
+
+import timeit
+
+from lquery.expr.builder import to_func_expr
+from lquery.expr import emitter, ast_emitter
+
+ITEMS = [1, 3, 5]
+ROW = {'a': 3, 'b': {'c': 'x'}, 's': 'abcd'}
+
+def get_cases():
+    limit = 2
+    return {
+        'compare': lambda x: x['a'] == 3,
+        'and': lambda x: x['a'] > 1 and x['a'] < 5 and x['s'] != 'x',
+        'deep-index': lambda x: 'c' in x['b'] and x['b']['c'] == 'x',
+        'repeated': lambda x: 'c' in x['b'] and x['b']['c'] != 'y' and x['b']['c'] < 'z',
+        'closure': lambda x: x['a'] > limit,
+        'reference': lambda x: x['a'] in ITEMS,
+        'call': lambda x: len(x['s']) + x['a'] * 2,
+    }
+
+def main():
+    emitters = [('bytecode', emitter.emit), ('ast', ast_emitter.emit)]
+    print(f'{"case":<12}{"emitter":<10}{"emit (us)":>12}{"call (ns)":>12}{"native (ns)":>14}')
+    for name, func in get_cases().items():
+        func_expr = to_func_expr(func)
+        native = timeit.timeit(lambda: func(ROW), number=100000) * 1e4
+        for emitter_name, emit in emitters:
+            emit_time = timeit.timeit(lambda: emit(func_expr), number=200) / 200 * 1e6
+            compiled_func = emit(func_expr)
+            call_time = timeit.timeit(lambda: compiled_func(ROW), number=100000) * 1e4
+            print(f'{name:<12}{emitter_name:<10}{emit_time:>12.1f}{call_time:>12.1f}{native:>14.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# sort the items from a generator in memory or by the external merge sort:
+# `IterableQuery(items, sort_budget=?).order_by(key).then_by(key)`
+#
+# the peak memory is measured by `tracemalloc`, which also slow down the queries.
+#
+# run: python -m benchmarks.bench_external_sort
+# ----------
+
+import random
+import time
+import tracemalloc
+
+from lquery.iterable import IterableQuery
+
+SIZE = 1000000
+BUDGETS = [None, 100000, 10000]
+
+def iter_rows():
+    rand = random.Random(0)
+    for i in range(SIZE):
+        yield (rand.randrange(1000), rand.random(), i)
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    cost = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, cost, peak
+
+def main():
+    print(f'items: {SIZE}')
+    print(f'{"budget":>10}{"query":>15}{"time (ms)":>12}{"peak (MB)":>12}')
+    expected = None
+    for budget in BUDGETS:
+        def make_query():
+            return IterableQuery(iter_rows(), sort_budget=budget) \
+                .order_by(lambda x: x[0]).then_by_descending(lambda x: x[1])
+        cases = [
+            # a checksum of the order, so the results are not kept in memory.
+            ('checksum', lambda: make_query().select(lambda x: x[2]).aggregate(
+                lambda a, b: (a * 31 + b) & 0xffffffff, 0)),
+            ('skip().take()', lambda: make_query().skip(10).take(10).to_list()),
+        ]
+        for name, run in cases:
+            result, cost, peak = measure(run)
+            if budget is None:
+                expected = expected or {}
+                expected[name] = result
+            assert result == expected[name]
+            print(f'{str(budget):>10}{name:>15}{cost * 1e3:>12.2f}{peak / 2 ** 20:>12.2f}')
+
+if __name__ == '__main__':
+    main()
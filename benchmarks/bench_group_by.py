@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# aggregate the groups of the in-memory items by `asq` or by the accumulators:
+# `IterableQuery(items).group_by(...).select(lambda g: (g.key, g.count(), g.sum(...)))`
+#
+# run: python -m benchmarks.bench_group_by
+# ----------
+
+import timeit
+import tracemalloc
+
+from asq import query
+
+from lquery.iterable import IterableQuery, GroupAggregateQuery
+
+SIZE = 1000000
+GROUPS = [10, 1000, 100000]
+
+def make_items(groups):
+    return ((i % groups, i) for i in range(SIZE))
+
+def get_key(item):
+    return item[0]
+
+def get_value(item):
+    return item[1]
+
+def aggregate(g):
+    return (g.key, g.count(), g.sum(get_value), g.max(get_value))
+
+def get_cases():
+    return {
+        'asq': lambda items: query(items).group_by(get_key).select(aggregate).to_list(),
+        'lquery': lambda items: IterableQuery(items).group_by(get_key).select(aggregate).to_list(),
+    }
+
+def main():
+    assert isinstance(IterableQuery([]).group_by(get_key).select(aggregate), GroupAggregateQuery)
+    print(f'items: {SIZE} (streamed)')
+    print(f'{"groups":>8}{"case":>10}{"time (ms)":>12}{"peak memory (MB)":>18}')
+    for groups in GROUPS:
+        expected = None
+        for name, func in get_cases().items():
+            tracemalloc.start()
+            result = func(make_items(groups))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            if expected is None:
+                expected = result
+            assert result == expected
+            cost = min(timeit.repeat(lambda: func(make_items(groups)), number=1, repeat=3))
+            print(f'{groups:>8}{name:>10}{cost * 1e3:>12.1f}{peak / 2 ** 20:>18.1f}')
+
+if __name__ == '__main__':
+    main()
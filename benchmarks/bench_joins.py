@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# join the in-memory items by `asq` or by the strategies which choosed by the planner:
+# `IterableQuery(outer).join(inner, ...).to_list()`
+#
+# the keys of the inner items are uniform or skewed (zipf like, most items have a few keys).
+#
+# run: python -m benchmarks.bench_joins
+# ----------
+
+import random
+import timeit
+
+from asq import query
+
+from lquery.iterable import IterableQuery
+
+OUTER_SIZES = [100, 10000, 100000]
+INNER_SIZE = 100000
+KEYS = 10000
+
+class Row:
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+def get_key(row):
+    return row.key
+
+def select_result(outer, inner):
+    return outer.value + inner.value
+
+def make_keys(distribution, size):
+    rand = random.Random(0)
+    if distribution == 'uniform':
+        return [rand.randrange(KEYS) for _ in range(size)]
+    # about half of the items have the key 0.
+    return [min(int(rand.paretovariate(1)) - 1, KEYS - 1) for _ in range(size)]
+
+def get_cases(outer, inner, indexed_inner, sorted_outer, sorted_inner):
+    return {
+        'asq': lambda: query(outer).join(inner, get_key, get_key, select_result),
+        'hash': lambda: IterableQuery(iter(outer)).join(IterableQuery(inner), get_key, get_key, select_result),
+        'hash-outer': lambda: IterableQuery(outer).join(iter(inner), get_key, get_key, select_result),
+        'merge': lambda: sorted_outer.order_by(get_key).join(
+            sorted_inner.order_by(get_key), get_key, get_key, select_result),
+        'index': lambda: IterableQuery(outer).join(indexed_inner, get_key, get_key, select_result),
+    }
+
+def main():
+    print(f'inner items: {INNER_SIZE}, keys: {KEYS}')
+    print(f'{"keys":>10}{"outer":>8}{"case":>12}{"strategy":>12}{"results":>10}{"time (ms)":>12}')
+    for distribution in ('uniform', 'skewed'):
+        inner = [Row(k, i) for i, k in enumerate(make_keys(distribution, INNER_SIZE))]
+        indexed_inner = IterableQuery(inner).index_by(get_key)
+        # presorted by the sorted indexes
+        sorted_inner = IterableQuery(inner).index_by(get_key, ordered=True)
+        for outer_size in OUTER_SIZES:
+            outer = [Row(k, i) for i, k in enumerate(make_keys('uniform', outer_size))]
+            sorted_outer = IterableQuery(outer).index_by(get_key, ordered=True)
+            expected = None
+            cases = get_cases(outer, inner, indexed_inner, sorted_outer, sorted_inner)
+            for name, make_query in cases.items():
+                join_query = make_query()
+                strategy = getattr(join_query, 'strategy', '-')
+                result = join_query.to_list()
+                if name == 'merge':
+                    # the order of the outer items are changed.
+                    result = sorted(result)
+                    assert result == sorted(expected)
+                elif expected is None:
+                    expected = result
+                else:
+                    assert result == expected
+                cost = min(timeit.repeat(lambda: make_query().to_list(), number=1, repeat=3))
+                print(f'{distribution:>10}{outer_size:>8}{name:>12}{strategy:>12}{len(result):>10}{cost * 1e3:>12.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# execute a CPU-bound in-memory query in the main process or by a process pool:
+# `IterableQuery(items).as_parallel(workers=?).where(...).select(...).to_list()`
+#
+# run: python -m benchmarks.bench_parallel
+# ----------
+
+import os
+import timeit
+
+from lquery.iterable import IterableQuery
+
+SIZE = 20000
+CHUNK_SIZE = 1000
+
+def is_prime(n):
+    if n < 2:
+        return False
+    i = 2
+    while i * i <= n:
+        if n % i == 0:
+            return False
+        i += 1
+    return True
+
+def run_query(items, workers, ordered=True):
+    query = IterableQuery(items)
+    if workers is not None:
+        query = query.as_parallel(workers=workers, ordered=ordered, chunk_size=CHUNK_SIZE)
+    return query \
+        .where(lambda x: is_prime(x)) \
+        .select(lambda x: sum(i * i for i in range(x % 500))) \
+        .to_list()
+
+def run_sum(items, workers):
+    query = IterableQuery(items)
+    if workers is not None:
+        query = query.as_parallel(workers=workers, chunk_size=CHUNK_SIZE)
+    return query.sum(lambda x: sum(i for i in range(x % 500)))
+
+def main():
+    items = [x * 7919 for x in range(SIZE)]
+    workers_list = [None, 1, 2, 4, os.cpu_count() or 1]
+    expected = run_query(items, None)
+    expected_sum = run_sum(items, None)
+    print(f'items: {SIZE}, cpus: {os.cpu_count()}')
+    print(f'{"query":>10}{"workers":>10}{"ordered":>10}{"time (ms)":>12}')
+    for workers in workers_list:
+        for ordered in ((True, ) if workers is None else (True, False)):
+            result = run_query(items, workers, ordered)
+            assert (result if ordered else sorted(result)) == (expected if ordered else sorted(expected))
+            cost = min(timeit.repeat(lambda: run_query(items, workers, ordered), number=1, repeat=3))
+            print(f'{"to_list":>10}{str(workers):>10}{str(ordered):>10}{cost * 1e3:>12.2f}')
+        assert run_sum(items, workers) == expected_sum
+        cost = min(timeit.repeat(lambda: run_sum(items, workers), number=1, repeat=3))
+        print(f'{"sum":>10}{str(workers):>10}{"-":>10}{cost * 1e3:>12.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# the exact and the approximate aggregates on the items from a generator:
+# `count_distinct(selector, approx=?)` and `quantile(selector, q, approx=?)`
+#
+# the peak memory is measured by `tracemalloc`, which also slow down the queries.
+#
+# run: python -m benchmarks.bench_sketches
+# ----------
+
+import random
+import time
+import tracemalloc
+
+from lquery.iterable import IterableQuery
+
+SIZE = 1000000
+
+def iter_values():
+    rand = random.Random(0)
+    for _ in range(SIZE):
+        yield rand.randrange(SIZE)
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    cost = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, cost, peak
+
+def main():
+    print(f'items: {SIZE}')
+    print(f'{"query":>26}{"result":>12}{"time (ms)":>12}{"peak (MB)":>12}')
+    cases = [
+        ('distinct().count()', lambda: IterableQuery(iter_values()).distinct().count()),
+        ('count_distinct(exact)', lambda: IterableQuery(iter_values()).count_distinct(approx=False)),
+        ('count_distinct(approx)', lambda: IterableQuery(iter_values()).count_distinct()),
+        ('quantile(0.99, exact)', lambda: IterableQuery(iter_values()).quantile(lambda x: x, 0.99, approx=False)),
+        ('quantile(0.99, approx)', lambda: IterableQuery(iter_values()).quantile(lambda x: x, 0.99)),
+    ]
+    for name, run in cases:
+        result, cost, peak = measure(run)
+        print(f'{name:>26}{result:>12}{cost * 1e3:>12.2f}{peak / 2 ** 20:>12.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# run the keyed operators on the items from a generator in memory or under a spill budget:
+# `IterableQuery(items, spill_budget=?).group_by(key)` / `.distinct(key)` / `.join(...)`
+#
+# the peak memory is measured by `tracemalloc`, which also slow down the queries.
+#
+# run: python -m benchmarks.bench_spill
+# ----------
+
+import random
+import time
+import tracemalloc
+
+from lquery.iterable import IterableQuery
+
+SIZE = 500000
+KEYS = 200000
+BUDGETS = [None, 100000, 10000]
+
+def iter_rows(seed=0):
+    rand = random.Random(seed)
+    for i in range(SIZE):
+        yield (rand.randrange(KEYS), i)
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    cost = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, cost, peak
+
+def checksum(query):
+    # a checksum of the order, so the results are not kept in memory.
+    return query.aggregate(lambda a, b: (a * 31 + b) & 0xffffffff, 0)
+
+def main():
+    print(f'items: {SIZE}, keys: {KEYS}')
+    print(f'{"budget":>10}{"query":>12}{"time (ms)":>12}{"peak (MB)":>12}{"spilled (MB)":>14}')
+    expected = {}
+    for budget in BUDGETS:
+        def make_query():
+            return IterableQuery(iter_rows(), spill_budget=budget)
+        cases = [
+            ('group_by', lambda q: checksum(q.group_by(lambda x: x[0], lambda x: x[1])
+                                             .select(lambda g: g.key + len(g.to_list())))),
+            ('distinct', lambda q: checksum(q.distinct(lambda x: x[0]).select(lambda x: x[1]))),
+            ('join', lambda q: checksum(q.join(iter_rows(1), lambda x: x[0], lambda x: x[0],
+                                               lambda o, i: o[1] ^ i[1]))),
+        ]
+        for name, run in cases:
+            query = make_query()
+            result, cost, peak = measure(lambda: run(query))
+            expected.setdefault(name, result)
+            assert result == expected[name]
+            spilled = query.provider.spill_stats.bytes / 2 ** 20 if budget is not None else 0
+            print(f'{str(budget):>10}{name:>12}{cost * 1e3:>12.2f}{peak / 2 ** 20:>12.2f}{spilled:>14.2f}')
+
+if __name__ == '__main__':
+    main()
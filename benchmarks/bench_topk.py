@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# take a few items of a `order_by()` by `asq` (sort all items) or by the bounded heap:
+# `IterableQuery(items).order_by(key).take(n).to_list()` and `.first()`
+#
+# run: python -m benchmarks.bench_topk
+# ----------
+
+import random
+import timeit
+
+from asq import query
+
+from lquery.iterable import IterableQuery
+
+SIZES = [1000, 100000, 1000000]
+COUNTS = [1, 10, 1000]
+
+def get_key(item):
+    return item[0]
+
+def main():
+    print(f'{"items":>10}{"query":>12}{"asq (ms)":>12}{"lquery (ms)":>14}')
+    rand = random.Random(0)
+    for size in SIZES:
+        items = [(rand.randrange(size), i) for i in range(size)]
+        cases = [(f'take({n})', lambda q, n=n: q.order_by(get_key).take(n).to_list()) for n in COUNTS]
+        cases.append(('first()', lambda q: q.order_by(get_key).first()))
+        cases.append(('last()', lambda q: q.order_by_descending(get_key).last()))
+        for name, run in cases:
+            assert run(IterableQuery(items)) == run(query(items))
+            costs = [
+                min(timeit.repeat(lambda: run(make_query(items)), number=1, repeat=3))
+                for make_query in (query, IterableQuery)
+            ]
+            print(f'{size:>10}{name:>12}{costs[0] * 1e3:>12.2f}{costs[1] * 1e3:>14.2f}')
+
+if __name__ == '__main__':
+    main()
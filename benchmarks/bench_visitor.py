@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# visit the deep expr trees, like the predicates which generated by a filter builder:
+# `lambda x: x['a'] == 0 or x['a'] == 1 or ...`
+#
+# run: python -m benchmarks.bench_visitor
+# ----------
+
+import sys
+import timeit
+
+from lquery.expr import Make
+from lquery.expr.visitor import ExprVisitor, DefaultExprVisitor, iter_exprs
+from lquery.expr.utils import fold_const_exprs
+
+SIZES = [10, 100, 1000, 5000]
+
+def make_or_chain(size):
+    x = Make.parameter('x')
+    body = None
+    for i in range(size):
+        clause = Make.binary_op(Make.index(x, Make.const('a')), '==', Make.const(i))
+        body = clause if body is None else Make.binary_op(body, 'or', clause)
+    return Make.func(body, x)
+
+class RecursiveExprVisitor(ExprVisitor):
+    '''
+    the recursive way as a reference, like `DefaultExprVisitor` with `accept()`.
+    '''
+    def visit_index_expr(self, expr):
+        src_expr, key_expr = expr.expr.accept(self), expr.key.accept(self)
+        if src_expr is expr.expr and key_expr is expr.key:
+            return expr
+        return Make.index(src_expr, key_expr)
+
+    def visit_binary_expr(self, expr):
+        left, right = expr.left.accept(self), expr.right.accept(self)
+        if left is expr.left and right is expr.right:
+            return expr
+        return Make.binary_op(left, expr.op, right)
+
+    def visit_func_expr(self, expr):
+        body = expr.body.accept(self)
+        return expr if body is expr.body else Make.func(body, *expr.args)
+
+def get_cases():
+    return {
+        'accept': lambda e: e.accept(RecursiveExprVisitor()),
+        'run': DefaultExprVisitor().run,
+        'iter_exprs': lambda e: sum(1 for _ in iter_exprs(e)),
+        'fold': fold_const_exprs,
+    }
+
+def main():
+    print(f'recursion limit: {sys.getrecursionlimit()}')
+    print(f'{"size":>8}{"case":>12}{"time (us)":>14}{"per node (ns)":>16}')
+    for size in SIZES:
+        func_expr = make_or_chain(size)
+        nodes = sum(1 for _ in iter_exprs(func_expr))
+        for name, func in get_cases().items():
+            number = max(1, 20000 // size)
+            try:
+                cost = timeit.timeit(lambda: func(func_expr), number=number) / number
+            except RecursionError:
+                print(f'{size:>8}{name:>12}{"RecursionError":>16}')
+                continue
+            print(f'{size:>8}{name:>12}{cost * 1e6:>14.1f}{cost / nodes * 1e9:>16.1f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# the streaming aggregation for the in-memory items.
+# ----------
+
+'''
+a `group_by()` which only the keys and the aggregates of the groups are used, like:
+
+``` py
+query.group_by(lambda x: x.k).select(lambda g: (g.key, g.count(), g.sum(lambda x: x.v)))
+```
+
+can be computed by the accumulators of each key in one pass,
+so the memory is O(groups) instead of O(items).
+
+the aggregates are `g.count()`, `g.sum()`, `g.min()`, `g.max()`, `g.average()` (with or without a selector),
+`g.first()`, and `len(g)`, `sum(g)`, `min(g)`, `max(g)`.
+
+the sums are accumulated by `+` in order like `asq`, so on python 3.12+ a sum of floats may be
+different in the last digits from `sum()`, which use the compensated summation for floats.
+'''
+
+from typing import Optional
+
+from .expr import ExprType, Make
+from .expr.builder import to_func_expr
+from .expr.visitor import DefaultExprVisitor
+from .expr.utils import require_argument
+from .expr.ast_emitter import emit
+
+
+class _Aggregate:
+    def __init__(self, init, update=None, result=None):
+        self.init = init
+        self.update = update
+        self.result = result
+
+def _min(current, value):
+    return value if value < current else current
+
+def _max(current, value):
+    return value if value > current else current
+
+_AGGREGATES = {
+    # the count of the elements is always kept.
+    'count': None,
+    # `sum()` start with `0`
+    'sum': _Aggregate(lambda v: 0 + v, lambda c, v: c + v),
+    'min': _Aggregate(lambda v: v, _min),
+    'max': _Aggregate(lambda v: v, _max),
+    'average': _Aggregate(lambda v: 0 + v, lambda c, v: c + v, lambda total, count: total / count),
+    'first': _Aggregate(lambda v: v),
+}
+
+# the max count of the args of the methods of the grouping.
+_METHODS = {'count': 0, 'sum': 1, 'min': 1, 'max': 1, 'average': 1, 'first': 0}
+
+_BUILTINS = [(len, 'count'), (sum, 'sum'), (min, 'min'), (max, 'max')]
+
+
+class _NotAggregateError(Exception):
+    pass
+
+
+class _AggregateExprVisitor(DefaultExprVisitor):
+    '''
+    replace the key and the aggregates of the grouping with the parameters.
+    '''
+    def __init__(self, grouping: str, key):
+        self._grouping = grouping
+        self.key = key
+        self.aggregates = [] # [(kind, selector_expr or None, parameter)]
+
+    def _is_grouping(self, expr):
+        return expr.type == ExprType.Parameter and expr.name == self._grouping
+
+    def _get_aggregate(self, expr):
+        if expr.kwargs:
+            return None
+        if expr.func.type == ExprType.Attr and self._is_grouping(expr.func.expr):
+            max_args = _METHODS.get(expr.func.name)
+            if max_args is None or len(expr.args) > max_args:
+                return None
+            if expr.args and require_argument(expr.args[0]):
+                return None
+            return expr.func.name, (expr.args[0] if expr.args else None)
+        if len(expr.args) == 1 and self._is_grouping(expr.args[0]) and not require_argument(expr.func):
+            func = expr.func.resolve_value()
+            for builtin_func, kind in _BUILTINS:
+                if func is builtin_func:
+                    return kind, None
+        return None
+
+    def visit_parameter_expr(self, expr):
+        if expr.name == self._grouping:
+            # the grouping is used in other way, like `list(g)`.
+            raise _NotAggregateError
+        return expr
+
+    def visit_attr_expr(self, expr):
+        if self._is_grouping(expr.expr) and expr.name == 'key':
+            return self.key
+        return (yield from super().visit_attr_expr(expr))
+
+    def visit_call_expr(self, expr):
+        aggregate = self._get_aggregate(expr)
+        if aggregate is not None:
+            parameter = Make.parameter(f'__lquery_aggregate_{len(self.aggregates)}')
+            self.aggregates.append((*aggregate, parameter))
+            return parameter
+        func = yield expr.func
+        args = []
+        for arg in expr.args:
+            args.append((yield arg))
+        kwargs = {}
+        for name, value in expr.kwargs.items():
+            kwargs[name] = yield value
+        if func is expr.func and all(x is y for x, y in zip(args, expr.args)) and \
+                all(kwargs[k] is v for k, v in expr.kwargs.items()):
+            return expr
+        return Make.call(func, *args, **kwargs)
+
+    def visit_build_list_expr(self, expr):
+        items = []
+        for item in expr.items:
+            items.append((yield item))
+        if all(x is y for x, y in zip(items, expr.items)):
+            return expr
+        return Make.build_list(*items)
+
+    def visit_build_dict_expr(self, expr):
+        kvps = []
+        for key, value in expr.kvps:
+            kvps.append(((yield key), (yield value)))
+        if all(x is y for x, y in zip(sum(kvps, ()), sum(expr.kvps, ()))):
+            return expr
+        return Make.build_dict(*kvps)
+
+
+class AggregatePlan:
+    '''
+    compute the results of a `group_by()` by the accumulators, see `get_aggregate_plan()`.
+    '''
+    def __init__(self, aggregates: list, result_func):
+        self._aggregates = aggregates
+        self._result_func = result_func
+
+    def execute(self, items, key_selector, element_selector):
+        # resolve the closures of the selectors on each execution.
+        slots = [] # [(index of state, aggregate, selector)]
+        results = [] # [(index of state or None, aggregate)]
+        for kind, selector_expr in self._aggregates:
+            aggregate = _AGGREGATES[kind]
+            if aggregate is None:
+                results.append((None, None))
+                continue
+            selector = selector_expr.resolve_value() if selector_expr is not None else None
+            slots.append((len(slots) + 1, aggregate, selector))
+            results.append((len(slots), aggregate))
+        updates = [(i, a.update, s) for i, a, s in slots if a.update is not None]
+
+        # the state of a group is `[count, *values of slots]`
+        groups = {}
+        for item in items:
+            key = key_selector(item)
+            element = element_selector(item)
+            state = groups.get(key)
+            if state is None:
+                groups[key] = [1] + [a.init(element if s is None else s(element)) for _, a, s in slots]
+            else:
+                state[0] += 1
+                for index, update, selector in updates:
+                    state[index] = update(state[index], element if selector is None else selector(element))
+
+        result_func = self._result_func
+        for key, state in groups.items():
+            values = []
+            for index, aggregate in results:
+                if index is None:
+                    values.append(state[0])
+                elif aggregate.result is not None:
+                    values.append(aggregate.result(state[index], state[0]))
+                else:
+                    values.append(state[index])
+            yield result_func(key, *values)
+
+
+def get_aggregate_plan(result_selector, *, key_arg: bool) -> Optional[AggregatePlan]:
+    '''
+    get a `AggregatePlan` if the `result_selector` of the groups only use the keys and the aggregates,
+    otherwise return `None`.
+
+    if `key_arg` is `True`, the `result_selector` is `(key, grouping) -> ?` like the arg of `group_by()`;
+    otherwise it is `(grouping) -> ?` like the arg of `select()`.
+    '''
+    func_expr = to_func_expr(result_selector)
+    if func_expr is None or len(func_expr.args) != (2 if key_arg else 1):
+        return None
+    key = func_expr.args[0] if key_arg else Make.parameter('__lquery_key')
+    visitor = _AggregateExprVisitor(func_expr.args[-1].name, key)
+    try:
+        body = visitor.run(func_expr.body)
+    except _NotAggregateError:
+        return None
+    parameters = [p for _, _, p in visitor.aggregates]
+    result_func = emit(Make.func(body, key, *parameters))
+    if result_func is None:
+        return None
+    return AggregatePlan([(k, s) for k, s, _ in visitor.aggregates], result_func)
@@ -39,6 +39,10 @@ class Enumerable(IEnumerable):
         super().__init__()
         self._items = items
 
+    @property
+    def items(self):
+        return self._items
+
     def __iter__(self):
         return iter(self._items)
 
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# a func expr emiter base on module `ast`.
+# ----------
+
+import sys
+import ast
+import operator
+
+from .utils import get_repeated_paths
+
+
+_LITERAL_TYPES = (type(None), bool, int, float, complex, str, bytes)
+
+def _is_literal(value):
+    '''
+    test whether `compile()` accept the value as a `ast.Constant`.
+    '''
+    # pylint: disable=C0123
+    if type(value) in _LITERAL_TYPES:
+        return True
+    if type(value) in (tuple, frozenset):
+        return all(_is_literal(v) for v in value)
+    return False
+
+
+class AstEmitter:
+    '''
+    emit a `FuncExpr` as python function by `ast` and `compile()`.
+
+    unlike `ByteCodeEmitter`, it does not depend on any version-specific opcodes.
+    the references are bound as keyword-only default arguments.
+
+    on python 3.8+, the repeated parameter paths like `x['a']` are stored into locals
+    by the assignment expression (`:=`), so each path is evaluated once per call.
+    '''
+    def __init__(self, func_expr):
+        self._src_expr = func_expr
+        self._refs = {} # {name: value}
+        if sys.version_info >= (3, 8):
+            self._cse_paths = get_repeated_paths(func_expr)
+        else:
+            self._cse_paths = set()
+        self._cse_count = 0
+        self._cse_locals = {} # {path: name}, the paths which stored in current scope.
+
+    def emit(self, *, debug=False):
+        try:
+            node = self.on_expr(self._src_expr)
+        except NotImplementedError:
+            if debug:
+                import traceback
+                traceback.print_exc()
+            return None
+        node = ast.fix_missing_locations(ast.Expression(node))
+        if debug:
+            print(ast.dump(node))
+        code = compile(node, f'<{self._src_expr}>', 'eval')
+        compiled_func = eval(code, dict(self._refs)) # pylint: disable=W0123
+        compiled_func.__name__ = compiled_func.__qualname__ = f'<{self._src_expr}>'
+        return compiled_func
+
+    def _bind(self, value):
+        name = f'__lquery_ref_{len(self._refs)}'
+        self._refs[name] = value
+        return ast.Name(id=name, ctx=ast.Load())
+
+    def _const(self, value):
+        if _is_literal(value):
+            return ast.Constant(value=value)
+        return self._bind(value)
+
+    def on_expr(self, expr):
+        method_name = 'on_' + type(expr).__name__.lower()
+        method = getattr(self, method_name, None)
+        if method is None:
+            raise NotImplementedError(f'not impl expr: {type(expr).__name__}')
+        return method(expr)
+
+    def on_funcexpr(self, expr):
+        body = self.on_expr(expr.body)
+        # all refs are known after visit body.
+        kwargs = dict(
+            args=[ast.arg(arg=x.name, annotation=None) for x in expr.args],
+            vararg=None,
+            kwonlyargs=[ast.arg(arg=name, annotation=None) for name in self._refs],
+            kw_defaults=[ast.Name(id=name, ctx=ast.Load()) for name in self._refs],
+            kwarg=None,
+            defaults=[]
+        )
+        if sys.version_info >= (3, 8):
+            kwargs['posonlyargs'] = []
+        return ast.Lambda(args=ast.arguments(**kwargs), body=body)
+
+    def on_parameterexpr(self, expr):
+        return ast.Name(id=expr.name, ctx=ast.Load())
+
+    def on_constexpr(self, expr):
+        return self._const(expr.value)
+
+    def on_referenceexpr(self, expr):
+        return self._bind(expr.value)
+
+    def on_derefexpr(self, expr):
+        # lazy load value
+        return ast.Attribute(value=self._bind(expr.cell), attr='cell_contents', ctx=ast.Load())
+
+    def _cse(self, expr, emit_node):
+        path = repr(expr) if self._cse_paths else None
+        if path not in self._cse_paths:
+            return emit_node()
+        name = self._cse_locals.get(path)
+        if name is not None:
+            return ast.Name(id=name, ctx=ast.Load())
+        node = emit_node()
+        name = f'__lquery_cse_{self._cse_count}'
+        self._cse_count += 1
+        self._cse_locals[path] = name
+        return ast.NamedExpr(target=ast.Name(id=name, ctx=ast.Store()), value=node)
+
+    def on_attrexpr(self, expr):
+        return self._cse(expr, lambda: ast.Attribute(
+            value=self.on_expr(expr.expr), attr=expr.name, ctx=ast.Load()))
+
+    def on_indexexpr(self, expr):
+        def emit_node():
+            value = self.on_expr(expr.expr)
+            key = self.on_expr(expr.key)
+            if sys.version_info < (3, 9):
+                key = ast.Index(value=key)
+            return ast.Subscript(value=value, slice=key, ctx=ast.Load())
+        return self._cse(expr, emit_node)
+
+    _UNARY_OP_MAP = {
+        'not':  ast.Not,
+        '-':    ast.USub,
+        '+':    ast.UAdd,
+        '~':    ast.Invert,
+    }
+
+    def on_unaryexpr(self, expr):
+        op = self._UNARY_OP_MAP.get(expr.op)
+        if op is None:
+            raise NotImplementedError(f'not impl op: {expr.op}')
+        return ast.UnaryOp(op=op(), operand=self.on_expr(expr.expr))
+
+    _COMPARE_OP_MAP = {
+        '<':    ast.Lt,
+        '<=':   ast.LtE,
+        '==':   ast.Eq,
+        '!=':   ast.NotEq,
+        '>':    ast.Gt,
+        '>=':   ast.GtE,
+        'in':   ast.In,
+        'not in': ast.NotIn,
+        'is':   ast.Is,
+        'is not': ast.IsNot,
+    }
+
+    _BINARY_OP_MAP = {
+        '+':    ast.Add,
+        '-':    ast.Sub,
+        '*':    ast.Mult,
+        '/':    ast.Div,
+        '//':   ast.FloorDiv,
+        '%':    ast.Mod,
+        '**':   ast.Pow,
+        '&':    ast.BitAnd,
+        '|':    ast.BitOr,
+        '^':    ast.BitXor,
+    }
+
+    # there is no expression for inplace operators.
+    _INPLACE_OP_MAP = {
+        '+=':   operator.iadd,
+        '-=':   operator.isub,
+        '*=':   operator.imul,
+    }
+
+    def on_binaryexpr(self, expr):
+        left = self.on_expr(expr.left)
+        if expr.op in ('and', 'or'):
+            # the right may not be evaluated, so the locals stored by it are unusable after it.
+            cse_locals = dict(self._cse_locals)
+            right = self.on_expr(expr.right)
+            self._cse_locals = cse_locals
+        else:
+            right = self.on_expr(expr.right)
+        if expr.op in self._COMPARE_OP_MAP:
+            return ast.Compare(left=left, ops=[self._COMPARE_OP_MAP[expr.op]()], comparators=[right])
+        if expr.op in self._BINARY_OP_MAP:
+            return ast.BinOp(left=left, op=self._BINARY_OP_MAP[expr.op](), right=right)
+        if expr.op in ('and', 'or'):
+            op = ast.And() if expr.op == 'and' else ast.Or()
+            return ast.BoolOp(op=op, values=[left, right])
+        if expr.op in self._INPLACE_OP_MAP:
+            func = self._bind(self._INPLACE_OP_MAP[expr.op])
+            return ast.Call(func=func, args=[left, right], keywords=[])
+        raise NotImplementedError(f'not impl op: {expr.op}')
+
+    def on_callexpr(self, expr):
+        return ast.Call(
+            func=self.on_expr(expr.func),
+            args=[self.on_expr(x) for x in expr.args],
+            keywords=[ast.keyword(arg=k, value=self.on_expr(v)) for k, v in expr.kwargs.items()]
+        )
+
+    def on_buildlistexpr(self, expr):
+        return ast.List(elts=[self.on_expr(x) for x in expr.items], ctx=ast.Load())
+
+    def on_builddictexpr(self, expr):
+        # visit by the evaluation order (k1, v1, k2, v2, ...),
+        # so the assignment expressions are evaluated before the names are used.
+        keys, values = [], []
+        for k, v in expr.kvps:
+            keys.append(self.on_expr(k))
+            values.append(self.on_expr(v))
+        return ast.Dict(keys=keys, values=values)
+
+
+def emit(func_expr, *, debug=False):
+    '''
+    return `None` if emit failed.
+    '''
+    emiter = AstEmitter(func_expr)
+    return emiter.emit(debug=debug)
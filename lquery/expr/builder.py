@@ -5,11 +5,13 @@
 #
 # ----------
 
+import sys
 import dis
+import types
 from contextlib import contextmanager
 from typing import List, Dict
 
-from .core import IExpr, Make
+from .core import IExpr, ConstExpr, BuildListExpr, Make
 
 DEBUG = False
 
@@ -27,7 +29,17 @@ class NotSupportError(Exception):
         super().__init__(msg or '')
 
 
+# placeholder of the `NULL` which pushed by python 3.11+ before a call.
+_NULL = object()
+
+
 class FuncExprBuilder:
+    '''
+    build a `FuncExpr` from the bytecode of a function.
+
+    the handlers are named by the lower case opname;
+    opcodes which only exists on some python versions are commented with the versions.
+    '''
     def __init__(self, func):
         self._func = func
         self._bytecode = dis.Bytecode(self._func)
@@ -38,7 +50,10 @@ class FuncExprBuilder:
         self._stack: List[IExpr] = []
         self._instructions = list(self._bytecode)
         self._instructions_map = dict((v.offset, v) for v in self._instructions)
+        self._instructions_index = dict((v.offset, i) for i, v in enumerate(self._instructions))
         self._instructions_hooks = {}
+        self._skipped_offsets = set()
+        self._kw_names = ()
 
     def _print_stack(self):
         print('expr-builder-stack:', self._stack)
@@ -59,6 +74,20 @@ class FuncExprBuilder:
         else:
             return []
 
+    def _get_instruction(self, instr: dis.Instruction, delta: int, *, skips=()):
+        '''
+        get the instruction which relative to `instr`, or `None`.
+        '''
+        index = self._instructions_index[instr.offset]
+        step = 1 if delta > 0 else -1
+        while delta:
+            index += step
+            if not 0 <= index < len(self._instructions):
+                return None
+            if self._instructions[index].opname not in skips:
+                delta -= step
+        return self._instructions[index]
+
     def _hook(self, offset, callback):
         hooks = self._instructions_hooks.get(offset)
         if not hooks:
@@ -72,12 +101,14 @@ class FuncExprBuilder:
                 for callback in reversed(hooks):
                     callback()
                 del self._instructions_hooks[instr.offset]
+            if instr.offset in self._skipped_offsets:
+                continue
             method_name = instr.opname.lower()
             method = getattr(self, method_name, None)
             if not method:
                 return self._not_support(instr=instr)
             method(instr)
-        if len(self._stack) != 1:
+        if len(self._stack) != 1 or self._stack[0] is _NULL:
             return self._not_support(msg='unknwon return values.')
         body = self._stack.pop()
         expr = Make.func(body, *self._args)
@@ -89,7 +120,11 @@ class FuncExprBuilder:
 
     def load_deref(self, instr: dis.Instruction):
         # load from closure
-        cell = self._func.__closure__[instr.arg]
+        # the meaning of `instr.arg` was changed on python 3.11, use the name.
+        freevars = self._func.__code__.co_freevars
+        if instr.argval not in freevars:
+            return self._not_support(instr=instr)
+        cell = self._func.__closure__[freevars.index(instr.argval)]
         expr = Make.deref(cell)
         self._stack.append(expr)
 
@@ -97,16 +132,17 @@ class FuncExprBuilder:
         name = instr.argval
         if name in self._func.__globals__:
             expr = Make.ref(self._func.__globals__[name])
-            self._stack.append(expr)
-            return
-        builtins = self._func.__globals__['__builtins__']
-        if not isinstance(builtins, dict):
-            builtins = vars(builtins)
-        if name in builtins:
+        else:
+            builtins = self._func.__globals__['__builtins__']
+            if not isinstance(builtins, dict):
+                builtins = vars(builtins)
+            if name not in builtins:
+                return self._not_support(instr=instr)
             expr = Make.ref(builtins[name])
-            self._stack.append(expr)
-            return
-        return self._not_support(instr=instr)
+        if sys.version_info >= (3, 11) and instr.arg & 1:
+            # python 3.11+: the low bit means push a `NULL` for call.
+            self._stack.append(_NULL)
+        self._stack.append(expr)
 
     def compare_op(self, instr: dis.Instruction):
         right = self._stack.pop()
@@ -119,6 +155,18 @@ class FuncExprBuilder:
         expr = Make.build_list(*items)
         self._stack.append(expr)
 
+    def build_tuple(self, instr: dis.Instruction):
+        # there is no tuple expr, `(a, b)` is built as `tuple([a, b])`.
+        items = self._stack_pop(instr.arg)
+        expr = Make.call(Make.ref(tuple), Make.build_list(*items))
+        self._stack.append(expr)
+
+    def build_map(self, instr: dis.Instruction):
+        items = self._stack_pop(instr.arg * 2)
+        kvps = list(zip(items[0::2], items[1::2]))
+        expr = Make.build_dict(*kvps)
+        self._stack.append(expr)
+
     def build_const_key_map(self, _: dis.Instruction):
         keys_tuple = self._stack.pop().value
         keys = [Make.const(k) for k in keys_tuple]
@@ -127,19 +175,23 @@ class FuncExprBuilder:
         expr = Make.build_dict(*kvps)
         self._stack.append(expr)
 
+    def _call(self, argc: int, kw_names: tuple):
+        values = self._stack_pop(argc)
+        args = values[:len(values) - len(kw_names)]
+        kwargs = dict(zip(kw_names, values[len(args):]))
+        func = self._stack.pop()
+        expr = Make.call(func, *args, **kwargs)
+        self._stack.append(expr)
+
     def call_function(self, instr: dis.Instruction):
         args = self._stack_pop(instr.arg)
         func = self._stack.pop()
         expr = Make.call(func, *args)
         self._stack.append(expr)
 
-    def call_function_kw(self, _: dis.Instruction):
+    def call_function_kw(self, instr: dis.Instruction):
         keys = self._stack.pop().value
-        kvps = list(zip(keys, self._stack_pop(len(keys))))
-        kwargs = dict(kvps)
-        func = self._stack.pop()
-        expr = Make.call(func, **kwargs)
-        self._stack.append(expr)
+        self._call(instr.arg, keys)
 
     def pop_top(self, _: dis.Instruction):
         # opcode=1
@@ -163,18 +215,38 @@ class FuncExprBuilder:
         expr = Make.unary_op(self._stack.pop(), op)
         self._stack.append(expr)
 
+    def unary_positive(self, _: dis.Instruction):
+        # opcode=10
+        self._unary_op('+')
+
+    def unary_negative(self, _: dis.Instruction):
+        # opcode=11
+        self._unary_op('-')
+
     def unary_not(self, _: dis.Instruction):
         # opcode=12
         self._unary_op('not')
 
+    def unary_invert(self, _: dis.Instruction):
+        # opcode=15
+        self._unary_op('~')
+
     def _binary_op(self, op: str):
         right = self._stack.pop()
         left = self._stack.pop()
         expr = Make.binary_op(left, op, right)
         self._stack.append(expr)
 
+    def binary_power(self, _: dis.Instruction):
+        # opcode=19
+        self._binary_op('**')
+
+    def binary_multiply(self, _: dis.Instruction):
+        # opcode=20
+        self._binary_op('*')
+
     def binary_modulo(self, _: dis.Instruction):
-        # opcode=23
+        # opcode=22
         self._binary_op('%')
 
     def binary_add(self, _: dis.Instruction):
@@ -217,6 +289,10 @@ class FuncExprBuilder:
         # opcode=64
         self._binary_op('&')
 
+    def binary_xor(self, _: dis.Instruction):
+        # opcode=65
+        self._binary_op('^')
+
     def binary_or(self, _: dis.Instruction):
         # opcode=66
         self._binary_op('|')
@@ -226,6 +302,15 @@ class FuncExprBuilder:
         # ignore.
         pass
 
+    def jump_forward(self, instr: dis.Instruction):
+        # opcode=110
+        # only jump over the cleanup block of a chained comparison.
+        next_instr = self._get_instruction(instr, 1, skips=('CACHE', ))
+        while next_instr is not None and next_instr.offset < instr.argval:
+            if next_instr.offset not in self._skipped_offsets:
+                return self._not_support(instr=instr)
+            next_instr = self._get_instruction(next_instr, 1, skips=('CACHE', ))
+
     def store_attr(self, instr: dis.Instruction):
         # opcode=95
         src = self._stack.pop()
@@ -237,31 +322,103 @@ class FuncExprBuilder:
         # opcode=106
         src = self._stack.pop()
         expr = Make.attr(src, instr.argval)
+        if sys.version_info >= (3, 12) and instr.arg & 1:
+            # python 3.12+: the low bit means load method.
+            self._stack.append(_NULL)
         self._stack.append(expr)
 
+    def _get_chained_compare_cleanup(self, offset):
+        '''
+        a chained comparison like `a < b < c` jump to a cleanup block (`ROT_TWO; POP_TOP` or `SWAP 2; POP_TOP`)
+        which drop the duplicated `b` when `a < b` is false.
+
+        return the instructions of the cleanup block, or `None`.
+        '''
+        instr = self._instructions_map[offset]
+        if instr.opname != 'ROT_TWO' and (instr.opname != 'SWAP' or instr.arg != 2):
+            return None
+        next_instr = self._get_instruction(instr, 1, skips=('CACHE', ))
+        if next_instr is None or next_instr.opname != 'POP_TOP':
+            return None
+        # python 3.10+ may copy the rest of the function into the cleanup block,
+        # the true path should return or jump over the cleanup block.
+        prev_instr = self._get_instruction(instr, -1, skips=('CACHE', ))
+        end_instr = self._get_instruction(next_instr, 1, skips=('CACHE', ))
+        if end_instr is None:
+            return self._not_support(instr=instr)
+        if prev_instr.opname == 'RETURN_VALUE':
+            if end_instr.opname != 'RETURN_VALUE':
+                return self._not_support(instr=instr)
+        elif prev_instr.opname != 'JUMP_FORWARD' or prev_instr.argval != end_instr.offset:
+            return self._not_support(instr=instr)
+        return instr, next_instr
+
+    def _logic_op(self, instr: dis.Instruction, op: str):
+        left = self._stack.pop()
+        def callback():
+            right = self._stack.pop()
+            expr = Make.binary_op(left, op, right)
+            self._stack.append(expr)
+        target = instr.argval
+        cleanup = self._get_chained_compare_cleanup(target) if op == 'and' else None
+        if cleanup:
+            # `a < b < c` is `a < b and b < c`, which end after the cleanup block.
+            self._skipped_offsets.update(x.offset for x in cleanup)
+            target = self._get_instruction(cleanup[-1], 1, skips=('CACHE', )).offset
+        self._hook(target, callback)
+
     def jump_if_false_or_pop(self, instr: dis.Instruction):
         # opcode=111
         # If TOS is false, sets the bytecode counter to target and leaves TOS on the stack.
         # Otherwise (TOS is true), TOS is popped.
         # mean `and`
-        left = self._stack.pop()
-        def callback():
-            right = self._stack.pop()
-            expr = Make.binary_op(left, 'and', right)
-            self._stack.append(expr)
-        self._hook(instr.argval, callback)
+        self._logic_op(instr, 'and')
 
     def jump_if_true_or_pop(self, instr: dis.Instruction):
         # opcode=112
         # If TOS is true, sets the bytecode counter to target and leaves TOS on the stack.
         # Otherwise (TOS is false), TOS is popped.
         # mean `or`
-        left = self._stack.pop()
-        def callback():
-            right = self._stack.pop()
-            expr = Make.binary_op(left, 'or', right)
-            self._stack.append(expr)
-        self._hook(instr.argval, callback)
+        self._logic_op(instr, 'or')
+
+    def _pop_jump_if(self, instr: dis.Instruction, op: str):
+        # python 3.12+ compile `a and b` as `a; COPY 1; (TO_BOOL;) POP_JUMP_IF_FALSE; POP_TOP; b`.
+        # other usages (like `if`, or the jumps of mixed `and` and `or`) are not supported.
+        prev_instr = self._get_instruction(instr, -1, skips=('TO_BOOL', 'CACHE', 'EXTENDED_ARG'))
+        next_instr = self._get_instruction(instr, 1, skips=('CACHE', ))
+        if prev_instr is None or prev_instr.opname != 'COPY' or prev_instr.arg != 1:
+            return self._not_support(instr=instr)
+        if next_instr is None or next_instr.opname != 'POP_TOP':
+            return self._not_support(instr=instr)
+        if instr.argval <= instr.offset:
+            return self._not_support(instr=instr)
+        self._logic_op(instr, op)
+
+    def pop_jump_if_false(self, instr: dis.Instruction):
+        # opcode=114
+        self._pop_jump_if(instr, 'and')
+
+    def pop_jump_if_true(self, instr: dis.Instruction):
+        # opcode=115
+        self._pop_jump_if(instr, 'or')
+
+    def make_function(self, instr: dis.Instruction):
+        # opcode=132
+        # only the nested lambdas without defaults and closure, like `g.sum(lambda x: x.v)`.
+        # the arg is the flags, which is moved to `SET_FUNCTION_ATTRIBUTE` on python 3.13+.
+        if instr.arg:
+            return self._not_support(instr=instr)
+        qualname = None
+        if sys.version_info < (3, 11):
+            qualname = self._stack.pop().value
+        code = self._stack.pop()
+        if not isinstance(code, ConstExpr) or not isinstance(code.value, types.CodeType):
+            return self._not_support(instr=instr)
+        if code.value.co_freevars:
+            return self._not_support(instr=instr)
+        func = types.FunctionType(code.value, self._func.__globals__, code.value.co_name)
+        func.__qualname__ = qualname or code.value.co_qualname
+        self._stack.append(Make.const(func))
 
     def load_fast(self, instr: dis.Instruction):
         # opcode=124
@@ -270,15 +427,133 @@ class FuncExprBuilder:
 
     def load_method(self, instr: dis.Instruction):
         # opcode=160
-        return self.load_attr(instr)
+        # python 3.7~3.11
+        self.load_attr(instr)
+        if sys.version_info >= (3, 11):
+            # the `NULL` is below the method.
+            self._stack.insert(-1, _NULL)
 
     def call_method(self, instr: dis.Instruction):
         # opcode=161
-        args = self._stack_pop(instr.argval)
-        func = self._stack.pop()
-        expr = Make.call(func, *args)
+        # python 3.7~3.10
+        self._call(instr.arg, ())
+
+    def list_extend(self, instr: dis.Instruction):
+        # python 3.9+
+        # `[1, 2]` was compiled as `BUILD_LIST 0; LOAD_CONST (1, 2); LIST_EXTEND 1`.
+        if instr.arg != 1:
+            return self._not_support(instr=instr)
+        items = self._stack.pop()
+        list_expr = self._stack.pop()
+        if not isinstance(list_expr, BuildListExpr):
+            return self._not_support(instr=instr)
+        if not isinstance(items, ConstExpr) or not isinstance(items.value, tuple):
+            return self._not_support(instr=instr)
+        expr = Make.build_list(*list_expr.items, *[Make.const(v) for v in items.value])
         self._stack.append(expr)
 
+    def contains_op(self, instr: dis.Instruction):
+        # python 3.9+
+        self._binary_op('not in' if instr.arg else 'in')
+
+    def is_op(self, instr: dis.Instruction):
+        # python 3.9+
+        self._binary_op('is not' if instr.arg else 'is')
+
+    def nop(self, _: dis.Instruction):
+        pass
+
+    def extended_arg(self, _: dis.Instruction):
+        # the arg already merged into the next instruction by `dis`.
+        pass
+
+    def resume(self, _: dis.Instruction):
+        # python 3.11+
+        pass
+
+    def cache(self, _: dis.Instruction):
+        # python 3.11+
+        pass
+
+    def copy_free_vars(self, _: dis.Instruction):
+        # python 3.11+
+        pass
+
+    def precall(self, _: dis.Instruction):
+        # python 3.11
+        pass
+
+    def to_bool(self, _: dis.Instruction):
+        # python 3.13+
+        # the bool value of TOS only be used by the next instruction.
+        pass
+
+    def push_null(self, _: dis.Instruction):
+        # python 3.11+
+        self._stack.append(_NULL)
+
+    def kw_names(self, instr: dis.Instruction):
+        # python 3.11~3.12
+        # `instr.argval` is unknown on some 3.11 releases.
+        self._kw_names = self._func.__code__.co_consts[instr.arg]
+
+    def call(self, instr: dis.Instruction):
+        # python 3.11+
+        kw_names, self._kw_names = self._kw_names, ()
+        self._call_with_null(instr, kw_names)
+
+    def call_kw(self, instr: dis.Instruction):
+        # python 3.13+
+        kw_names = self._stack.pop().value
+        self._call_with_null(instr, kw_names)
+
+    def _call_with_null(self, instr: dis.Instruction, kw_names: tuple):
+        # the callable and the `NULL` are in different order on different versions.
+        values = self._stack_pop(instr.arg)
+        funcs = [x for x in self._stack_pop(2) if x is not _NULL]
+        if len(funcs) != 1:
+            return self._not_support(instr=instr)
+        self._stack.extend(funcs)
+        self._stack.extend(values)
+        self._call(instr.arg, kw_names)
+
+    def binary_op(self, instr: dis.Instruction):
+        # python 3.11+
+        # the argrepr is the operator like `+` or `+=`.
+        self._binary_op(instr.argrepr)
+
+    _INTRINSIC_UNARY_OP_MAP = {
+        'INTRINSIC_UNARY_POSITIVE': '+',
+    }
+
+    def call_intrinsic_1(self, instr: dis.Instruction):
+        # python 3.12+
+        op = self._INTRINSIC_UNARY_OP_MAP.get(instr.argrepr)
+        if op is None:
+            return self._not_support(instr=instr)
+        self._unary_op(op)
+
+    def copy(self, instr: dis.Instruction):
+        # python 3.11+
+        self._stack.append(self._stack[-instr.arg])
+
+    def swap(self, instr: dis.Instruction):
+        # python 3.11+
+        self._stack[-1], self._stack[-instr.arg] = self._stack[-instr.arg], self._stack[-1]
+
+    def return_const(self, instr: dis.Instruction):
+        # python 3.12+
+        self.load_const(instr)
+
+    def load_fast_check(self, instr: dis.Instruction):
+        # python 3.12+
+        self.load_fast(instr)
+
+    def load_fast_load_fast(self, instr: dis.Instruction):
+        # python 3.13+
+        for name in instr.argval:
+            self._stack.append(self._args_map[name])
+
 
 def to_func_expr(func):
     '''
@@ -289,6 +564,9 @@ def to_func_expr(func):
     assert callable(func)
     if DEBUG:
         print('parsing func: ', func)
+    if not hasattr(func, '__code__'):
+        # like the builtin functions or `operator.itemgetter()`
+        return None
     try:
         expr = FuncExprBuilder(func).build()
     except NotSupportError as err:
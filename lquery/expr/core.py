@@ -7,6 +7,7 @@
 
 import enum
 import abc
+import operator
 from typing import List, Dict, Callable, Tuple
 
 from typeguard import typechecked
@@ -22,6 +23,32 @@ class RequireArgumentError(Exception):
 
 # interfaces
 
+class ExprFlags:
+    '''
+    the flags of a expr, which are computed once when the expr is built,
+    so the analysis does not walk the sub exprs again.
+    '''
+    NONE = 0
+    # the expr or any sub expr is a `ParameterExpr`.
+    REQUIRE_ARGUMENT = 1
+    # the expr or any sub expr is a `DerefExpr`.
+    READ_CLOSURE = 2
+    # the expr or any sub expr is a `CallExpr`, which may has side effects.
+    CALL = 4
+    # the expr is a path like `arg.a['b']...`, which all index keys are const.
+    # this flag is not inherited by the parent expr.
+    PARAMETER_PATH = 8
+
+    INHERITED = REQUIRE_ARGUMENT | READ_CLOSURE | CALL
+
+
+def _merge_flags(exprs) -> int:
+    flags = ExprFlags.NONE
+    for expr in exprs:
+        flags |= expr.flags
+    return flags & ExprFlags.INHERITED
+
+
 class ExprType(enum.Enum):
     Parameter = 2
     Const = 3
@@ -66,7 +93,14 @@ class IExpr:
 # base classes
 
 class Expr(IExpr):
-    __slots__ = ()
+    __slots__ = ('_flags', )
+
+    @property
+    def flags(self) -> int:
+        '''
+        return the `ExprFlags` of the expr.
+        '''
+        return self._flags
 
     def accept(self, visitor):
         return visitor.visit(self)
@@ -80,6 +114,7 @@ class ValueExpr(Expr):
 
     def __init__(self, value):
         self._value = value
+        self._flags = ExprFlags.NONE
 
     @property
     def value(self):
@@ -106,6 +141,7 @@ class ParameterExpr(Expr):
     @typechecked
     def __init__(self, name: str):
         self._name = name
+        self._flags = ExprFlags.REQUIRE_ARGUMENT
 
     @property
     def name(self):
@@ -165,6 +201,11 @@ class DerefExpr(Expr):
     def __init__(self, cell):
         super().__init__()
         self._cell = cell
+        self._flags = ExprFlags.READ_CLOSURE
+
+    @property
+    def cell(self):
+        return self._cell
 
     def __str__(self):
         return repr(self.resolve_value())
@@ -193,6 +234,10 @@ class AttrExpr(Expr):
     def __init__(self, expr: IExpr, name: str):
         self._expr = expr
         self._name = name
+        flags = expr.flags & ExprFlags.INHERITED
+        if expr.flags & ExprFlags.PARAMETER_PATH or expr.type == ExprType.Parameter:
+            flags |= ExprFlags.PARAMETER_PATH
+        self._flags = flags
 
     @property
     def expr(self):
@@ -229,6 +274,7 @@ class AssignExpr(Expr):
         super().__init__()
         self._target = target
         self._value = value
+        self._flags = _merge_flags((target, value))
 
     @property
     def target(self):
@@ -255,6 +301,11 @@ class IndexExpr(Expr):
     def __init__(self, expr: IExpr, key: IExpr):
         self._expr = expr
         self._key = key
+        flags = _merge_flags((expr, key))
+        if key.type == ExprType.Const and \
+            (expr.flags & ExprFlags.PARAMETER_PATH or expr.type == ExprType.Parameter):
+            flags |= ExprFlags.PARAMETER_PATH
+        self._flags = flags
 
     @property
     def expr(self):
@@ -292,6 +343,7 @@ class UnaryExpr(Expr):
     def __init__(self, expr: IExpr, op: str):
         self._expr = expr
         self._op = op
+        self._flags = expr.flags & ExprFlags.INHERITED
 
     @property
     def expr(self):
@@ -315,6 +367,19 @@ class UnaryExpr(Expr):
     def accept(self, visitor):
         return visitor.visit_unary_expr(self)
 
+    _OP_FUNCS = {
+        'not': operator.not_,
+        '-': operator.neg,
+        '+': operator.pos,
+        '~': operator.invert,
+    }
+
+    def resolve_value(self):
+        func = self._OP_FUNCS.get(self._op)
+        if func is None:
+            raise NotImplementedError(f'not impl op: {self._op}')
+        return func(self._expr.resolve_value())
+
 
 class BinaryExpr(Expr):
     __slots__ = ('_left', '_right', '_op')
@@ -334,6 +399,7 @@ class BinaryExpr(Expr):
         self._left = left
         self._right = right
         self._op = op
+        self._flags = (left.flags | right.flags) & ExprFlags.INHERITED
 
     @property
     def left(self):
@@ -361,6 +427,45 @@ class BinaryExpr(Expr):
     def accept(self, visitor):
         return visitor.visit_binary_expr(self)
 
+    _OP_FUNCS = {
+        '<': operator.lt,
+        '<=': operator.le,
+        '==': operator.eq,
+        '!=': operator.ne,
+        '>': operator.gt,
+        '>=': operator.ge,
+        'in': lambda a, b: a in b,
+        'not in': lambda a, b: a not in b,
+        'is': operator.is_,
+        'is not': operator.is_not,
+        '+': operator.add,
+        '-': operator.sub,
+        '*': operator.mul,
+        '/': operator.truediv,
+        '//': operator.floordiv,
+        '%': operator.mod,
+        '**': operator.pow,
+        '&': operator.and_,
+        '|': operator.or_,
+        '^': operator.xor,
+        '<<': operator.lshift,
+        '>>': operator.rshift,
+        '+=': operator.iadd,
+        '-=': operator.isub,
+        '*=': operator.imul,
+    }
+
+    def resolve_value(self):
+        # `and` and `or` are short-circuit.
+        if self._op == 'and':
+            return self._left.resolve_value() and self._right.resolve_value()
+        if self._op == 'or':
+            return self._left.resolve_value() or self._right.resolve_value()
+        func = self._OP_FUNCS.get(self._op)
+        if func is None:
+            raise NotImplementedError(f'not impl op: {self._op}')
+        return func(self._left.resolve_value(), self._right.resolve_value())
+
 
 class CallExpr(Expr):
     __slots__ = ('_func', '_args', '_kwargs')
@@ -371,6 +476,7 @@ class CallExpr(Expr):
         self._func = func
         self._args = args
         self._kwargs = kwargs
+        self._flags = _merge_flags((func, *args, *kwargs.values())) | ExprFlags.CALL
 
     @property
     def func(self):
@@ -401,7 +507,7 @@ class CallExpr(Expr):
     def __repr__(self):
         exprs = [repr(self._func)]
         exprs.extend([repr(a) for a in self._args])
-        exprs.extend([f'k={repr(v)}' for k, v in self._kwargs.items()])
+        exprs.extend([f'{k}={repr(v)}' for k, v in self._kwargs.items()])
         inside = ', '.join(exprs)
         return f'CallExpr({inside})'
 
@@ -425,6 +531,7 @@ class FuncExpr(Expr):
         super().__init__()
         self._body = body
         self._args = args
+        self._flags = body.flags & ExprFlags.INHERITED
 
     @property
     def body(self):
@@ -454,13 +561,14 @@ class BuildListExpr(Expr):
 
     def __init__(self, *items: List[ValueExpr]):
         self._items = items
+        self._flags = _merge_flags(items)
 
     @property
     def items(self):
         return self._items
 
     def __str__(self):
-        items_str = ', '.join(f'{repr(v)}' for v in self._items)
+        items_str = ', '.join(f'{v}' for v in self._items)
         return f'[{items_str}]'
 
     def __repr__(self):
@@ -471,6 +579,9 @@ class BuildListExpr(Expr):
     def type(self):
         return ExprType.BuildList
 
+    def accept(self, visitor):
+        return visitor.visit_build_list_expr(self)
+
     def resolve_value(self):
         return [x.resolve_value() for x in self._items]
 
@@ -480,19 +591,27 @@ class BuildDictExpr(Expr):
 
     def __init__(self, *kvps: List[Tuple[ValueExpr, ValueExpr]]):
         self._kvps = kvps
+        self._flags = _merge_flags(x for kvp in kvps for x in kvp)
 
     @property
     def kvps(self):
         return self._kvps
 
     def __str__(self):
-        kvps_str = ', '.join(f'{repr(k.value)}: {repr(v.value)}' for k, v in self._kvps)
+        kvps_str = ', '.join(f'{k}: {v}' for k, v in self._kvps)
         return f'{{{kvps_str}}}'
 
+    def __repr__(self):
+        kvps_str = ', '.join(f'({repr(k)}, {repr(v)})' for k, v in self._kvps)
+        return f'BuildDictExpr({kvps_str})'
+
     @property
     def type(self):
         return ExprType.BuildDict
 
+    def accept(self, visitor):
+        return visitor.visit_build_dict_expr(self)
+
     def resolve_value(self):
         d = {}
         for k, v in self._kvps:
@@ -5,14 +5,26 @@
 # a func expr emiter
 # ----------
 
+import sys
+
 from bytecode.cfg import ControlFlowGraph
 from bytecode import (
-    Instr, Compare, FreeVar, Label
+    Instr, Compare, FreeVar
 )
+if sys.version_info >= (3, 11):
+    from bytecode import BinaryOp
+if sys.version_info >= (3, 12):
+    from bytecode import Intrinsic1Op
 
 from .core import ConstExpr
+from .utils import get_repeated_paths
 
 class ByteCodeEmitter:
+    '''
+    emit a `FuncExpr` as python function by module `bytecode`.
+
+    the opcodes are choosed by the running python version (3.7~3.13).
+    '''
     def __init__(self, func_expr):
         self._src_expr = func_expr
         self._cells = []
@@ -24,6 +36,14 @@ class ByteCodeEmitter:
         self._bytecode.freevars = ['<cell>']
         self._block_0 = self._bytecode[0]
         self._block = self._block_0 # current block
+        if sys.version_info >= (3, 11):
+            # the free vars are copied into the frame by the func itself.
+            self._block.append(Instr('COPY_FREE_VARS', 1))
+            self._block.append(Instr('RESUME', 0))
+        # the repeated parameter paths are stored into locals by `STORE_FAST`.
+        self._cse_paths = get_repeated_paths(func_expr)
+        self._cse_count = 0
+        self._cse_locals = {} # {path: name}, the paths which stored in current scope.
 
     def _print_blocks(self):
         for bi, block in enumerate(self._bytecode):
@@ -54,7 +74,9 @@ class ByteCodeEmitter:
 
     def on_expr(self, expr):
         method_name = 'on_' + type(expr).__name__.lower()
-        method = getattr(self, method_name)
+        method = getattr(self, method_name, None)
+        if method is None:
+            raise NotImplementedError(f'not impl expr: {type(expr).__name__}')
         return method(expr)
 
     def on_parameterexpr(self, expr):
@@ -73,62 +95,204 @@ class ByteCodeEmitter:
         self._block.append(Instr("LOAD_DEREF", FreeVar('<cell>')))
         self._block.append(Instr("LOAD_CONST", len(self._cells)))
         self._block.append(Instr("BINARY_SUBSCR"))
-        self._cells.append(expr) # lazy load value
-        self._block.append(Instr("LOAD_ATTR", 'value'))
+        self._cells.append(expr.cell) # lazy load value
+        self._load_attr('cell_contents')
+
+    def _load_attr(self, name):
+        if sys.version_info >= (3, 12):
+            # the flag means load a method.
+            self._block.append(Instr("LOAD_ATTR", (False, name)))
+        else:
+            self._block.append(Instr("LOAD_ATTR", name))
+
+    def _dup_top(self):
+        if sys.version_info >= (3, 11):
+            self._block.append(Instr("COPY", 1))
+        else:
+            self._block.append(Instr("DUP_TOP"))
+
+    def _cse(self, expr, emit_instrs):
+        path = repr(expr) if self._cse_paths else None
+        if path not in self._cse_paths:
+            return emit_instrs()
+        name = self._cse_locals.get(path)
+        if name is not None:
+            self._block.append(Instr("LOAD_FAST", name))
+            return
+        emit_instrs()
+        name = f'__lquery_cse_{self._cse_count}'
+        self._cse_count += 1
+        self._cse_locals[path] = name
+        self._dup_top()
+        self._block.append(Instr("STORE_FAST", name))
 
     def on_attrexpr(self, expr):
-        self.on_expr(expr.expr)
-        self._block.append(Instr("LOAD_ATTR", expr.name))
+        def emit_instrs():
+            self.on_expr(expr.expr)
+            self._load_attr(expr.name)
+        self._cse(expr, emit_instrs)
 
     def on_indexexpr(self, expr):
-        self.on_expr(expr.expr)
-        self.on_expr(expr.key)
-        self._block.append(Instr("BINARY_SUBSCR"))
+        def emit_instrs():
+            self.on_expr(expr.expr)
+            self.on_expr(expr.key)
+            self._block.append(Instr("BINARY_SUBSCR"))
+        self._cse(expr, emit_instrs)
+
+    # the names of `Compare`.
+    _COMPARE_OP_MAP = {
+        '<':    'LT',
+        '<=':   'LE',
+        '==':   'EQ',
+        '!=':   'NE',
+        '>':    'GT',
+        '>=':   'GE',
+        'in':   'IN',
+        'not in': 'NOT_IN',
+        'is':   'IS',
+        'is not': 'IS_NOT',
+    }
+
+    # python 3.9+: the opname and the arg.
+    _CONTAINS_OR_IS_OP_MAP = {
+        'in':   ('CONTAINS_OP', 0),
+        'not in': ('CONTAINS_OP', 1),
+        'is':   ('IS_OP', 0),
+        'is not': ('IS_OP', 1),
+    }
 
-    _OP_MAP = {
-        '<':    Compare.LT,
-        '<=':   Compare.LE,
-        '==':   Compare.EQ,
-        '!=':   Compare.NE,
-        '>':    Compare.GT,
-        '>=':   Compare.GE,
-        'in':   Compare.IN,
-        'not in': Compare.NOT_IN,
-        'is':   Compare.IS,
-        'is not': Compare.IS_NOT,
-        '':     Compare.EXC_MATCH,
+    # the names of `BINARY_*` opnames, or the names of `BinaryOp` on python 3.11+.
+    _BINARY_OP_MAP = {
+        '+':    ('BINARY_ADD', 'ADD'),
+        '-':    ('BINARY_SUBTRACT', 'SUBTRACT'),
+        '*':    ('BINARY_MULTIPLY', 'MULTIPLY'),
+        '/':    ('BINARY_TRUE_DIVIDE', 'TRUE_DIVIDE'),
+        '//':   ('BINARY_FLOOR_DIVIDE', 'FLOOR_DIVIDE'),
+        '%':    ('BINARY_MODULO', 'REMAINDER'),
+        '**':   ('BINARY_POWER', 'POWER'),
+        '&':    ('BINARY_AND', 'AND'),
+        '|':    ('BINARY_OR', 'OR'),
+        '^':    ('BINARY_XOR', 'XOR'),
+        '+=':   ('INPLACE_ADD', 'INPLACE_ADD'),
+        '-=':   ('INPLACE_SUBTRACT', 'INPLACE_SUBTRACT'),
+        '*=':   ('INPLACE_MULTIPLY', 'INPLACE_MULTIPLY'),
     }
 
+    _UNARY_OP_MAP = {
+        'not':  'UNARY_NOT',
+        '-':    'UNARY_NEGATIVE',
+        '+':    'UNARY_POSITIVE',
+        '~':    'UNARY_INVERT',
+    }
+
+    def on_unaryexpr(self, expr):
+        opname = self._UNARY_OP_MAP.get(expr.op)
+        if opname is None:
+            raise NotImplementedError(f'not impl op: {expr.op}')
+        self.on_expr(expr.expr)
+        if opname == 'UNARY_POSITIVE' and sys.version_info >= (3, 12):
+            self._block.append(Instr('CALL_INTRINSIC_1', Intrinsic1Op.INTRINSIC_UNARY_POSITIVE))
+            return
+        if opname == 'UNARY_NOT' and sys.version_info >= (3, 13):
+            # python 3.13+: `UNARY_NOT` require a bool.
+            self._block.append(Instr('TO_BOOL'))
+        self._block.append(Instr(opname))
+
+    def _append_compare_op(self, op):
+        if sys.version_info >= (3, 9) and op in self._CONTAINS_OR_IS_OP_MAP:
+            self._block.append(Instr(*self._CONTAINS_OR_IS_OP_MAP[op]))
+        else:
+            self._block.append(Instr("COMPARE_OP", getattr(Compare, self._COMPARE_OP_MAP[op])))
+
+    def _append_binary_op(self, op):
+        opname, name = self._BINARY_OP_MAP[op]
+        if sys.version_info >= (3, 11):
+            self._block.append(Instr("BINARY_OP", getattr(BinaryOp, name)))
+        else:
+            self._block.append(Instr(opname))
+
+    def _append_jump_or_pop(self, op, block_end):
+        '''
+        jump to `block_end` and keep the top if it is false (for `and`) or true (for `or`),
+        otherwise pop it.
+        '''
+        if sys.version_info < (3, 12):
+            opname = 'JUMP_IF_FALSE_OR_POP' if op == 'and' else 'JUMP_IF_TRUE_OR_POP'
+            self._block.append(Instr(opname, block_end))
+            return
+        # python 3.12+: the `POP_TOP` is the first instr of the next block.
+        self._dup_top()
+        if sys.version_info >= (3, 13):
+            self._block.append(Instr('TO_BOOL'))
+        opname = 'POP_JUMP_IF_FALSE' if op == 'and' else 'POP_JUMP_IF_TRUE'
+        self._block.append(Instr(opname, block_end))
+
     def on_binaryexpr(self, expr):
-        if expr.op in self._OP_MAP:
+        if expr.op in self._COMPARE_OP_MAP:
+            self.on_expr(expr.left)
+            self.on_expr(expr.right)
+            self._append_compare_op(expr.op)
+        elif expr.op in self._BINARY_OP_MAP:
             self.on_expr(expr.left)
             self.on_expr(expr.right)
-            self._block.append(Instr("COMPARE_OP", self._OP_MAP[expr.op]))
+            self._append_binary_op(expr.op)
         elif expr.op in ('and', 'or'):
             self.on_expr(expr.left)
             block_left = self._block
             block_right = self._bytecode.add_block()
             self._block = block_right
+            if sys.version_info >= (3, 12):
+                block_right.append(Instr('POP_TOP'))
+            # the right may not be evaluated, so the locals stored by it are unusable after it.
+            cse_locals = dict(self._cse_locals)
             self.on_expr(expr.right)
+            self._cse_locals = cse_locals
             if not self._block:
                 # like a and (b and c), has a empty block can reuse.
                 block_end = self._block
             else:
                 block_end = self._bytecode.add_block()
-            if expr.op == 'and':
-                block_left.append(Instr('JUMP_IF_FALSE_OR_POP', block_end))
-            else:
-                block_left.append(Instr('JUMP_IF_TRUE_OR_POP', block_end))
+            self._block = block_left
+            self._append_jump_or_pop(expr.op, block_end)
             self._block = block_end
         else:
             raise NotImplementedError(f'not impl op: {expr.op}')
 
     def on_callexpr(self, expr):
-        raise NotImplementedError
+        if (3, 11) <= sys.version_info < (3, 13):
+            # python 3.11~3.12: the `NULL` is below the func.
+            self._block.append(Instr("PUSH_NULL"))
+        self.on_expr(expr.func)
+        if sys.version_info >= (3, 13):
+            # python 3.13+: the `NULL` is above the func.
+            self._block.append(Instr("PUSH_NULL"))
+        for arg in expr.args:
+            self.on_expr(arg)
+        for value in expr.kwargs.values():
+            self.on_expr(value)
+        argc = len(expr.args) + len(expr.kwargs)
+        kw_names = tuple(expr.kwargs)
+        if sys.version_info >= (3, 13):
+            if kw_names:
+                self._block.append(Instr("LOAD_CONST", kw_names))
+                self._block.append(Instr("CALL_KW", argc))
+            else:
+                self._block.append(Instr("CALL", argc))
+        elif sys.version_info >= (3, 11):
+            if kw_names:
+                self._block.append(Instr("KW_NAMES", kw_names))
+            if sys.version_info < (3, 12):
+                self._block.append(Instr("PRECALL", argc))
+            self._block.append(Instr("CALL", argc))
+        elif kw_names:
+            self._block.append(Instr("LOAD_CONST", kw_names))
+            self._block.append(Instr("CALL_FUNCTION_KW", argc))
+        else:
+            self._block.append(Instr("CALL_FUNCTION", argc))
 
     def on_buildlistexpr(self, expr):
         for item in expr.items:
-            self._block.append(Instr("LOAD_CONST", item.value))
+            self.on_expr(item)
         self._block.append(Instr("BUILD_LIST", len(expr.items)))
 
     def on_builddictexpr(self, expr):
@@ -139,7 +303,11 @@ class ByteCodeEmitter:
             self._block.append(Instr("LOAD_CONST", tuple([k.value for k, v in expr.kvps])))
             self._block.append(Instr('BUILD_CONST_KEY_MAP', len(expr.kvps)))
             return
-        raise NotImplementedError
+        # BUILD_MAP
+        for k, v in expr.kvps:
+            self.on_expr(k)
+            self.on_expr(v)
+        self._block.append(Instr('BUILD_MAP', len(expr.kvps)))
 
 
 def emit(func_expr, *, debug=False):
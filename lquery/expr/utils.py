@@ -6,12 +6,14 @@
 # ----------
 
 from typing import Union
+from collections import Counter
+
 from .core import (
-    IExpr, ExprType,
+    IExpr, ExprType, ExprFlags, Make,
     ParameterExpr, ConstExpr, ReferenceExpr, AttrExpr,
     IndexExpr, BinaryExpr, CallExpr, FuncExpr, ValueExpr
 )
-from .visitor import ExprsIterExprVisitor, ExprVisitor
+from .visitor import ExprVisitor, DefaultExprVisitor, iter_exprs, get_sub_exprs
 
 def _get_attrs(expr, types, attr):
     fields = []
@@ -54,6 +56,40 @@ def get_deep_indexes(index_expr: IndexExpr):
     return indexes, cur_expr
 
 
+def is_parameter_path(expr: IExpr) -> bool:
+    '''
+    test is match `arg.a['b']...`, which all index keys are const.
+    '''
+    return bool(expr.flags & ExprFlags.PARAMETER_PATH)
+
+def iter_parameter_paths(expr: IExpr):
+    '''
+    iterate the parameter paths (see `is_parameter_path()`) in the `expr` in pre-order,
+    include the sub paths, like `x['a']` of `x['a']['b']`.
+
+    the sub exprs which does not require argument are skipped.
+    '''
+    stack = [expr]
+    while stack:
+        expr = stack.pop()
+        if not expr.flags & ExprFlags.REQUIRE_ARGUMENT:
+            continue
+        if expr.flags & ExprFlags.PARAMETER_PATH:
+            yield expr
+        stack.extend(reversed(get_sub_exprs(expr)))
+
+def get_repeated_paths(expr: IExpr) -> set:
+    '''
+    get the `repr()` of the parameter paths which occur more than once in the `expr`.
+
+    for example, `x['a']` is repeated in `'b' in x['a'] and x['a']['b'] == 1`.
+    '''
+    if expr.type == ExprType.Func:
+        expr = expr.body
+    counter = Counter(repr(e) for e in iter_parameter_paths(expr))
+    return set(k for k, v in counter.items() if v > 1)
+
+
 class RequireArgumentExprVisitor(ExprVisitor):
     def visit(self, expr):
         return False
@@ -65,8 +101,143 @@ def require_argument(expr: IExpr) -> bool:
     '''
     check is the `expr` reference or use argument to do some thing.
     '''
-    visitor = RequireArgumentExprVisitor()
-    for e in expr.accept(ExprsIterExprVisitor()):
-        if e.accept(visitor):
+    return bool(expr.flags & ExprFlags.REQUIRE_ARGUMENT)
+
+
+def read_closure(expr: IExpr) -> bool:
+    '''
+    check is the `expr` read any closure variable.
+    '''
+    return bool(expr.flags & ExprFlags.READ_CLOSURE)
+
+def is_pure(expr: IExpr) -> bool:
+    '''
+    check is the `expr` does not call any function, so evaluate it has no side effects
+    (except the properties).
+    '''
+    return not expr.flags & ExprFlags.CALL
+
+
+class ConstFoldingExprVisitor(DefaultExprVisitor):
+    '''
+    fold the sub exprs which does not require argument into `ConstExpr`,
+    so they are evaluated once instead of once per element.
+
+    for example, `lambda x: x.a > len(items)` => `lambda x: x.a > 3`.
+
+    a sub expr which raise error when folding is kept, so the error still raise (or not)
+    when the func is called.
+    '''
+    # pylint: disable=C0326
+    # the closure variables are read when folding.
+    SNAPSHOT_CLOSURE    = 1
+    # the exprs which read closure variables or call any function are kept,
+    # so they are evaluated on each call, and the exprs can be folded when the query is built.
+    LAZY_CLOSURE        = 2
+    # pylint: enable=C0326
+
+    def __init__(self, snapshot_policy=SNAPSHOT_CLOSURE):
+        assert snapshot_policy in (self.SNAPSHOT_CLOSURE, self.LAZY_CLOSURE)
+        self._snapshot_policy = snapshot_policy
+
+    def is_foldable(self, expr):
+        '''
+        check is the `expr` can be folded without evaluate it.
+        '''
+        if expr.type in (ExprType.Parameter, ExprType.Const, ExprType.Reference, ExprType.Func):
+            return False
+        if require_argument(expr):
+            return False
+        if self._snapshot_policy == self.LAZY_CLOSURE and (read_closure(expr) or not is_pure(expr)):
+            return False
+        return True
+
+    def _try_fold(self, expr):
+        '''
+        return a `ConstExpr`, or `None` if the `expr` cannot be folded.
+        '''
+        if not self.is_foldable(expr):
+            return None
+        try:
+            value = expr.resolve_value()
+        except Exception: # pylint: disable=W0703
+            return None
+        return Make.const(value)
+
+    def visit_deref_expr(self, expr):
+        return self._try_fold(expr) or expr
+
+    def visit_attr_expr(self, expr):
+        return self._try_fold(expr) or super().visit_attr_expr(expr)
+
+    def visit_index_expr(self, expr):
+        return self._try_fold(expr) or super().visit_index_expr(expr)
+
+    def visit_unary_expr(self, expr):
+        return self._try_fold(expr) or super().visit_unary_expr(expr)
+
+    def visit_binary_expr(self, expr):
+        return self._try_fold(expr) or super().visit_binary_expr(expr)
+
+    def visit_call_expr(self, expr):
+        folded = self._try_fold(expr)
+        if folded is not None:
+            return folded
+        func = yield expr.func
+        args = []
+        for e in expr.args:
+            args.append((yield e))
+        kwargs = {}
+        for k, v in expr.kwargs.items():
+            kwargs[k] = yield v
+        if func is not expr.func or \
+            any(a is not b for a, b in zip(args, expr.args)) or \
+            any(kwargs[k] is not v for k, v in expr.kwargs.items()):
+            expr = Make.call(func, *args, **kwargs)
+        return super().visit_call_expr(expr)
+
+    def visit_build_list_expr(self, expr):
+        folded = self._try_fold(expr)
+        if folded is not None:
+            return folded
+        items = []
+        for e in expr.items:
+            items.append((yield e))
+        if any(a is not b for a, b in zip(items, expr.items)):
+            return Make.build_list(*items)
+        return expr
+
+    def visit_build_dict_expr(self, expr):
+        folded = self._try_fold(expr)
+        if folded is not None:
+            return folded
+        kvps = []
+        for k, v in expr.kvps:
+            kvps.append(((yield k), (yield v)))
+        if any(a[0] is not b[0] or a[1] is not b[1] for a, b in zip(kvps, expr.kvps)):
+            return Make.build_dict(*kvps)
+        return expr
+
+
+def fold_const_exprs(expr: IExpr, *, snapshot_policy=ConstFoldingExprVisitor.SNAPSHOT_CLOSURE):
+    '''
+    partial evaluate the `expr` by `ConstFoldingExprVisitor`.
+
+    return the `expr` itself if nothing can be folded.
+    '''
+    return ConstFoldingExprVisitor(snapshot_policy).run(expr)
+
+def has_foldable_exprs(expr: IExpr, *, snapshot_policy=ConstFoldingExprVisitor.SNAPSHOT_CLOSURE):
+    '''
+    check is the `expr` has any sub expr which can be folded,
+    the closure variables themselves are not counted.
+
+    unlike `fold_const_exprs()`, this does not evaluate any expr.
+    '''
+    if expr.type == ExprType.Func:
+        expr = expr.body
+    visitor = ConstFoldingExprVisitor(snapshot_policy)
+    for e in iter_exprs(expr):
+        if e.type != ExprType.Deref and visitor.is_foldable(e):
             return True
     return False
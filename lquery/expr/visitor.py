@@ -5,9 +5,128 @@
 #
 # ----------
 
-from .core import Make, ConstExpr
+import types
+
+from .core import (
+    Make, ConstExpr, ExprFlags,
+    ParameterExpr, ReferenceExpr, DerefExpr,
+    AttrExpr, IndexExpr, UnaryExpr, BinaryExpr, CallExpr, FuncExpr,
+    BuildListExpr, BuildDictExpr,
+)
+
+# the type-keyed dispatch table for `ExprVisitor.run()`.
+_VISIT_METHOD_NAMES = {
+    AttrExpr: 'visit_attr_expr',
+    IndexExpr: 'visit_index_expr',
+    CallExpr: 'visit_call_expr',
+    FuncExpr: 'visit_func_expr',
+    UnaryExpr: 'visit_unary_expr',
+    BinaryExpr: 'visit_binary_expr',
+    ParameterExpr: 'visit_parameter_expr',
+    ConstExpr: 'visit_const_expr',
+    ReferenceExpr: 'visit_reference_expr',
+    DerefExpr: 'visit_deref_expr',
+    BuildListExpr: 'visit_build_list_expr',
+    BuildDictExpr: 'visit_build_dict_expr',
+}
+
+# the getters return the sub exprs in the reversed evaluation order, so they can push to a stack.
+_REVERSED_SUB_EXPRS_GETTERS = {
+    AttrExpr: lambda e: (e.expr, ),
+    IndexExpr: lambda e: (e.key, e.expr),
+    CallExpr: lambda e: tuple(e.kwargs.values())[::-1] + e.args[::-1] + (e.func, ),
+    FuncExpr: lambda e: (e.body, ),
+    UnaryExpr: lambda e: (e.expr, ),
+    BinaryExpr: lambda e: (e.right, e.left),
+    BuildListExpr: lambda e: e.items[::-1],
+    BuildDictExpr: lambda e: tuple(x for kvp in e.kvps[::-1] for x in kvp[::-1]),
+}
+
+def get_sub_exprs(expr) -> tuple:
+    '''
+    get the direct sub exprs of the `expr` in the evaluation order.
+    '''
+    getter = _REVERSED_SUB_EXPRS_GETTERS.get(type(expr))
+    return getter(expr)[::-1] if getter is not None else ()
+
+def iter_exprs(expr):
+    '''
+    iterate the `expr` and all sub exprs in pre-order, without recursion.
+    '''
+    getters = _REVERSED_SUB_EXPRS_GETTERS
+    stack = [expr]
+    pop, extend = stack.pop, stack.extend
+    while stack:
+        expr = pop()
+        yield expr
+        getter = getters.get(type(expr))
+        if getter is not None:
+            extend(getter(expr))
+
 
 class ExprVisitor:
+    '''
+    a visitor can be called by `expr.accept(visitor)`, which recurse once per node;
+    or by `visitor.run(expr)`, which visit the tree by a explicit stack,
+    so the depth of the tree is not limited by the recursion limit.
+
+    for `run()`, a visit method can be a generator function,
+    which `yield` a sub expr to get the result of visit it:
+
+    ``` py
+    def visit_unary_expr(self, expr):
+        src_expr = yield expr.expr
+        ...
+    ```
+    '''
+    _dispatch_table = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch_table = dict((k, getattr(cls, v)) for k, v in _VISIT_METHOD_NAMES.items())
+
+    def run(self, expr):
+        '''
+        visit the `expr` without recursion, return the result of the root expr.
+        '''
+        table = self._dispatch_table
+        generator_type = types.GeneratorType
+        stack = [] # the generators which wait the result of a sub expr
+        push, pop = stack.append, stack.pop
+        gen, error = None, None
+        sub_expr = expr
+        while True:
+            # visit `sub_expr`:
+            try:
+                method = table.get(type(sub_expr))
+                result = sub_expr.accept(self) if method is None else method(self, sub_expr)
+            except Exception as err: # pylint: disable=W0703
+                error = err
+            else:
+                if type(result) is generator_type:
+                    if gen is not None:
+                        push(gen)
+                    gen, result = result, None
+            # resume the generators until one of them yield a sub expr:
+            while True:
+                if gen is None:
+                    if error is not None:
+                        raise error
+                    return result
+                try:
+                    if error is not None:
+                        # raise the error from the `yield`, like recursion.
+                        err, error = error, None
+                        sub_expr = gen.throw(err)
+                    else:
+                        sub_expr = gen.send(result)
+                    break
+                except StopIteration as stop:
+                    result = stop.value
+                except Exception as err: # pylint: disable=W0703
+                    error = err
+                gen = pop() if stack else None
+
     def visit(self, expr):
         return expr
 
@@ -41,39 +160,59 @@ class ExprVisitor:
     def visit_deref_expr(self, expr):
         return self.visit(expr)
 
+    def visit_build_list_expr(self, expr):
+        return self.visit(expr)
+
+    def visit_build_dict_expr(self, expr):
+        return self.visit(expr)
+
 
 class DefaultExprVisitor(ExprVisitor):
+    '''
+    rebuild the expr tree, the methods which visit sub exprs are generators,
+    so use `run()` instead of `accept()`.
+    '''
 
     def visit_attr_expr(self, expr):
-        src_expr = expr.expr.accept(self)
+        src_expr = yield expr.expr
         if src_expr is expr.expr:
             return expr
         return Make.attr(src_expr, expr.name)
 
     def visit_index_expr(self, expr):
-        src_expr = expr.expr.accept(self)
-        key_expr = expr.key.accept(self)
+        src_expr = yield expr.expr
+        key_expr = yield expr.key
         if src_expr is expr.expr and key_expr is expr.key:
             return expr
-        return Make.attr(src_expr, expr.name)
+        return Make.index(src_expr, key_expr)
 
     def visit_call_expr(self, expr):
-        if expr.func.resolve_value() is getattr:
+        if expr.func.flags & ExprFlags.REQUIRE_ARGUMENT:
+            # method of argument, like `x.name.lower()`
+            return expr
+        func = expr.func.resolve_value()
+        if func is getattr:
             if len(expr.args) == 2 and not expr.kwargs:
                 attr_expr = expr.args[1]
                 if isinstance(attr_expr, ConstExpr) and isinstance(attr_expr.value, str):
                     return Make.attr(expr.args[0], attr_expr.value)
         return expr
 
+    def visit_unary_expr(self, expr):
+        src_expr = yield expr.expr
+        if src_expr is expr.expr:
+            return expr
+        return Make.unary_op(src_expr, expr.op)
+
     def visit_binary_expr(self, expr):
-        left = expr.left.accept(self)
-        right = expr.right.accept(self)
+        left = yield expr.left
+        right = yield expr.right
         if left is expr.left and right is expr.right:
             return expr
         return Make.binary_op(left, expr.op, right)
 
     def visit_func_expr(self, expr):
-        body = expr.body.accept(self)
+        body = yield expr.body
         if body is not expr.body:
             return Make.func(body, *expr.args)
         return expr
@@ -85,32 +224,15 @@ class ValueResolverExprVisitor(ExprVisitor):
 
 
 class ExprsIterExprVisitor(ExprVisitor):
+    '''
+    iterate all exprs in pre-order by `expr.accept(visitor)`, see `iter_exprs()`.
+    '''
     def visit(self, expr):
-        yield expr
-
-    def visit_attr_expr(self, expr):
-        yield expr
-        yield from expr.expr.accept(self)
-
-    def visit_index_expr(self, expr):
-        yield expr
-        yield from expr.expr.accept(self)
-        yield from expr.key.accept(self)
-
-    def visit_call_expr(self, expr):
-        yield expr
-        expr_list = list(expr.args) + list(expr.kwargs.values())
-        for e in expr_list:
-            yield from e.accept(self)
+        return iter_exprs(expr)
 
     def visit_func_expr(self, expr):
         raise NotImplementedError
 
-    def visit_unary_expr(self, expr):
-        yield expr
-        yield from expr.expr.accept(self)
 
-    def visit_binary_expr(self, expr):
-        yield expr
-        yield from expr.left.accept(self)
-        yield from expr.right.accept(self)
+ExprVisitor._dispatch_table = dict(
+    (k, getattr(ExprVisitor, v)) for k, v in _VISIT_METHOD_NAMES.items())
@@ -5,6 +5,8 @@
 #
 # ----------
 
+import inspect
+
 import asq.record
 
 class NotSupportError(Exception):
@@ -23,3 +25,43 @@ class Record(asq.record.Record):
 
 def new(**kwargs):
     return Record(**kwargs)
+
+
+def bind_call_args(expr):
+    '''
+    get the `inspect.BoundArguments` of the linq method call.
+    '''
+    func = expr.func.resolve_value()
+    args = [e.resolve_value() for e in expr.args]
+    kwargs = dict((k, v.resolve_value()) for k, v in expr.kwargs.items())
+    return inspect.signature(func).bind(*args, **kwargs)
+
+
+def add_sort_key(keys: tuple, group_size: int, key: tuple, then: bool):
+    '''
+    add a sort `key` `(field, descending)` into the sort `keys` by `order_by()` or `then_by()`,
+    `group_size` is the count of the first keys which from the latest `order_by()` and its `then_by()`.
+
+    a stable sort of the sorted items is same as sort by the new group first,
+    so `order_by(a).order_by(b).then_by(d)` => `(b, d, a)`.
+    the keys of a field which already sorted by a previous key are dropped, they never change the order.
+
+    return `(keys, group_size)`.
+    '''
+    if then:
+        keys = keys[:group_size] + (key, ) + keys[group_size:]
+        group_size += 1
+    else:
+        keys = (key, ) + keys
+        group_size = 1
+    fields = set()
+    result = []
+    result_group_size = 0
+    for index, (field, descending) in enumerate(keys):
+        if field in fields:
+            continue
+        fields.add(field)
+        result.append((field, descending))
+        if index < group_size:
+            result_group_size += 1
+    return tuple(result), result_group_size
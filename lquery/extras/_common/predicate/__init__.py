@@ -12,13 +12,18 @@ all operators:
 not,
 
 # binary
-==, >, >=, <, <=,
+==, >, >=, <, <=, !=, in, not in,
+
+the predicates are merged by the tables which declared by `declare_*` methods,
+or by the interval set algebra (see `interval.py`) if all values are ordered,
+see `merge_predicates()`.
 '''
 
 from operator import attrgetter
 from typing import Dict, Callable, List
 
 from .. import NotSupportError
+from .interval import IntervalSet
 
 class PredicateConflictError(Exception):
     '''
@@ -47,6 +52,14 @@ class Predicate:
         '''
         raise NotSupportError
 
+    def check_conflict(self, other):
+        '''
+        check two predicate which cannot merge.
+
+        raise `PredicateConflictError` if they cannot happen in same.
+        '''
+        pass
+
     _TABLE_CLS_BINARY: Dict[str, Callable[[str, object], object]] = {}
 
     @classmethod
@@ -67,7 +80,7 @@ class Predicate:
         return cls._TABLE_CLS_BINARY[op](op, value)
 
 
-@Predicate.declare_binary_cls('==', '>', '>=', '<', '<=',)
+@Predicate.declare_binary_cls('==', '>', '>=', '<', '<=', '!=', 'in', 'not in')
 class BinaryPredicate(Predicate):
     def __init__(self, op: str, value):
         self._op = op
@@ -113,6 +126,16 @@ class BinaryPredicate(Predicate):
                             return func(other, self)
         return super().merge(other)
 
+    def check_conflict(self, other):
+        if isinstance(other, BinaryPredicate):
+            func = self._TABLE_CHECK_DIFF_OP.get((self._op, other.op))
+            if func is not None:
+                return func(self, other)
+            func = self._TABLE_CHECK_DIFF_OP.get((other.op, self._op))
+            if func is not None:
+                return func(other, self)
+        return super().check_conflict(other)
+
     _TABLE_MERGE_SAME_OP: Dict[str, Callable[[Predicate, str], Predicate]] = {}
 
     @classmethod
@@ -134,6 +157,17 @@ class BinaryPredicate(Predicate):
             return func
         return _
 
+    _TABLE_CHECK_DIFF_OP: Dict[str, Callable[[Predicate, Predicate], None]] = {}
+
+    @classmethod
+    def declare_check_diff_op(cls, *opps):
+        def _(func):
+            for opp in opps:
+                # opp is op pair like ('>', '<')
+                cls._TABLE_CHECK_DIFF_OP[opp] = func
+            return func
+        return _
+
 
 @BinaryPredicate.declare_merge_same_op('==')
 def same_op_merge_eq(self, other):
@@ -163,6 +197,18 @@ def diff_op_merge_eq_ge(first, second):
         raise PredicateConflictError(f'cannot ($ == {first.value}) and ($ {second.op} {second.value})')
     return first
 
+@BinaryPredicate.declare_merge_diff_op(('==', '<'))
+def diff_op_merge_eq_lt(first, second):
+    if first.value >= second.value:
+        raise PredicateConflictError(f'cannot ($ == {first.value}) and ($ {second.op} {second.value})')
+    return first
+
+@BinaryPredicate.declare_merge_diff_op(('==', '<='))
+def diff_op_merge_eq_le(first, second):
+    if first.value > second.value:
+        raise PredicateConflictError(f'cannot ($ == {first.value}) and ($ {second.op} {second.value})')
+    return first
+
 @BinaryPredicate.declare_merge_diff_op(('>=', '>'))
 def diff_op_merge_g(first, second):
     # take max
@@ -176,3 +222,69 @@ def diff_op_merge_l(first, second):
     if first.value == second.value:
         return first
     return min(first, second, key=attrgetter('value'))
+
+# the pairs which the result always is a single predicate:
+@BinaryPredicate.declare_merge_same_op('in', 'not in', '!=')
+@BinaryPredicate.declare_merge_diff_op(
+    ('==', '!='), ('==', 'in'), ('==', 'not in'),
+    ('in', '!='), ('in', 'not in'), ('in', '>'), ('in', '>='), ('in', '<'), ('in', '<='),
+    ('!=', 'not in'),
+)
+def merge_by_interval_set(first, second):
+    merged = _merge_by_interval_set([first, second])
+    if len(merged) != 1:
+        raise NotSupportError
+    return merged[0]
+
+@BinaryPredicate.declare_check_diff_op(('>', '<'), ('>', '<='), ('>=', '<'), ('>=', '<='))
+def diff_op_check_range(lower, upper):
+    if lower.value < upper.value:
+        return
+    if lower.value == upper.value and lower.op == '>=' and upper.op == '<=':
+        return
+    raise PredicateConflictError(
+        f'cannot ($ {lower.op} {lower.value}) and ($ {upper.op} {upper.value})')
+
+
+def _merge_by_interval_set(predicates: List[Predicate]) -> List[Predicate]:
+    '''
+    raise `TypeError` if the values are not ordered,
+    or `NotSupportError` if the result cannot be represented as a list of predicates.
+    '''
+    if not all(isinstance(x, BinaryPredicate) for x in predicates):
+        raise NotSupportError
+    values = IntervalSet.all()
+    for predicate in predicates:
+        values = values.intersection(IntervalSet.from_op(predicate.op, predicate.value))
+    if values.is_empty:
+        raise PredicateConflictError('cannot ' + ' and '.join(f'($ {x})' for x in predicates))
+    ops = values.to_ops()
+    if ops is None:
+        raise NotSupportError
+    return [Predicate.create_binary(op, value) for op, value in ops]
+
+def merge_predicates(predicates: List[Predicate]) -> List[Predicate]:
+    '''
+    merge the predicates which all must be true for the same value.
+
+    raise `PredicateConflictError` if they cannot happen in same.
+    '''
+    try:
+        return _merge_by_interval_set(predicates)
+    except (TypeError, NotSupportError):
+        pass
+    pending = list(predicates)
+    merged = []
+    while pending:
+        predicate = pending.pop(0)
+        for index, exists in enumerate(merged):
+            if exists.can_merge(predicate):
+                del merged[index]
+                # the merged predicate may merge with others.
+                pending.insert(0, exists.merge(predicate))
+                break
+        else:
+            for exists in merged:
+                exists.check_conflict(predicate)
+            merged.append(predicate)
+    return merged
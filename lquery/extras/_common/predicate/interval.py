@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# the interval set algebra for the ordered values.
+# ----------
+
+'''
+a `IntervalSet` is a sorted list of disjoint `Interval`,
+so `==`, `>`, `>=`, `<`, `<=`, `!=`, `in` and `not in` all can be represented as it:
+
+- `$ > 3`: `(3, +inf)`
+- `$ in [1, 2]`: `[1, 1] [2, 2]`
+- `$ != 1`: `(-inf, 1) (1, +inf)`
+
+all values must be comparable with each others, otherwise `TypeError` will be raised.
+'''
+
+from typing import List, Tuple, Optional
+
+# a bound is a tuple `(value, closed)`, and the value `None` mean infinity.
+_INF = (None, False)
+
+
+def _check_value(value):
+    if value is None:
+        raise TypeError('None is not a ordered value')
+    if value != value:
+        # like float('nan')
+        raise TypeError(f'{value!r} is not a ordered value')
+    return value
+
+def _max_lower(first, second):
+    if first[0] is None:
+        return second
+    if second[0] is None:
+        return first
+    if first[0] == second[0]:
+        # the open bound is tighter
+        return second if first[1] else first
+    return first if first[0] > second[0] else second
+
+def _min_upper(first, second):
+    if first[0] is None:
+        return second
+    if second[0] is None:
+        return first
+    if first[0] == second[0]:
+        return second if first[1] else first
+    return first if first[0] < second[0] else second
+
+def _is_valid(lower, upper):
+    if lower[0] is None or upper[0] is None:
+        return True
+    if lower[0] < upper[0]:
+        return True
+    return lower[0] == upper[0] and lower[1] and upper[1]
+
+
+class Interval:
+    __slots__ = ('lower', 'upper')
+
+    def __init__(self, lower: Tuple[object, bool], upper: Tuple[object, bool]):
+        self.lower = lower
+        self.upper = upper
+
+    def __eq__(self, other):
+        if isinstance(other, Interval):
+            return (self.lower, self.upper) == (other.lower, other.upper)
+        return False
+
+    def __repr__(self):
+        lower = '(-inf' if self.lower[0] is None else ('[' if self.lower[1] else '(') + repr(self.lower[0])
+        upper = '+inf)' if self.upper[0] is None else repr(self.upper[0]) + (']' if self.upper[1] else ')')
+        return f'{lower}, {upper}'
+
+    @property
+    def is_point(self):
+        return self.lower[0] is not None and self.lower[1] and self.upper == self.lower
+
+
+class IntervalSet:
+    '''
+    a immutable set of the ordered values.
+    '''
+    __slots__ = ('_intervals',)
+
+    def __init__(self, intervals: List[Interval]):
+        # the intervals must be sorted, disjoint and not adjacent.
+        self._intervals = tuple(intervals)
+
+    def __eq__(self, other):
+        if isinstance(other, IntervalSet):
+            return self._intervals == other._intervals
+        return False
+
+    def __repr__(self):
+        if not self._intervals:
+            return 'IntervalSet()'
+        return 'IntervalSet(' + ' '.join(repr(x) for x in self._intervals) + ')'
+
+    @property
+    def intervals(self):
+        return self._intervals
+
+    @property
+    def is_empty(self):
+        return not self._intervals
+
+    @classmethod
+    def all(cls):
+        return cls([Interval(_INF, _INF)])
+
+    @classmethod
+    def points(cls, values):
+        values = sorted(_check_value(v) for v in values)
+        intervals = []
+        for value in values:
+            if intervals and intervals[-1].lower[0] == value:
+                continue
+            intervals.append(Interval((value, True), (value, True)))
+        return cls(intervals)
+
+    @classmethod
+    def from_op(cls, op: str, value):
+        '''
+        create the set of the values which match `$ {op} {value}`.
+        '''
+        if op == '==':
+            return cls.points([value])
+        if op == '!=':
+            return cls.points([value]).complement()
+        if op == 'in':
+            return cls.points(value)
+        if op == 'not in':
+            return cls.points(value).complement()
+        _check_value(value)
+        if op in ('>', '>='):
+            return cls([Interval((value, op == '>='), _INF)])
+        if op in ('<', '<='):
+            return cls([Interval(_INF, (value, op == '<='))])
+        raise ValueError(op)
+
+    def intersection(self, other):
+        first, second = self._intervals, other.intervals
+        intervals = []
+        i = j = 0
+        while i < len(first) and j < len(second):
+            lower = _max_lower(first[i].lower, second[j].lower)
+            upper = _min_upper(first[i].upper, second[j].upper)
+            if _is_valid(lower, upper):
+                intervals.append(Interval(lower, upper))
+            # drop the interval which end first
+            if _min_upper(first[i].upper, second[j].upper) is first[i].upper:
+                i += 1
+            else:
+                j += 1
+        return IntervalSet(intervals)
+
+    def complement(self):
+        intervals = []
+        lower = _INF
+        for interval in self._intervals:
+            if interval.lower[0] is not None:
+                upper = (interval.lower[0], not interval.lower[1])
+                if _is_valid(lower, upper):
+                    intervals.append(Interval(lower, upper))
+            if interval.upper[0] is None:
+                return IntervalSet(intervals)
+            lower = (interval.upper[0], not interval.upper[1])
+        intervals.append(Interval(lower, _INF))
+        return IntervalSet(intervals)
+
+    def union(self, other):
+        return self.complement().intersection(other.complement()).complement()
+
+    def to_ops(self) -> Optional[List[Tuple[str, object]]]:
+        '''
+        get the smallest list of `(op, value)` which all match the values of the set.
+
+        return `None` if the set cannot be represented as that, like `(-inf, 1) (3, +inf)`;
+        return a empty list if the set contains all values.
+        '''
+        intervals = self._intervals
+        if not intervals:
+            raise ValueError('the set is empty')
+        if all(x.is_point for x in intervals):
+            if len(intervals) == 1:
+                return [('==', intervals[0].lower[0])]
+            return [('in', [x.lower[0] for x in intervals])]
+        # a range with holes
+        holes = []
+        for prev, interval in zip(intervals, intervals[1:]):
+            if prev.upper[1] or interval.lower[1] or prev.upper[0] != interval.lower[0]:
+                return None
+            holes.append(prev.upper[0])
+        ops = []
+        lower, upper = intervals[0].lower, intervals[-1].upper
+        if lower[0] is not None:
+            ops.append(('>=' if lower[1] else '>', lower[0]))
+        if upper[0] is not None:
+            ops.append(('<=' if upper[1] else '<', upper[0]))
+        if len(holes) == 1:
+            ops.append(('!=', holes[0]))
+        elif holes:
+            ops.append(('not in', holes))
+        return ops
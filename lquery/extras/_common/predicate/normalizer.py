@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# normalize the predicate of `where()` into CNF or DNF,
+# and merge the predicates of each field by the predicate tables.
+# ----------
+
+import datetime
+import decimal
+import fractions
+from typing import List, Dict, Optional
+
+from ....expr import IExpr, ExprType
+from ....expr.builder import to_func_expr
+from ....expr.utils import is_parameter_path, fold_const_exprs, ConstFoldingExprVisitor
+
+from .. import NotSupportError
+from . import Predicate, PredicateConflictError, merge_predicates
+
+# the types which all values are comparable and totally ordered.
+_ORDERED_TYPES = (
+    int, float, str, bytes,
+    datetime.date, datetime.time, datetime.timedelta,
+    decimal.Decimal, fractions.Fraction,
+)
+
+
+class FieldTerm:
+    '''
+    a term like `x['a'] > 1`.
+    '''
+    __slots__ = ('field', 'predicate')
+
+    def __init__(self, field: IExpr, predicate: Predicate):
+        self.field = field
+        self.predicate = predicate
+
+    def __str__(self):
+        return f'{self.field} {self.predicate}'
+
+
+class UnknownTerm:
+    '''
+    a term which the normalizer does not know how to merge, like `x['a'].startswith('?')`.
+    '''
+    __slots__ = ('expr', 'negated')
+
+    def __init__(self, expr: IExpr, negated: bool):
+        self.expr = expr
+        self.negated = negated
+
+    def __str__(self):
+        return f'not ({self.expr})' if self.negated else str(self.expr)
+
+
+class TooManyClausesError(Exception):
+    '''
+    raise when the normal form is too large.
+    '''
+
+
+class PredicateNormalizer:
+    '''
+    normalize the body of a predicate `FuncExpr` into CNF or DNF.
+
+    the clauses are lists of `FieldTerm` and `UnknownTerm`.
+    '''
+    _SWAPABLE_OP_MAP = {
+        '==': '==',
+        '>': '<',
+        '<': '>',
+        '>=': '<=',
+        '<=': '>=',
+        '!=': '!=',
+    }
+
+    _LOGIC_OP_MAP = {
+        'and': 'and',
+        '&': 'and',
+        'or': 'or',
+        '|': 'or',
+    }
+
+    def __init__(self, func_expr, *, max_clauses: int = 64):
+        self._func_expr = func_expr
+        self._max_clauses = max_clauses
+        self._tree = self._build(func_expr.body, False)
+
+    def to_dnf(self) -> List[list]:
+        '''
+        get the disjunctive normal form, a list of the `and` clauses.
+        '''
+        return self._expand(self._tree, 'or')
+
+    def to_cnf(self) -> List[list]:
+        '''
+        get the conjunctive normal form, a list of the `or` clauses.
+        '''
+        return self._expand(self._tree, 'and')
+
+    def _is_bool_expr(self, expr):
+        stack = [expr]
+        while stack:
+            expr = stack.pop()
+            if expr.type == ExprType.Unary and expr.op == 'not':
+                continue
+            if expr.type != ExprType.Binary:
+                return False
+            if expr.op in self._LOGIC_OP_MAP:
+                stack.append(expr.left)
+                stack.append(expr.right)
+            elif expr.op not in self._SWAPABLE_OP_MAP and expr.op not in ('in', 'not in', 'is', 'is not'):
+                return False
+        return True
+
+    def _get_operands(self, expr):
+        '''
+        split `a or b or c` to `[a, b, c]`, without recursion for the long chain.
+        '''
+        operands = []
+        stack = [expr]
+        while stack:
+            operand = stack.pop()
+            if operand.type == ExprType.Binary and operand.op == expr.op:
+                stack.append(operand.right)
+                stack.append(operand.left)
+            else:
+                operands.append(operand)
+        return operands
+
+    def _build(self, expr, negated: bool):
+        '''
+        build a tree: `(op, [children])` for `and` and `or`, or a term.
+        '''
+        if expr.type == ExprType.Unary and expr.op == 'not':
+            return self._build(expr.expr, not negated)
+        if expr.type == ExprType.Binary:
+            op = self._LOGIC_OP_MAP.get(expr.op)
+            if op is not None:
+                operands = self._get_operands(expr)
+                if expr.op in ('and', 'or') or all(self._is_bool_expr(x) for x in operands):
+                    if negated:
+                        # De Morgan's laws
+                        op = 'or' if op == 'and' else 'and'
+                    return (op, [self._build(x, negated) for x in operands])
+            if not negated:
+                term = self._get_field_term(expr)
+                if term is not None:
+                    return term
+        return UnknownTerm(expr, negated)
+
+    def _is_field(self, expr):
+        return expr.type == ExprType.Parameter or is_parameter_path(expr)
+
+    def _get_field_term(self, expr):
+        left, op, right = expr.left, expr.op, expr.right
+        if left.type == ExprType.Const and self._is_field(right):
+            op = self._SWAPABLE_OP_MAP.get(op)
+            left, right = right, left
+        if op is None or not self._is_field(left) or right.type != ExprType.Const:
+            return None
+        if op in ('in', 'not in'):
+            if not isinstance(right.value, (list, tuple, set, frozenset)):
+                return None
+            if not all(isinstance(x, _ORDERED_TYPES) for x in right.value):
+                return None
+        elif not isinstance(right.value, _ORDERED_TYPES):
+            return None
+        try:
+            predicate = Predicate.create_binary(op, right.value)
+        except NotSupportError:
+            return None
+        return FieldTerm(left, predicate)
+
+    def _expand(self, tree, outer_op: str):
+        if not isinstance(tree, tuple):
+            return [[tree]]
+        op, children = tree
+        children_clauses = [self._expand(c, outer_op) for c in children]
+        if op == outer_op:
+            clauses = [clause for clauses in children_clauses for clause in clauses]
+        else:
+            # distribute
+            clauses = [[]]
+            for child_clauses in children_clauses:
+                clauses = [a + b for a in clauses for b in child_clauses]
+                if len(clauses) > self._max_clauses:
+                    raise TooManyClausesError
+        if len(clauses) > self._max_clauses:
+            raise TooManyClausesError
+        return clauses
+
+
+def merge_and_clause(clause: list) -> Dict[str, List[Predicate]]:
+    '''
+    merge the `FieldTerm`s of a `and` clause, return a dict `{repr(field): predicates}`.
+
+    raise `PredicateConflictError` if the clause never be true.
+    '''
+    terms_map = {}
+    for term in clause:
+        if isinstance(term, FieldTerm):
+            terms_map.setdefault(repr(term.field), []).append(term.predicate)
+    merged = {}
+    for field, predicates in terms_map.items():
+        try:
+            merged[field] = merge_predicates(predicates)
+        except TypeError:
+            # the values are not comparable.
+            merged[field] = predicates
+    return merged
+
+def get_conflict_reason(predicate) -> Optional[str]:
+    '''
+    get the reason if the `predicate` (the arg of `where()`) never return true,
+    otherwise return `None`.
+
+    the closure variables are not read, so they can still change before execute.
+    '''
+    func_expr = to_func_expr(predicate)
+    if func_expr is None or len(func_expr.args) != 1:
+        return None
+    func_expr = fold_const_exprs(func_expr, snapshot_policy=ConstFoldingExprVisitor.LAZY_CLOSURE)
+    try:
+        dnf = PredicateNormalizer(func_expr).to_dnf()
+    except TooManyClausesError:
+        return None
+    reasons = []
+    for clause in dnf:
+        try:
+            merge_and_clause(clause)
+        except PredicateConflictError as conflict:
+            reasons.append(conflict.reason)
+            continue
+        return None
+    return '; '.join(reasons)
@@ -12,14 +12,15 @@ from ...expr.visitor import DefaultExprVisitor
 class DbExprVisitor(DefaultExprVisitor):
     '''
     provide many method for rewrite expr, but you need to manual call it.
+
+    like `DefaultExprVisitor`, use `run()` instead of `accept()`.
     '''
     def rewrite_attr_expr_to_index_expr(self, expr: AttrExpr):
         '''
-        rewrite `expr.name` => `expr['name']`
+        rewrite `expr.name` => `expr['name']`, the `expr.expr` should be visited.
         '''
         assert expr.type == ExprType.Attr
-        expr_body = expr.expr.accept(self)
-        return Make.index(expr_body, Make.const(expr.name))
+        return Make.index(expr.expr, Make.const(expr.name))
 
     def is_get_deep_indexes_from_parameter(self, expr):
         '''
@@ -35,6 +35,12 @@ class NextMongoDbQuery(AbstractQueryable):
     def __iter__(self):
         yield from self.get_cursor()
 
+    def explain(self):
+        '''
+        get the query plan from mongodb, use for check whether index was used.
+        '''
+        return self.get_cursor().explain()
+
     @property
     def collection(self):
         return self._collection
@@ -48,21 +54,34 @@ class NextMongoDbQuery(AbstractQueryable):
 
 
 class MongoDbQuery(NextMongoDbQuery):
-    def __init__(self, collection):
-        super().__init__(Make.ref(self), collection, QueryOptions())
+    def __init__(self, collection, *, collation=None):
+        query_options = QueryOptions()
+        query_options.collation = collation
+        super().__init__(Make.ref(self), collection, query_options)
 
     def update_reduce_info(self, reduce_info: ReduceInfo):
         reduce_info.add_node(ReduceInfo.TYPE_SRC, self.expr)
 
 
+_PUSHDOWN_FUNCS = (
+    LinqQuery.where, LinqQuery.skip, LinqQuery.take,
+    LinqQuery.order_by, LinqQuery.order_by_descending, LinqQuery.then_by, LinqQuery.then_by_descending,
+)
+
+
 class MongoDbQueryProvider(IterableQueryProvider):
+    SORTED_QUERY_TYPES = IterableQueryProvider.SORTED_QUERY_TYPES + (NextMongoDbQuery, )
+
     def create_query(self, expr):
-        if expr.func.resolve_value() in (LinqQuery.where, LinqQuery.skip, LinqQuery.take):
+        empty_query = self.try_create_empty_query(expr)
+        if empty_query is not None:
+            return empty_query
+        if expr.func.resolve_value() in _PUSHDOWN_FUNCS and len(expr.args) == 2 and not expr.kwargs:
             queryable = expr.args[0].value
             query_options = copy.deepcopy(queryable.query_options)
             visitor = QueryOptionsRootExprVisitor(query_options)
             try:
-                expr.accept(visitor)
+                visitor.run(expr)
                 return NextMongoDbQuery(expr, queryable.collection, query_options)
             except AlwaysEmptyError as always_empty:
                 return EmptyQuery(expr, always_empty.reason)
@@ -5,19 +5,41 @@
 #
 # ----------
 
-from .._common import NotSupportError, AlwaysEmptyError
+import re
+
+from .._common import NotSupportError, AlwaysEmptyError, add_sort_key
+from .._common.predicate import Predicate, PredicateConflictError, merge_predicates
 
 class QueryOptions:
     def __init__(self):
         self.filter = {}
         self.skip = None
         self.limit = None
+        self.sort = None
+        # the count of the first keys of `sort` from the latest `order_by()`, see `add_sort_key()`.
+        self.sort_group_size = 0
+        self.collation = None
+
+    @property
+    def is_case_insensitive(self):
+        '''
+        test whether the collation compare strings without case (but with diacritics).
+        '''
+        collation = getattr(self.collation, 'document', self.collation) # `pymongo.collation.Collation`
+        return bool(collation) and collation.get('strength') == 2
 
     def get_cursor(self, collection):
+        kwargs = {}
+        if self.collation is not None:
+            kwargs['collation'] = self.collation
+        if self.sort is not None:
+            # `_id` is unique, so the order of the documents which have the same keys is stable.
+            kwargs['sort'] = self.sort + ([('_id', 1)] if all(k != '_id' for k, _ in self.sort) else [])
         cursor = collection.find(
             filter=self.filter,
             skip=self.skip or 0,
-            limit=self.limit or 0)
+            limit=self.limit or 0,
+            **kwargs)
         return cursor
 
 
@@ -32,6 +54,9 @@ class QueryOptionsUpdater:
     def op_binary(self, op: str, other):
         raise NotSupportError
 
+    def op_startswith(self, prefix: str):
+        raise NotSupportError
+
     @staticmethod
     def add_skip(value):
         return QueryOptionsSkipUpdater(value)
@@ -40,6 +65,10 @@ class QueryOptionsUpdater:
     def add_limit(value):
         return QueryOptionsLimitUpdater(value)
 
+    @staticmethod
+    def add_sort(field_name, descending: bool, then: bool):
+        return QueryOptionsSortUpdater(field_name, descending, then)
+
     @staticmethod
     def add_filter_field(field_name, value):
         updater = QueryOptionsFilterFieldsListUpdater()
@@ -51,6 +80,18 @@ class QueryOptionsUpdater:
         updater = QueryOptionsFilterFieldUpdater(field_name)
         return updater
 
+    @staticmethod
+    def filter_field_regex(field_name, pattern: str, options: str=''):
+        value = {'$regex': pattern}
+        if options:
+            value['$options'] = options
+        return QueryOptionsUpdater.add_filter_field(field_name, value)
+
+    @staticmethod
+    def filter_field_lower(field_name, case_insensitive: bool=False):
+        updater = QueryOptionsFilterFieldLowerUpdater(field_name, case_insensitive=case_insensitive)
+        return updater
+
     @staticmethod
     def filter_field_exists(field_name):
         updater = QueryOptionsFilterFieldExistsUpdater(field_name)
@@ -79,6 +120,23 @@ class QueryOptionsLimitUpdater(QueryOptionsUpdater):
             options.limit = min(options.limit, self._value)
 
 
+class QueryOptionsSortUpdater(QueryOptionsUpdater):
+    def __init__(self, field_name, descending: bool, then: bool):
+        self._key = (field_name, -1 if descending else 1)
+        self._then = then
+
+    def apply(self, options: QueryOptions):
+        if options.skip is not None or options.limit is not None:
+            # mongodb sort the documents before skip and limit.
+            raise NotSupportError
+        if self._then and options.sort is None:
+            raise NotSupportError
+        # the driver convert the sort to a dict, so each field must occur once.
+        sort, options.sort_group_size = add_sort_key(
+            tuple(options.sort or ()), options.sort_group_size, self._key, self._then)
+        options.sort = list(sort)
+
+
 _OP_MAP = {
     '<': '$lt',
     '>': '$gt',
@@ -90,6 +148,19 @@ _OP_MAP = {
     'not in': '$nin',
 }
 
+# the operators which can merge by `merge_predicates()`
+_MERGEABLE_OP_MAP = {
+    '$eq': '==',
+    '$lt': '<',
+    '$gt': '>',
+    '$lte': '<=',
+    '$gte': '>=',
+    '$in': 'in',
+    '$nin': 'not in',
+    '$ne': '!=',
+}
+_MERGEABLE_OP_MAP_REVERSED = {v: k for k, v in _MERGEABLE_OP_MAP.items()}
+
 
 class QueryOptionsFilterFieldUpdater(QueryOptionsUpdater):
     def __init__(self, field_name, *, value: bool=True):
@@ -113,6 +184,11 @@ class QueryOptionsFilterFieldUpdater(QueryOptionsUpdater):
         updater = QueryOptionsUpdater.add_filter_field(self._field_name, value)
         return updater
 
+    def op_startswith(self, prefix: str):
+        # a anchored regex without options is a prefix expression,
+        # so mongodb can use index range scan for it.
+        return QueryOptionsUpdater.filter_field_regex(self._field_name, '^' + re.escape(prefix))
+
     def _convert_value(self, op: str, other):
         '''
         get mongodb query object value by `value` and `op`.
@@ -138,32 +214,39 @@ class QueryOptionsFilterFieldsListUpdater(QueryOptionsUpdater):
         if exists == value:
             return value
         if isinstance(exists, dict) and isinstance(value, dict):
-            merged_value = dict(exists)
             if all(k.startswith('$') for k in exists) and all(k.startswith('$') for k in value):
-                for k in value:
-                    v = value[k]
-                    if k in merged_value:
-                        ev = merged_value[k]
-                        if k == '$gt':
-                            merged_value[k] = max(ev, v)
-                        elif k == '$lt':
-                            merged_value[k] = min(ev, v)
-                    else:
-                        # reduce
-                        if k == '$gt':
-                            if '$lt' in merged_value:
-                                ev = merged_value['$lt']
-                                if ev <= v:
-                                    raise AlwaysEmptyError(f'{v} < $value < {ev}')
-                        elif k == '$lt':
-                            if '$gt' in merged_value:
-                                ev = merged_value['$gt']
-                                if ev >= v:
-                                    raise AlwaysEmptyError(f'{ev} < $value < {v}')
-                        merged_value[k] = v
-            return merged_value
+                return self._merge_operators(exists, value)
         raise NotSupportError
 
+    def _merge_operators(self, exists: dict, value: dict):
+        merged_value = {}
+        predicates = []
+        for operators in (exists, value):
+            for k, v in operators.items():
+                op = _MERGEABLE_OP_MAP.get(k)
+                if op is not None:
+                    predicates.append(Predicate.create_binary(op, v))
+                elif k in merged_value and merged_value[k] != v:
+                    raise NotSupportError
+                else:
+                    merged_value[k] = v
+        try:
+            predicates = merge_predicates(predicates)
+        except PredicateConflictError as conflict:
+            raise AlwaysEmptyError(conflict.reason)
+        except TypeError:
+            # the values are not comparable, keep them.
+            pass
+        for predicate in predicates:
+            k = _MERGEABLE_OP_MAP_REVERSED[predicate.op]
+            if k in merged_value and merged_value[k] != predicate.value:
+                raise NotSupportError
+            merged_value[k] = predicate.value
+        if not merged_value:
+            # like `$nin: []`
+            raise NotSupportError
+        return merged_value
+
     def add_pairs(self, field_name, value):
         if field_name in self.data:
             self.data[field_name] = self._try_merge(self.data[field_name], value)
@@ -188,6 +271,38 @@ class QueryOptionsFilterFieldsListUpdater(QueryOptionsUpdater):
         return new_updater
 
 
+class QueryOptionsFilterFieldLowerUpdater(QueryOptionsUpdater):
+    '''
+    the updater for `field.lower()`.
+
+    if the collation is case-insensitive, compare to a plain value so mongodb can use index;
+    otherwise compare by a case-insensitive anchored regex.
+    '''
+    def __init__(self, field_name, *, case_insensitive: bool=False):
+        self._field_name = field_name
+        self._case_insensitive = case_insensitive
+
+    def _ensure_lower(self, value):
+        if not isinstance(value, str):
+            raise NotSupportError
+        if value.lower() != value:
+            raise AlwaysEmptyError(f'$value.lower() never match {value!r}')
+
+    def op_binary(self, op: str, other):
+        if op == '==':
+            self._ensure_lower(other)
+            if self._case_insensitive:
+                return QueryOptionsUpdater.add_filter_field(self._field_name, other)
+            # `$` also match before a trailing newline, `\z` (PCRE) only match at the end.
+            pattern = f'^{re.escape(other)}\\z'
+            return QueryOptionsUpdater.filter_field_regex(self._field_name, pattern, 'i')
+        return super().op_binary(op, other)
+
+    def op_startswith(self, prefix: str):
+        self._ensure_lower(prefix)
+        return QueryOptionsUpdater.filter_field_regex(self._field_name, '^' + re.escape(prefix), 'i')
+
+
 class QueryOptionsFilterFieldExistsUpdater(QueryOptionsUpdater):
     def __init__(self, field_name, value: bool=True):
         self._field_name = field_name
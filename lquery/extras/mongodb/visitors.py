@@ -9,20 +9,66 @@ import re
 
 from ...funcs import LinqQuery
 from ...expr import (
-    RequireArgumentError,
+    ExprType,
     BinaryExpr, IndexExpr, CallExpr, AttrExpr, UnaryExpr,
     ParameterExpr
 )
 from ...expr.builder import to_func_expr
-from ...expr.visitor import DefaultExprVisitor, ExprVisitor
-from ...expr.utils import get_deep_names
+from ...expr.visitor import ExprVisitor
+from ...expr.utils import (
+    get_deep_names, require_argument,
+    fold_const_exprs, ConstFoldingExprVisitor
+)
 
 from .._common import NotSupportError, AlwaysEmptyError
 
 from .options import QueryOptionsUpdater
 
 
-VISITOR = DefaultExprVisitor()
+_PATTERN_TYPE = type(re.compile(''))
+
+_REGEX_OPTIONS_MAP = {
+    re.IGNORECASE: 'i',
+    re.MULTILINE: 'm',
+    re.DOTALL: 's',
+    re.VERBOSE: 'x',
+}
+
+def _get_regex_options(flags: int) -> str:
+    '''
+    convert flags from module `re` to mongodb `$options`.
+    '''
+    flags &= ~re.UNICODE # str pattern always has this flag.
+    options = ''
+    for flag, option in _REGEX_OPTIONS_MAP.items():
+        if flags & flag:
+            options += option
+            flags &= ~flag
+    if flags:
+        raise NotSupportError
+    return options
+
+def _anchor_regex(pattern: str) -> str:
+    '''
+    anchor the `pattern` at start like `re.match()`.
+
+    `^abc` is a prefix expression, so mongodb can use index for it.
+    a pattern which may has a top level `|` is wrapped, like `^a|b` => `^(?:^a|b)`.
+    '''
+    if '|' in pattern:
+        return f'^(?:{pattern})'
+    if pattern.startswith('^'):
+        return pattern
+    return '^' + pattern
+
+
+_SORT_FUNCS = {
+    # func: (descending, then)
+    LinqQuery.order_by: (False, False),
+    LinqQuery.order_by_descending: (True, False),
+    LinqQuery.then_by: (False, True),
+    LinqQuery.then_by_descending: (True, True),
+}
 
 
 class QueryOptionsExprVisitor(ExprVisitor):
@@ -50,6 +96,9 @@ class QueryOptionsRootExprVisitor(QueryOptionsExprVisitor):
             return self._apply_call_skip(expr.args[1].value)
         elif func is LinqQuery.take:
             return self._apply_call_take(expr.args[1].value)
+        elif func in _SORT_FUNCS:
+            descending, then = _SORT_FUNCS[func]
+            return self._apply_call_sort(expr.args[1].value, descending, then)
         raise NotSupportError
 
     def _apply_call_skip(self, value):
@@ -60,6 +109,18 @@ class QueryOptionsRootExprVisitor(QueryOptionsExprVisitor):
             raise AlwaysEmptyError(f'only take {value} item')
         QueryOptionsUpdater.add_limit(value).apply(self._query_options)
 
+    def _apply_call_sort(self, key_selector, descending: bool, then: bool):
+        lambda_expr = to_func_expr(key_selector)
+        if lambda_expr is None or len(lambda_expr.args) != 1:
+            raise NotSupportError
+        body = lambda_expr.body
+        if body.type not in (ExprType.Attr, ExprType.Index):
+            raise NotSupportError
+        fields, base_expr = get_deep_names(body)
+        if not isinstance(base_expr, ParameterExpr) or not all(isinstance(x, str) for x in fields):
+            raise NotSupportError
+        QueryOptionsUpdater.add_sort('.'.join(fields), descending, then).apply(self._query_options)
+
     def _apply_call_where(self, predicate):
         # mongo find() only accept one filter and a limit after it
         # if `limit` is not None, cannot add more predicate.
@@ -68,8 +129,11 @@ class QueryOptionsRootExprVisitor(QueryOptionsExprVisitor):
 
         lambda_expr = to_func_expr(predicate)
         if lambda_expr and len(lambda_expr.args) == 1:
+            # the closure variables should not be captured into the filter.
+            lambda_expr = fold_const_exprs(
+                lambda_expr, snapshot_policy=ConstFoldingExprVisitor.LAZY_CLOSURE)
             visitor = QueryOptionsCallWhereExprVisitor(self._query_options)
-            updater = lambda_expr.body.accept(visitor)
+            updater = visitor.run(lambda_expr.body)
             updater.apply(self._query_options)
             return
         raise NotSupportError
@@ -85,14 +149,15 @@ class QueryOptionsCallWhereExprVisitor(QueryOptionsExprVisitor):
         return QueryOptionsUpdater.filter_field(indexes)
 
     def visit_unary_expr(self, expr: UnaryExpr):
-        updater = expr.expr.accept(self)
+        updater = yield expr.expr
         return updater.op_unary(expr.op)
 
     def visit_binary_expr(self, body: BinaryExpr):
-        left, op, right = body.left.accept(VISITOR), body.op, body.right.accept(VISITOR)
+        # the body was rewrited by `fold_const_exprs()`, which also rewrite `getattr()`.
+        left, op, right = body.left, body.op, body.right
         if op in ('&', 'and'):
-            lupdater = left.accept(self)
-            rupdater = right.accept(self)
+            lupdater = yield left
+            rupdater = yield right
             return lupdater & rupdater
         else:
             return self._get_updater_by_compare(left, right, op)
@@ -111,11 +176,9 @@ class QueryOptionsCallWhereExprVisitor(QueryOptionsExprVisitor):
     }
 
     def _resolve_value(self, expr):
-        try:
-            value = expr.resolve_value()
-            return True, value
-        except RequireArgumentError:
+        if require_argument(expr):
             return False, None
+        return True, expr.resolve_value()
 
     def _get_updater_by_compare(self, left, right, op):
         lh, lv = self._resolve_value(left)
@@ -139,26 +202,78 @@ class QueryOptionsCallWhereExprVisitor(QueryOptionsExprVisitor):
         if not isinstance(value, (str, int, dict, list)):
             raise NotSupportError
 
-        updater = expr.accept(self)
+        updater = self.run(expr)
         return updater.op_binary(op, value)
 
     def visit_call_expr(self, expr: CallExpr):
-        # re.search('?', doc.name)
+        if expr.func.type == ExprType.Attr and require_argument(expr.func):
+            # doc.name.startswith('?')
+            return self._get_updater_by_str_method(expr)
         func = expr.func.resolve_value()
-        print(func is re.search)
-        if func is re.search:
-            return self._get_updater_by_re_search(expr)
+        if func is re.search or func is re.match:
+            # re.search('?', doc.name)
+            return self._get_updater_by_re_func(expr)
+        if isinstance(getattr(func, '__self__', None), _PATTERN_TYPE):
+            # re.compile('?').search(doc.name)
+            return self._get_updater_by_pattern_method(expr)
         if func is hasattr:
             return self._get_updater_by_hasattr(expr)
         raise NotSupportError
 
-    def _get_updater_by_re_search(self, expr: CallExpr):
-        if len(expr.args) == 2:
-            pattern = expr.args[0].resolve_value()
-            field_name = self._get_parameter_indexes(expr.args[1])
-            return QueryOptionsUpdater.add_filter_field(field_name, {'$regex': pattern})
+    def _get_updater_by_str_method(self, expr: CallExpr):
+        if expr.kwargs:
+            raise NotSupportError
+        method_name = expr.func.name
+        if method_name == 'lower' and not expr.args:
+            field_name = self._get_parameter_indexes(expr.func.expr)
+            return QueryOptionsUpdater.filter_field_lower(
+                field_name, self._query_options.is_case_insensitive)
+        if method_name == 'startswith' and len(expr.args) == 1:
+            has_value, prefix = self._resolve_value(expr.args[0])
+            if not has_value or not isinstance(prefix, str):
+                raise NotSupportError
+            updater = self.run(expr.func.expr)
+            return updater.op_startswith(prefix)
         raise NotSupportError
 
+    def _get_updater_by_re_func(self, expr: CallExpr):
+        if len(expr.args) not in (2, 3) or expr.kwargs:
+            raise NotSupportError
+        func = expr.func.resolve_value()
+        has_value, pattern = self._resolve_value(expr.args[0])
+        if not has_value:
+            raise NotSupportError
+        flags = 0
+        if len(expr.args) == 3:
+            has_value, flags = self._resolve_value(expr.args[2])
+            if not has_value:
+                raise NotSupportError
+        if isinstance(pattern, _PATTERN_TYPE):
+            if flags:
+                raise NotSupportError
+            pattern, flags = pattern.pattern, pattern.flags
+        return self._get_updater_by_regex(expr.args[1], pattern, flags, anchored=func is re.match)
+
+    def _get_updater_by_pattern_method(self, expr: CallExpr):
+        method = expr.func.resolve_value()
+        if method.__name__ not in ('search', 'match') or len(expr.args) != 1 or expr.kwargs:
+            raise NotSupportError
+        pattern = method.__self__
+        return self._get_updater_by_regex(expr.args[0], pattern.pattern, pattern.flags,
+                                          anchored=method.__name__ == 'match')
+
+    def _get_updater_by_regex(self, field_expr, pattern, flags: int, *, anchored: bool):
+        if not isinstance(pattern, str):
+            raise NotSupportError
+        field_name = self._get_parameter_indexes(field_expr)
+        options = _get_regex_options(flags)
+        if anchored:
+            if 'm' in options:
+                # `^` also match after each newline in multiline mode.
+                raise NotSupportError
+            pattern = _anchor_regex(pattern)
+        return QueryOptionsUpdater.filter_field_regex(field_name, pattern, options)
+
     def _get_updater_by_hasattr(self, expr: CallExpr):
         field_name = self._get_parameter_indexes(expr.args[0])
         field_name = f'{field_name}.{expr.args[1].resolve_value()}'
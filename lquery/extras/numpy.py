@@ -0,0 +1,663 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# lquery for the columnar in-memory records, which stored as numpy arrays.
+# ----------
+
+'''
+`ColumnarQuery(records)` store each field of the records (dicts) as a numpy array,
+the strings are dictionary-encoded as codes of the sorted categories.
+
+the predicates and selectors of `where()` and `select()` are compiled to array operations,
+and `count()`, `sum()`, `min()`, `max()` and `average()` are array reductions.
+
+the result of a array operation must be same as python,
+otherwise (like a int overflow, a division by zero or the mixed types) the query
+fallback to evaluate the lambda row by row.
+the only difference is the floats sum, which numpy use pairwise summation.
+'''
+
+import operator
+import functools
+
+import numpy
+from asq.selectors import identity
+
+from ..queryable import AbstractQueryable, ReduceInfo
+from ..funcs import LinqQuery
+from ..iterable import IterableQueryProvider
+from ..expr import Make, ExprType, CallExpr
+from ..expr.builder import to_func_expr
+from ..expr.visitor import ExprVisitor
+from ..expr.utils import require_argument, fold_const_exprs, ConstFoldingExprVisitor
+
+from ._common import NotSupportError, bind_call_args
+
+# all ints must be exactly represented as float64.
+_MAX_INT = 2 ** 53
+
+
+class Column:
+    '''
+    a immutable column, the `kind` is one of `bool`, `int`, `float`, `str` and `object`.
+
+    a `object` column only keep the values, which cannot be used by the array operations.
+    '''
+    __slots__ = ('kind', 'values', 'categories')
+
+    def __init__(self, kind: str, values: numpy.ndarray, categories: numpy.ndarray = None):
+        self.kind = kind
+        self.values = values
+        self.categories = categories
+
+    def __len__(self):
+        return len(self.values)
+
+    @classmethod
+    def from_values(cls, values: list):
+        types = set(map(type, values))
+        if len(types) == 1:
+            type_ = types.pop()
+            if type_ is bool:
+                return cls('bool', numpy.array(values, dtype=bool))
+            if type_ is int:
+                if -_MAX_INT <= min(values) and max(values) <= _MAX_INT:
+                    return cls('int', numpy.array(values, dtype=numpy.int64))
+            elif type_ is float:
+                return cls('float', numpy.array(values, dtype=numpy.float64))
+            elif type_ is str:
+                categories = sorted(set(values))
+                index = dict((v, i) for i, v in enumerate(categories))
+                codes = numpy.fromiter((index[v] for v in values), dtype=numpy.int64, count=len(values))
+                return cls('str', codes, numpy.array(categories, dtype=object))
+        array = numpy.empty(len(values), dtype=object)
+        array[:] = values
+        return cls('object', array)
+
+    def take(self, indices: numpy.ndarray):
+        return Column(self.kind, self.values[indices], self.categories)
+
+    def to_list(self) -> list:
+        if self.kind == 'str':
+            return self.categories[self.values].tolist()
+        return self.values.tolist()
+
+    def get_code(self, value: str) -> int:
+        '''
+        get the code of the `value` from a `str` column, or `-1` if the `value` is not exists.
+        '''
+        index = numpy.searchsorted(self.categories, value)
+        if index < len(self.categories) and self.categories[index] == value:
+            return int(index)
+        return -1
+
+
+class ColumnarTable:
+    '''
+    the columns of the records, only the fields which exists in all records are stored.
+    '''
+    def __init__(self, records: list):
+        self._records = records
+        self._columns = {}
+        # pylint: disable=C0123
+        # use `type()` instead of `isinstance()`, the subclasses may override `__getitem__()`.
+        if records and all(type(r) is dict for r in records):
+            names = set(records[0])
+            for record in records[1:]:
+                names.intersection_update(record)
+            for name in names:
+                self._columns[name] = Column.from_values([r[name] for r in records])
+
+    @property
+    def records(self):
+        return self._records
+
+    def get_column(self, name):
+        '''
+        get the `Column` of the field, or `None` if the field is not stored.
+        '''
+        return self._columns.get(name)
+
+    def __len__(self):
+        return len(self._records)
+
+
+# the array operations
+
+def _get_kind(value):
+    '''
+    get the kind of a scalar.
+    '''
+    type_ = type(value)
+    if type_ is bool:
+        return 'bool'
+    if type_ is int:
+        if abs(value) <= _MAX_INT:
+            return 'int'
+    elif type_ is float:
+        return 'float'
+    elif type_ is str:
+        return 'str'
+    raise NotSupportError
+
+def _get_numeric(value):
+    '''
+    get `(kind, array_or_scalar)` of a numeric column or scalar.
+    '''
+    if isinstance(value, Column):
+        if value.kind in ('bool', 'int', 'float'):
+            return value.kind, value.values
+        raise NotSupportError
+    kind = _get_kind(value)
+    if kind == 'str':
+        raise NotSupportError
+    return kind, value
+
+def _as_int(kind, value):
+    if kind == 'bool':
+        return value.astype(numpy.int64) if isinstance(value, numpy.ndarray) else int(value)
+    return value
+
+def _max_abs(value):
+    if isinstance(value, numpy.ndarray):
+        return int(numpy.abs(value).max()) if len(value) else 0
+    return abs(value)
+
+def _to_int_column(values):
+    if _max_abs(values) > _MAX_INT:
+        raise NotSupportError
+    return Column('int', values)
+
+def _has_zero(value):
+    if isinstance(value, numpy.ndarray):
+        return bool((value == 0).any())
+    return value == 0
+
+def _get_truth(value):
+    '''
+    get the `bool()` of each item as a bool array, or `bool()` of a scalar.
+    '''
+    if not isinstance(value, Column):
+        return bool(value)
+    if value.kind == 'bool':
+        return value.values
+    if value.kind in ('int', 'float'):
+        return value.values != 0
+    if value.kind == 'str':
+        return value.values != value.get_code('')
+    raise NotSupportError
+
+def _scalar_op(func, *args):
+    try:
+        return func(*args)
+    except Exception: # pylint: disable=W0703
+        # let the row by row evaluation raise it.
+        raise NotSupportError
+
+_ARITHMETIC_FUNCS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '//': operator.floordiv,
+    '%': operator.mod,
+    '&': operator.and_,
+    '|': operator.or_,
+    '^': operator.xor,
+}
+
+def _arithmetic(op, left, right):
+    func = _ARITHMETIC_FUNCS[op]
+    if not isinstance(left, Column) and not isinstance(right, Column):
+        return _scalar_op(func, left, right)
+    left_kind, left = _get_numeric(left)
+    right_kind, right = _get_numeric(right)
+    if op in ('&', '|', '^'):
+        if 'float' in (left_kind, right_kind):
+            raise NotSupportError
+        if left_kind == right_kind == 'bool':
+            return Column('bool', func(left, right))
+        return _to_int_column(func(_as_int(left_kind, left), _as_int(right_kind, right)))
+    left, right = _as_int(left_kind, left), _as_int(right_kind, right)
+    if op in ('/', '//', '%') and _has_zero(right):
+        raise NotSupportError
+    if 'float' in (left_kind, right_kind) or op == '/':
+        return Column('float', numpy.asarray(func(left, right), dtype=numpy.float64))
+    if op == '*' and _max_abs(left) * _max_abs(right) > _MAX_INT:
+        raise NotSupportError
+    return _to_int_column(numpy.asarray(func(left, right), dtype=numpy.int64))
+
+_COMPARE_FUNCS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+_SWAPED_COMPARE_OPS = {
+    '==': '==',
+    '!=': '!=',
+    '<': '>',
+    '<=': '>=',
+    '>': '<',
+    '>=': '<=',
+}
+
+def _compare_str(op, column, value):
+    if not isinstance(value, str):
+        raise NotSupportError
+    if op in ('==', '!='):
+        code = column.get_code(value)
+        mask = column.values == code if code >= 0 else numpy.zeros(len(column), dtype=bool)
+        return mask if op == '==' else ~mask
+    # the categories are sorted, so compare the codes.
+    if op in ('<', '>='):
+        bound = numpy.searchsorted(column.categories, value, side='left')
+    else:
+        bound = numpy.searchsorted(column.categories, value, side='right')
+    return column.values < bound if op in ('<', '<=') else column.values >= bound
+
+def _compare(op, left, right):
+    func = _COMPARE_FUNCS[op]
+    if not isinstance(left, Column) and not isinstance(right, Column):
+        return _scalar_op(func, left, right)
+    if isinstance(left, Column) and left.kind == 'str':
+        return Column('bool', _compare_str(op, left, right))
+    if isinstance(right, Column) and right.kind == 'str':
+        return Column('bool', _compare_str(_SWAPED_COMPARE_OPS[op], right, left))
+    _, left = _get_numeric(left)
+    _, right = _get_numeric(right)
+    return Column('bool', numpy.asarray(func(left, right), dtype=bool))
+
+def _contains(op, left, right):
+    if not isinstance(left, Column) or not isinstance(right, (list, tuple, set, frozenset)):
+        raise NotSupportError
+    items = list(right)
+    if left.kind == 'str':
+        if not all(isinstance(x, str) for x in items):
+            raise NotSupportError
+        codes = [c for c in (left.get_code(x) for x in items) if c >= 0]
+        mask = numpy.isin(left.values, numpy.array(codes, dtype=numpy.int64))
+    else:
+        kinds = set(_get_kind(x) for x in items)
+        if 'str' in kinds or any(x != x for x in items):
+            # the nan may match by the identity.
+            raise NotSupportError
+        _, values = _get_numeric(left)
+        dtype = numpy.float64 if 'float' in kinds else numpy.int64
+        mask = numpy.isin(values, numpy.array(items, dtype=dtype))
+    return Column('bool', mask if op == 'in' else ~mask)
+
+def _logic(op, left, right):
+    '''
+    `left and right` or `left or right`, which return one of the operands.
+    '''
+    if not isinstance(left, Column):
+        # same as python: the left is evaluated once.
+        if op == 'and':
+            return right if left else left
+        return left if left else right
+    kind = right.kind if isinstance(right, Column) else _get_kind(right)
+    if kind != left.kind or kind in ('str', 'object'):
+        # the results should not be the mixed types.
+        raise NotSupportError
+    right_values = right.values if isinstance(right, Column) else right
+    truth = _get_truth(left)
+    if op == 'and':
+        values = numpy.where(truth, right_values, left.values)
+    else:
+        values = numpy.where(truth, left.values, right_values)
+    return Column(kind, values)
+
+_UNARY_FUNCS = {
+    '-': operator.neg,
+    '+': operator.pos,
+    '~': operator.invert,
+}
+
+def _unary(op, value):
+    if op == 'not':
+        truth = _get_truth(value)
+        return Column('bool', ~truth) if isinstance(value, Column) else not truth
+    if not isinstance(value, Column):
+        return _scalar_op(_UNARY_FUNCS[op], value)
+    kind, values = _get_numeric(value)
+    values = _as_int(kind, values)
+    if op == '-':
+        return Column('float' if kind == 'float' else 'int', -values)
+    if op == '+':
+        return Column('float' if kind == 'float' else 'int', values)
+    if op == '~' and kind != 'float':
+        return _to_int_column(~values)
+    raise NotSupportError
+
+
+def _iter_rows(table, selection, values):
+    if values is not None:
+        return iter(values.to_list())
+    records = table.records
+    if selection is None:
+        return iter(records)
+    return (records[i] for i in selection.tolist())
+
+
+class _Env:
+    '''
+    the columns of the rows to evaluate a plan.
+    '''
+    def __init__(self, table, selection, values):
+        self._table = table
+        self._selection = selection
+        self._values = values
+        self._columns = {}
+
+    def __len__(self):
+        if self._values is not None:
+            return len(self._values)
+        return len(self._table) if self._selection is None else len(self._selection)
+
+    def get_field(self, name):
+        column = self._columns.get(name)
+        if column is None:
+            if self._values is not None:
+                raise NotSupportError
+            column = self._table.get_column(name)
+            if column is None or column.kind == 'object':
+                raise NotSupportError
+            if self._selection is not None:
+                column = column.take(self._selection)
+            self._columns[name] = column
+        return column
+
+    def get_parameter(self):
+        if self._values is None:
+            # the records
+            raise NotSupportError
+        return self._values
+
+    def iter_rows(self):
+        return _iter_rows(self._table, self._selection, self._values)
+
+
+class _PlanExprVisitor(ExprVisitor):
+    '''
+    compile a `FuncExpr` to a plan, which is a func `(env) -> Column | scalar`.
+
+    raise `NotSupportError` if the `FuncExpr` cannot be compiled.
+    '''
+    def visit(self, expr):
+        if require_argument(expr):
+            raise NotSupportError
+        # like the closure variables, which are read on each execution.
+        return lambda env: expr.resolve_value()
+
+    def visit_const_expr(self, expr):
+        value = expr.value
+        return lambda env: value
+
+    def visit_parameter_expr(self, expr):
+        return lambda env: env.get_parameter()
+
+    def visit_index_expr(self, expr):
+        if not require_argument(expr):
+            return self.visit(expr)
+        if expr.expr.type != ExprType.Parameter or expr.key.type != ExprType.Const:
+            raise NotSupportError
+        name = expr.key.value
+        return lambda env: env.get_field(name)
+
+    def visit_unary_expr(self, expr):
+        if not require_argument(expr):
+            return self.visit(expr)
+        if expr.op != 'not' and expr.op not in _UNARY_FUNCS:
+            raise NotSupportError
+        op = expr.op
+        plan = yield expr.expr
+        return lambda env: _unary(op, plan(env))
+
+    def _get_operands(self, expr):
+        '''
+        split `a or b or c` to `[a, b, c]`.
+        '''
+        operands = []
+        stack = [expr]
+        while stack:
+            operand = stack.pop()
+            if operand.type == ExprType.Binary and operand.op == expr.op:
+                stack.append(operand.right)
+                stack.append(operand.left)
+            else:
+                operands.append(operand)
+        return operands
+
+    def visit_binary_expr(self, expr):
+        if not require_argument(expr):
+            return self.visit(expr)
+        op = expr.op
+        if op in ('and', 'or'):
+            plans = []
+            for operand in self._get_operands(expr):
+                plans.append((yield operand))
+            func = functools.partial(_logic, op)
+            return lambda env: functools.reduce(func, (p(env) for p in plans))
+        if op in _ARITHMETIC_FUNCS:
+            func = functools.partial(_arithmetic, op)
+        elif op in _COMPARE_FUNCS:
+            func = functools.partial(_compare, op)
+        elif op in ('in', 'not in'):
+            func = functools.partial(_contains, op)
+        else:
+            raise NotSupportError
+        left = yield expr.left
+        right = yield expr.right
+        return lambda env: func(left(env), right(env))
+
+    def visit_func_expr(self, expr):
+        return (yield expr.body)
+
+
+def _compile(func):
+    '''
+    compile the lambda `func` to a plan, or return `None` if the `func` cannot be compiled.
+    '''
+    func_expr = to_func_expr(func)
+    if func_expr is None or len(func_expr.args) != 1:
+        return None
+    # the closure variables should be read on each execution.
+    func_expr = fold_const_exprs(func_expr, snapshot_policy=ConstFoldingExprVisitor.LAZY_CLOSURE)
+    try:
+        return _PlanExprVisitor().run(func_expr)
+    except NotSupportError:
+        return None
+
+def _run_plan(plan, env):
+    '''
+    run the `plan` on all rows of the `env`.
+
+    the operands of `and` and `or` are evaluated for all rows, like `x['a'] > 0 or d['k']`,
+    so the errors which python may not raise (by short circuit) are raised as `NotSupportError`,
+    then the rows are evaluated one by one.
+    '''
+    with numpy.errstate(all='ignore'):
+        try:
+            return plan(env)
+        except NotSupportError:
+            raise
+        except Exception: # pylint: disable=W0703
+            raise NotSupportError
+
+
+class NextColumnarQuery(AbstractQueryable):
+    '''
+    the rows are the records of the table, or the `values` which from a `select()`.
+    '''
+    def __init__(self, expr, table: ColumnarTable):
+        super().__init__(expr, PROVIDER)
+        self._table = table
+
+    @property
+    def table(self):
+        return self._table
+
+    def get_rows(self):
+        '''
+        get `(selection, values)` for the rows, the `selection` is the indexes of the records,
+        or `None` for all records; the `values` is a `Column` or `None`.
+        '''
+        raise NotImplementedError
+
+    def create_env(self):
+        return _Env(self._table, *self.get_rows())
+
+    def get_column(self):
+        '''
+        get the rows as a `Column`, or `None` if the rows are the records.
+        '''
+        return self.get_rows()[1]
+
+    def count_rows(self):
+        return len(self.create_env())
+
+    def __iter__(self):
+        return _iter_rows(self._table, *self.get_rows())
+
+    def update_reduce_info(self, reduce_info: ReduceInfo):
+        reduce_info.add_node(ReduceInfo.TYPE_SQL, self.expr)
+
+
+class ColumnarQuery(NextColumnarQuery):
+    def __init__(self, records: list):
+        super().__init__(Make.ref(records), ColumnarTable(list(records)))
+
+    def get_rows(self):
+        return None, None
+
+    def update_reduce_info(self, reduce_info: ReduceInfo):
+        reduce_info.add_node(ReduceInfo.TYPE_SRC, self.expr)
+
+
+class _WhereColumnarQuery(NextColumnarQuery):
+    def __init__(self, expr, source: NextColumnarQuery, plan, predicate):
+        super().__init__(expr, source.table)
+        self._source = source
+        self._plan = plan
+        self._predicate = predicate
+
+    def get_rows(self):
+        selection, values = self._source.get_rows()
+        env = _Env(self.table, selection, values)
+        try:
+            mask = _get_truth(_run_plan(self._plan, env))
+        except NotSupportError:
+            mask = numpy.fromiter((bool(self._predicate(r)) for r in env.iter_rows()), dtype=bool)
+        if not isinstance(mask, numpy.ndarray):
+            mask = numpy.full(len(env), mask, dtype=bool)
+        if values is not None:
+            return None, values.take(mask)
+        if selection is None:
+            return numpy.flatnonzero(mask), None
+        return selection[mask], None
+
+
+class _SelectColumnarQuery(NextColumnarQuery):
+    def __init__(self, expr, source: NextColumnarQuery, plan, selector):
+        super().__init__(expr, source.table)
+        self._source = source
+        self._plan = plan
+        self._selector = selector
+
+    def get_rows(self):
+        env = _Env(self.table, *self._source.get_rows())
+        try:
+            column = _run_plan(self._plan, env)
+            if not isinstance(column, Column):
+                column = Column.from_values([column] * len(env))
+        except NotSupportError:
+            column = Column.from_values([self._selector(r) for r in env.iter_rows()])
+        return None, column
+
+
+def _reduce(func, column: Column):
+    '''
+    reduce the `column` like `func(column.to_list())`.
+    '''
+    if func is not LinqQuery.sum and not len(column):
+        # let asq raise the error.
+        raise NotSupportError
+    if column.kind == 'str' and func in (LinqQuery.min, LinqQuery.max):
+        codes = column.values
+        return column.categories[codes.min() if func is LinqQuery.min else codes.max()]
+    kind, values = _get_numeric(column)
+    if func in (LinqQuery.min, LinqQuery.max):
+        if kind == 'float' and numpy.isnan(values).any():
+            raise NotSupportError
+        return (values.min() if func is LinqQuery.min else values.max()).item()
+    if kind == 'bool':
+        total = int(numpy.count_nonzero(values))
+    elif kind == 'int':
+        if _max_abs(values) * len(values) < 2 ** 63:
+            total = int(values.sum())
+        else:
+            total = sum(values.tolist())
+    else:
+        total = float(values.sum())
+    if func is LinqQuery.sum:
+        return total
+    return total / len(values)
+
+
+class ColumnarQueryProvider(IterableQueryProvider):
+    def create_query(self, expr):
+        empty_query = self.try_create_empty_query(expr)
+        if empty_query is not None:
+            return empty_query
+        func = expr.func.resolve_value()
+        if func in (LinqQuery.where, LinqQuery.select) and len(expr.args) == 2 and not expr.kwargs:
+            queryable = expr.args[0].value
+            lambda_func = expr.args[1].resolve_value()
+            plan = _compile(lambda_func)
+            if plan is not None:
+                query_type = _WhereColumnarQuery if func is LinqQuery.where else _SelectColumnarQuery
+                return query_type(expr, queryable, plan, lambda_func)
+        return super().create_query(expr)
+
+    _REDUCE_FUNCS = (LinqQuery.sum, LinqQuery.min, LinqQuery.max, LinqQuery.average)
+
+    def execute(self, expr):
+        if isinstance(expr, CallExpr):
+            func = expr.func.resolve_value()
+            if func is LinqQuery.count or func in self._REDUCE_FUNCS:
+                try:
+                    return self._execute_reduce(expr, func)
+                except NotSupportError:
+                    pass
+        return super().execute(expr)
+
+    def _execute_reduce(self, expr, func):
+        bound_args = bind_call_args(expr)
+        queryable = bound_args.arguments['self']
+        if func is LinqQuery.count:
+            predicate = bound_args.arguments.get('predicate')
+            if predicate is not None:
+                plan = _compile(predicate)
+                if plan is None:
+                    raise NotSupportError
+                queryable = _WhereColumnarQuery(expr, queryable, plan, predicate)
+            return queryable.count_rows()
+        selector = bound_args.arguments.get('selector', identity)
+        if selector is not identity:
+            plan = _compile(selector)
+            if plan is None:
+                raise NotSupportError
+            queryable = _SelectColumnarQuery(expr, queryable, plan, selector)
+        column = queryable.get_column()
+        if column is None:
+            # the records
+            raise NotSupportError
+        return _reduce(func, column)
+
+
+PROVIDER = ColumnarQueryProvider()
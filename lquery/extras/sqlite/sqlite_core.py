@@ -6,45 +6,147 @@
 # ----------
 
 import sqlite3
+from collections.abc import Iterable
 
-from ...expr import Make
-from ...queryable import AbstractQueryable
-from ...iterable import IterableQueryProvider
+from ...expr import Make, CallExpr
+from ...queryable import AbstractQueryable, ReduceInfo
+from ...funcs import LinqQuery
+from ...iterable import IterableQueryProvider, iter_chunks
+from ...indexes import get_selector_path
 
-from .._common import new
+from .._common import new, add_sort_key
 
-class SQLiteQueryable(AbstractQueryable):
 
-    def __init__(self, connection, table_name: str):
-        super().__init__(Make.ref(self), PROVIDER)
+def _quote(name: str):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class NextSQLiteQuery(AbstractQueryable):
+    '''
+    a query of a table, which may ordered by the columns.
+
+    the `ORDER BY` always end with `rowid`,
+    so the rows which have the same keys are kept in the original order like a stable sort.
+    '''
+    def __init__(self, expr, connection, table_name: str, order: tuple = (), order_group_size: int = 0):
+        super().__init__(expr, PROVIDER)
         self._connection = connection
         self._table_name = table_name
+        # ((column, descending), ...)
+        self._order = order
+        # the count of the first columns from the latest `order_by()`, see `add_sort_key()`.
+        self._order_group_size = order_group_size
+
+    @property
+    def connection(self):
+        return self._connection
+
+    @property
+    def table_name(self):
+        return self._table_name
+
+    @property
+    def order(self):
+        return self._order
+
+    @property
+    def order_group_size(self):
+        return self._order_group_size
 
     def get_sqlstr(self):
-        return f'SELECT * FROM {self._table_name}'
+        sqlstr = f'SELECT * FROM {self._table_name}'
+        if self._order:
+            keys = [_quote(c) + (' DESC' if d else '') for c, d in self._order]
+            sqlstr += ' ORDER BY ' + ', '.join(keys + ['rowid'])
+        return sqlstr
 
     def get_sqlargs(self):
         return ()
 
+    def _can_order(self, cursor, col_names):
+        if any(c not in col_names for c, _ in self._order):
+            return False
+        try:
+            cursor.execute(f'SELECT rowid FROM {self._table_name} LIMIT 0')
+        except sqlite3.OperationalError:
+            # like a view or a `WITHOUT ROWID` table.
+            return False
+        return True
+
     def __iter__(self):
         cursor = self._connection.cursor()
-        reader = cursor.execute(self.get_sqlstr(), self.get_sqlargs())
-        col_names = [desc[0] for desc in reader.description]
-        for row in cursor.execute(self.get_sqlstr()):
+        col_names = [desc[0] for desc in cursor.execute(f'SELECT * FROM {self._table_name} LIMIT 0').description]
+        if self._order and not self._can_order(cursor, col_names):
+            # sort in memory, which also raise the error for the unknown columns.
+            yield from self.expr.resolve_value()
+            return
+        for row in cursor.execute(self.get_sqlstr(), self.get_sqlargs()):
             yield new(**dict(zip(col_names, row)))
 
+    def update_reduce_info(self, reduce_info: ReduceInfo):
+        reduce_info.add_node(ReduceInfo.TYPE_SQL, self.expr)
+
+
+class SQLiteQueryable(NextSQLiteQuery):
+
+    def __init__(self, connection, table_name: str):
+        super().__init__(Make.ref(self), connection, table_name)
+
     @staticmethod
     def from_strings(connect_str, table_name):
         conn = sqlite3.connect(connect_str)
         return SQLiteQueryable(conn, table_name)
 
+    def update_reduce_info(self, reduce_info: ReduceInfo):
+        reduce_info.add_node(ReduceInfo.TYPE_SRC, self.expr)
+
+
+_ORDER_FUNCS = {
+    # func: (descending, then)
+    LinqQuery.order_by: (False, False),
+    LinqQuery.order_by_descending: (True, False),
+    LinqQuery.then_by: (False, True),
+    LinqQuery.then_by_descending: (True, True),
+}
+
+def _get_column(key_selector):
+    path = get_selector_path(key_selector)
+    if path is None or len(path) != 1 or not isinstance(path[0][1], str):
+        return None
+    return path[0][1]
+
 
 class SQLiteQueryProvider(IterableQueryProvider):
-    pass
+    SORTED_QUERY_TYPES = IterableQueryProvider.SORTED_QUERY_TYPES + (NextSQLiteQuery, )
+
+    def create_query(self, expr: CallExpr):
+        return self.try_create_ordered_query(expr) or super().create_query(expr)
+
+    def try_create_ordered_query(self, expr: CallExpr):
+        '''
+        push `order_by()`, `then_by()` and the `*_descending()` into the `ORDER BY`,
+        if the key is a column like `lambda x: x.name`.
+        '''
+        func = expr.func.resolve_value()
+        if func not in _ORDER_FUNCS or len(expr.args) != 2 or expr.kwargs:
+            return None
+        source = expr.args[0].value
+        if not isinstance(source, NextSQLiteQuery):
+            return None
+        descending, then = _ORDER_FUNCS[func]
+        if then and not source.order:
+            return None
+        column = _get_column(expr.args[1].value)
+        if column is None:
+            return None
+        order, group_size = add_sort_key(source.order, source.order_group_size, (column, descending), then)
+        return NextSQLiteQuery(expr, source.connection, source.table_name, order, group_size)
 
 PROVIDER = SQLiteQueryProvider()
 
 class SQLiteTable:
+    INSERT_CHUNK_SIZE = 1000
+
     def __init__(self, connection, name: str):
         self._connection = connection
         self._name = name
@@ -60,16 +162,20 @@ class SQLiteTable:
     def insert(self, record):
         self.insert_many([record])
 
-    def insert_many(self, records: list):
+    def insert_many(self, records: Iterable):
+        '''
+        insert the `records` chunk by chunk, so the `records` can be a large query.
+        '''
         cols = self._get_cols()
-        args = []
-        for record in records:
-            data = vars(record)
-            args.append([data.get(c) for c in cols])
         cursor = self._connection.cursor()
         param = ','.join(['?'] * len(cols))
         sql = f'INSERT INTO {self._name} VALUES ({param})'
-        cursor.executemany(sql, args)
+        for chunk in iter_chunks(records, self.INSERT_CHUNK_SIZE):
+            args = []
+            for record in chunk:
+                data = vars(record)
+                args.append([data.get(c) for c in cols])
+            cursor.executemany(sql, args)
         self._connection.commit()
 
     def query(self):
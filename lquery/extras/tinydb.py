@@ -5,35 +5,225 @@
 # lquery for tinydb
 # ----------
 
-from ..queryable import AbstractQueryable
+import re
+import operator
+import itertools
+
+from ..queryable import AbstractQueryable, ReduceInfo
 from ..funcs import LinqQuery
 from ..iterable import IterableQueryProvider
-from ..expr import Make, ExprType
+from ..expr import Make, ExprType, CallExpr
 from ..expr.builder import to_func_expr
-from ..expr.emitter import emit
-from ..expr.utils import get_deep_indexes
+from ..expr.ast_emitter import emit
+from ..expr.utils import (
+    get_deep_indexes, require_argument, is_pure,
+    fold_const_exprs, has_foldable_exprs, ConstFoldingExprVisitor
+)
+from ..empty import EmptyQuery
 
+from ._common import NotSupportError, bind_call_args
 from ._common.visitor import DbExprVisitor
 
 
-class TinyDbQuery(AbstractQueryable):
+class NextTinyDbQuery(AbstractQueryable):
+    def __init__(self, expr, table, cond, doc_ids=None, limit=None):
+        super().__init__(expr, PROVIDER)
+        self._table = table
+        self._cond = cond
+        self._doc_ids = doc_ids
+        self._limit = limit
+
+    @property
+    def table(self):
+        return self._table
+
+    @property
+    def cond(self):
+        '''
+        the `tinydb.Query` condition, or `None` for all documents.
+        '''
+        return self._cond
+
+    @property
+    def doc_ids(self):
+        '''
+        a `frozenset` of the only doc_ids to lookup, or `None` for all documents.
+        '''
+        return self._doc_ids
+
+    @property
+    def limit(self):
+        '''
+        the max count of documents to read, or `None` for no limit.
+        '''
+        return self._limit
+
+    def with_limit(self, limit: int, expr=None):
+        if self._limit is not None:
+            limit = min(self._limit, limit)
+        return NextTinyDbQuery(expr or self.expr, self._table, self._cond, self._doc_ids, limit)
+
+    def __iter__(self):
+        if self._doc_ids is not None:
+            docs = self._iter_by_doc_ids()
+        elif self._limit is not None:
+            # stop reading once enough, so cannot use `Table.search()`.
+            docs = self._iter_by_cond()
+        elif self._cond is None:
+            return iter(self._table)
+        else:
+            # `Table.search()` cache the result by the hashable condition.
+            return iter(self._table.search(self._cond))
+        if self._limit is not None:
+            docs = itertools.islice(docs, self._limit)
+        return docs
+
+    def count_documents(self):
+        '''
+        count the documents by native tinydb api.
+        '''
+        if self._doc_ids is None and self._limit is None:
+            if self._cond is None:
+                return len(self._table)
+            return self._table.count(self._cond)
+        return sum(1 for _ in self)
+
+    def _iter_by_cond(self):
+        for doc in self._table:
+            if self._cond is None or self._cond(doc):
+                yield doc
+
+    def _iter_by_doc_ids(self):
+        for doc_id in sorted(self._doc_ids):
+            doc = self._table.get(doc_id=doc_id)
+            if doc is not None and (self._cond is None or self._cond(doc)):
+                yield doc
+
+    def update_reduce_info(self, reduce_info: ReduceInfo):
+        reduce_info.add_node(ReduceInfo.TYPE_SQL, self.expr)
+
+
+class TinyDbQuery(NextTinyDbQuery):
     def __init__(self, table):
-        super().__init__(Make.ref(table), PROVIDER)
+        super().__init__(Make.ref(table), table, None)
+
+    def update_reduce_info(self, reduce_info: ReduceInfo):
+        reduce_info.add_node(ReduceInfo.TYPE_SRC, self.expr)
+
+
+def _compile_on_execute(func_expr, snapshot_policy, fallback):
+    '''
+    fold and compile the `func_expr` when the query execute,
+    so the folded values are read once per execution.
+    '''
+    return emit(fold_const_exprs(func_expr, snapshot_policy=snapshot_policy)) or fallback
 
 
 class TinyDbQueryProvider(IterableQueryProvider):
+    # the snapshot policy for the closure variables of the predicates which exec in memory.
+    snapshot_policy = ConstFoldingExprVisitor.SNAPSHOT_CLOSURE
+
     def create_query(self, expr):
+        empty_query = self.try_create_empty_query(expr)
+        if empty_query is not None:
+            return empty_query
+        queryable = expr.args[0].value
+        func = expr.func.resolve_value()
+        if func is LinqQuery.where and queryable.limit is None:
+            where_filter = self._get_where_filter(expr.args[1].value)
+            if where_filter is not None:
+                return self._create_where_query(expr, queryable, where_filter)
+        elif func is LinqQuery.take:
+            count = bind_call_args(expr).arguments.get('count_', 1)
+            if isinstance(count, int) and count >= 0:
+                return queryable.with_limit(count, expr)
         expr = self._get_rewrited_call_expr(expr) or expr
         return super().create_query(expr)
 
+    def _create_where_query(self, expr, queryable, where_filter):
+        doc_ids, cond = where_filter
+        if queryable.cond is not None:
+            cond = queryable.cond if cond is None else queryable.cond & cond
+        if queryable.doc_ids is not None:
+            doc_ids = queryable.doc_ids if doc_ids is None else queryable.doc_ids & doc_ids
+        if doc_ids is not None and not doc_ids:
+            return EmptyQuery(expr, 'no doc_id can match')
+        return NextTinyDbQuery(expr, queryable.table, cond, doc_ids)
+
+    _TERMINAL_FUNCS = (LinqQuery.count, LinqQuery.any, LinqQuery.first, LinqQuery.first_or_default)
+
+    def execute(self, expr):
+        if isinstance(expr, CallExpr) and expr.func.resolve_value() in self._TERMINAL_FUNCS:
+            return self._execute_terminal(expr)
+        return super().execute(expr)
+
+    def _execute_terminal(self, expr):
+        func = expr.func.resolve_value()
+        bound_args = bind_call_args(expr)
+        queryable = bound_args.arguments['self']
+        predicate = bound_args.arguments.get('predicate')
+        if predicate is not None:
+            if queryable.limit is not None:
+                return super().execute(expr)
+            where_filter = self._get_where_filter(predicate)
+            if where_filter is None:
+                return super().execute(expr)
+            queryable = self._create_where_query(expr, queryable, where_filter)
+            bound_args.arguments['predicate'] = None
+
+        if isinstance(queryable, EmptyQuery):
+            bound_args.arguments['self'] = queryable
+            return func(*bound_args.args, **bound_args.kwargs)
+        if func is LinqQuery.count:
+            return queryable.count_documents()
+        # `first()` and `any()` only require one document.
+        bound_args.arguments['self'] = queryable.with_limit(1)
+        return func(*bound_args.args, **bound_args.kwargs)
+
+    def _get_where_filter(self, predicate):
+        '''
+        try convert the predicate to a tuple `(doc_ids, cond)`,
+        `doc_ids` is from `x.doc_id == ?` and `cond` is the `tinydb.Query` condition.
+
+        return `None` when convert fail.
+        '''
+        func_expr = to_func_expr(predicate)
+        if func_expr is None or len(func_expr.args) != 1:
+            return None
+        # the closure variables should not be captured into the condition.
+        expr = fold_const_exprs(func_expr, snapshot_policy=ConstFoldingExprVisitor.LAZY_CLOSURE)
+        expr = _TinyDb1ExprVisitor().run(expr)
+        visitor = _TinyDbQueryExprVisitor()
+        doc_ids, cond = None, None
+        try:
+            for part in visitor.get_conjuncts(expr.body):
+                part_doc_ids = visitor.get_doc_ids(part)
+                if part_doc_ids is not None:
+                    doc_ids = part_doc_ids if doc_ids is None else doc_ids & part_doc_ids
+                else:
+                    part_cond = visitor.run(part)
+                    cond = part_cond if cond is None else cond & part_cond
+        except NotSupportError:
+            return None
+        return doc_ids, cond
+
     def _get_rewrited_call_expr(self, call_expr):
         func = call_expr.func.resolve_value()
         if func is LinqQuery.where:
             func_expr = to_func_expr(call_expr.args[1].value)
             if func_expr is None:
                 return
-            expr = func_expr.accept(_TinyDb1ExprVisitor())
-            expr = expr.accept(_TinyDb2ExprVisitor())
+            expr = _TinyDb1ExprVisitor().run(func_expr)
+            expr = _TinyDb2ExprVisitor().run(expr)
+            if has_foldable_exprs(expr, snapshot_policy=self.snapshot_policy):
+                # some values can be folded, but they may change before the query execute.
+                predicate_expr = Make.call(
+                    Make.ref(_compile_on_execute),
+                    Make.ref(expr),
+                    Make.ref(self.snapshot_policy),
+                    call_expr.args[1]
+                )
+                return Make.call(Make.ref(func), call_expr.args[0], predicate_expr)
             if expr is func_expr:
                 return
             compiled_func = emit(expr)
@@ -47,7 +237,7 @@ class _TinyDb1ExprVisitor(DbExprVisitor):
     use for convert attr to index expr
     '''
     def visit_attr_expr(self, expr):
-        expr = super().visit_attr_expr(expr)
+        expr = yield from super().visit_attr_expr(expr)
         if expr.type == ExprType.Attr:
             if expr.expr.type == ExprType.Parameter:
                 if expr.name != 'doc_id':
@@ -68,7 +258,7 @@ class _TinyDb2ExprVisitor(DbExprVisitor):
     `lambda x: 'a' in x and 'b' in x['a'] and x['a']['b'] == 1`
     '''
     def visit_binary_expr(self, expr):
-        expr = super().visit_binary_expr(expr)
+        expr = yield from super().visit_binary_expr(expr)
         if expr.op == 'in':
             if expr.right.type == ExprType.Index:
                 indexes, src = get_deep_indexes(expr.right)
@@ -98,6 +288,225 @@ class _TinyDb2ExprVisitor(DbExprVisitor):
             expr
         )
 
+def _iter_doc_ids(values):
+    '''
+    yield the int doc_ids which equals the `values`.
+    '''
+    for value in values:
+        try:
+            doc_id = int(value)
+        except (TypeError, ValueError, OverflowError):
+            continue
+        if doc_id == value:
+            yield doc_id
+
+def _not_contains(container, item):
+    return item not in container
+
+def _not_one_of(value, items):
+    return value not in items
+
+def _reduce_balanced(func, items: list):
+    '''
+    like `functools.reduce()`, but build a balanced tree,
+    so the conditions from a long `or` chain does not exceed the recursion limit when test.
+    '''
+    while len(items) > 1:
+        items = [func(*items[i:i+2]) if i + 1 < len(items) else items[i] for i in range(0, len(items), 2)]
+    return items[0]
+
+
+class _TinyDbQueryExprVisitor(DbExprVisitor):
+    '''
+    use for convert
+
+    `lambda x: x['a']['b'] == 1`
+
+    to
+
+    `Query()['a']['b'] == 1`
+    '''
+    def visit(self, expr):
+        raise NotSupportError
+
+    def visit_index_expr(self, expr):
+        # `lambda x: x['a']`
+        return self.get_path_query(expr).test(bool)
+
+    def visit_unary_expr(self, expr):
+        if expr.op == 'not':
+            return ~(yield expr.expr)
+        raise NotSupportError
+
+    def _is_logic_op(self, expr):
+        if expr.op in ('&', '|'):
+            # bitwise operation on values
+            return ExprType.Index not in (expr.left.type, expr.right.type)
+        return expr.op in ('and', 'or')
+
+    def get_conjuncts(self, expr):
+        '''
+        split `a and b and c` to `[a, b, c]`.
+        '''
+        conjuncts = []
+        stack = [expr]
+        while stack:
+            expr = stack.pop()
+            if expr.type == ExprType.Binary and expr.op in ('and', '&') and self._is_logic_op(expr):
+                stack.append(expr.right)
+                stack.append(expr.left)
+            else:
+                conjuncts.append(expr)
+        return conjuncts
+
+    def get_doc_ids(self, expr):
+        '''
+        get doc_ids from `x.doc_id == 1` or `x.doc_id in [1, 2]`.
+
+        return `None` if `expr` is not a doc_id lookup.
+        '''
+        if expr.type != ExprType.Binary:
+            return None
+        if self._is_doc_id(expr.left):
+            value = self._resolve_value(expr.right)
+        elif self._is_doc_id(expr.right) and expr.op == '==':
+            value = self._resolve_value(expr.left)
+        else:
+            return None
+        if expr.op == '==':
+            values = [value]
+        elif expr.op == 'in' and isinstance(value, (list, tuple, set, frozenset)):
+            values = value
+        else:
+            return None
+        # doc_id is always a int, but `1.0` or `True` also equals the doc_id `1`.
+        return frozenset(_iter_doc_ids(values))
+
+    def _is_doc_id(self, expr):
+        return expr.type == ExprType.Attr and expr.name == 'doc_id' and \
+            expr.expr.type == ExprType.Parameter
+
+    def visit_binary_expr(self, expr):
+        if not self._is_logic_op(expr) and expr.op in ('&', '|'):
+            raise NotSupportError
+        if expr.op in ('and', '&', 'or', '|'):
+            conds = []
+            for operand in self._get_operands(expr):
+                conds.append((yield operand))
+            return _reduce_balanced(operator.and_ if expr.op in ('and', '&') else operator.or_, conds)
+        return self._get_cond_by_compare(expr.left, expr.op, expr.right)
+
+    def _get_operands(self, expr):
+        '''
+        split `a or b or c` to `[a, b, c]`.
+        '''
+        operands = []
+        stack = [expr]
+        while stack:
+            operand = stack.pop()
+            if operand.type == ExprType.Binary and operand.op == expr.op and self._is_logic_op(operand):
+                stack.append(operand.right)
+                stack.append(operand.left)
+            else:
+                operands.append(operand)
+        return operands
+
+    def visit_call_expr(self, expr):
+        if require_argument(expr.func):
+            raise NotSupportError
+        func = expr.func.resolve_value()
+        if func is re.search or func is re.match:
+            if len(expr.args) != 2 or expr.kwargs:
+                raise NotSupportError
+            pattern = self._resolve_value(expr.args[0])
+            query = self.get_path_query(expr.args[1])
+            return query.search(pattern) if func is re.search else query.matches(pattern)
+        raise NotSupportError
+
+    _SWAPABLE_OP_MAP = {
+        '==': '==',
+        '!=': '!=',
+        '>': '<',
+        '<': '>',
+        '>=': '<=',
+        '<=': '>=',
+
+        # magic
+        'in': '-in',
+        'not in': '-not in',
+    }
+
+    def _get_cond_by_compare(self, left, op, right):
+        if op == 'in' and right.type == ExprType.Parameter:
+            # `lambda x: 'a' in x`
+            return self.get_path_query(Make.index(right, left)).exists()
+
+        if self.is_get_deep_indexes_from_parameter(left):
+            path_expr, value = left, self._resolve_value(right)
+        elif self.is_get_deep_indexes_from_parameter(right):
+            op = self._SWAPABLE_OP_MAP.get(op)
+            if op is None:
+                raise NotSupportError
+            path_expr, value = right, self._resolve_value(left)
+        else:
+            raise NotSupportError
+
+        query = self.get_path_query(path_expr)
+        if op in ('in', 'not in') and not isinstance(value, (list, tuple, set, frozenset)):
+            raise NotSupportError
+        if op == '==':
+            return query == value
+        if op == '!=':
+            return query != value
+        if op == 'in':
+            return query.one_of(self._ensure_hashable(tuple(value)))
+        if op == 'not in':
+            return query.test(_not_one_of, self._ensure_hashable(tuple(value)))
+
+        # the condition hash include the raw value.
+        value = self._ensure_hashable(value)
+        if op == '-in':
+            return query.test(operator.contains, value)
+        if op == '-not in':
+            return query.test(_not_contains, value)
+        if op == '>':
+            return query > value
+        if op == '<':
+            return query < value
+        if op == '>=':
+            return query >= value
+        if op == '<=':
+            return query <= value
+        raise NotSupportError
+
+    def _resolve_value(self, expr):
+        # the calls are not evaluated when the query is built.
+        if require_argument(expr) or not is_pure(expr):
+            raise NotSupportError
+        return expr.resolve_value()
+
+    def _ensure_hashable(self, value):
+        try:
+            hash(value)
+        except TypeError:
+            raise NotSupportError
+        return value
+
+    def get_path_query(self, expr):
+        '''
+        convert `arg['a']['b']...` to `Query()['a']['b']...`.
+        '''
+        from tinydb import Query
+
+        if not self.is_get_deep_indexes_from_parameter(expr):
+            raise NotSupportError
+        indexes, _ = get_deep_indexes(expr)
+        query = Query()
+        for index in indexes:
+            query = query[index.value]
+        return query
+
+
 PROVIDER = TinyDbQueryProvider()
 
 def patch():
@@ -7,6 +7,7 @@
 
 import abc
 import itertools
+import math
 from typing import Callable, Dict, List, TypeVar, Any
 import operator
 
@@ -15,8 +16,11 @@ from asq.queryables import OutOfRangeError
 from asq.selectors import identity
 from asq.namedelements import IndexedElement, KeyedElement
 
+from .expr import CallExpr
 from .queryable import IQueryable
-from .enumerable import IEnumerable
+from .enumerable import IEnumerable, Enumerable
+from .sorting import SortedItems
+from .sketches import HyperLogLog, KLLSketch
 
 # element
 T = TypeVar('T')
@@ -122,11 +126,19 @@ class LinqQuery:
 
     @extend_linq(True)
     def order_by(self, key_selector=identity) -> Any:
-        return query(self).order_by(key_selector)
+        return SortedItems.order_by(self, key_selector)
 
     @extend_linq(True)
     def order_by_descending(self, key_selector=identity) -> Any:
-        return query(self).order_by_descending(key_selector)
+        return SortedItems.order_by(self, key_selector, descending=True)
+
+    @extend_linq(True)
+    def then_by(self, key_selector=identity) -> Any:
+        return _get_sorted_items(self, 'then_by').then_by(key_selector)
+
+    @extend_linq(True)
+    def then_by_descending(self, key_selector=identity) -> Any:
+        return _get_sorted_items(self, 'then_by_descending').then_by(key_selector, descending=True)
 
     @extend_linq(True)
     def reverse(self) -> Any:
@@ -241,6 +253,44 @@ class LinqQuery:
     def aggregate(self, reducer, seed, result_selector=identity):
         return query(self).aggregate(reducer, seed, result_selector)
 
+    @extend_linq(False)
+    def count_distinct(self, selector=identity, approx: bool = True) -> int:
+        '''
+        count the distinct keys which selected by the `selector`.
+
+        if `approx` is `True`, the count is estimated by a `HyperLogLog` in one pass,
+        which the error is about 1%; otherwise all keys are kept in memory.
+        '''
+        _ensure_callable('count_distinct', 'selector', selector)
+        if not approx:
+            return len(set(map(selector, self)))
+        sketch = HyperLogLog()
+        sketch.update(map(selector, self))
+        return len(sketch)
+
+    @extend_linq(False)
+    def quantile(self, selector, q: float, approx: bool = True):
+        '''
+        get the `q` quantile (`0 <= q <= 1`) of the values which selected by the `selector`,
+        which is the value at the rank `ceil(q * count)` (at least 1) of the sorted values.
+
+        if `approx` is `True`, the quantile is estimated by a `KLLSketch` in one pass,
+        which the rank error is about 1%; otherwise all values are sorted in memory.
+        '''
+        _ensure_callable('quantile', 'selector', selector)
+        if not 0 <= q <= 1:
+            raise ValueError('q must be in [0, 1]')
+        if approx:
+            sketch = KLLSketch()
+            sketch.update(map(selector, self))
+            if not sketch.count:
+                raise ValueError('Cannot compute quantile() of an empty sequence.')
+            return sketch.quantile(q)
+        values = sorted(map(selector, self))
+        if not values:
+            raise ValueError('Cannot compute quantile() of an empty sequence.')
+        return values[max(1, math.ceil(q * len(values))) - 1]
+
     # logic operations
 
     @extend_linq(False)
@@ -276,5 +326,33 @@ class LinqQuery:
         for item in self:
             action(item)
 
+    # execution
+
+    @extend_linq(True)
+    def as_parallel(self, workers: int = None, ordered: bool = True, chunk_size: int = 1000):
+        # the in-memory queries are executed by a process pool, see `lquery.parallel`,
+        # the others are executed as normal.
+        return self
+
+def _ensure_callable(func_name: str, arg_name: str, func):
+    if not callable(func):
+        raise TypeError(f'{func_name}() parameter {arg_name}={func!r} is not callable')
+
+_SORT_FUNCS = (LinqQuery.order_by, LinqQuery.order_by_descending, LinqQuery.then_by, LinqQuery.then_by_descending)
+
+def _get_sorted_items(items, func_name: str) -> SortedItems:
+    '''
+    get the `SortedItems` from the result of `order_by()` or `then_by()`.
+    '''
+    if isinstance(items, Enumerable):
+        items = items.items
+    elif isinstance(items, IQueryable) and isinstance(items.expr, CallExpr) and \
+            items.expr.func.resolve_value() in _SORT_FUNCS:
+        # the query is not executed, only the keys are required.
+        items = items.expr.resolve_value()
+    if not isinstance(items, SortedItems):
+        raise TypeError(f'{func_name}() should be called after order_by() or then_by()')
+    return items
+
 # for load from outside:
 _ = None
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# the indexes for the in-memory items.
+# ----------
+
+import bisect
+from operator import itemgetter
+from typing import Optional, Tuple, List
+
+from .expr import IExpr, ExprType
+from .expr.builder import to_func_expr
+from .expr.utils import is_parameter_path, require_argument, is_pure, fold_const_exprs, ConstFoldingExprVisitor
+from .extras._common.predicate import Predicate, PredicateConflictError, merge_predicates
+
+
+def get_path(expr: IExpr) -> Optional[Tuple[tuple, ...]]:
+    '''
+    get a hashable path from `arg.a['b']...`, like `(('attr', 'a'), ('index', 'b'))`,
+    or `()` for the `arg` itself.
+
+    return `None` if the `expr` is not a path of the parameter.
+    '''
+    if expr.type == ExprType.Parameter:
+        return ()
+    if not is_parameter_path(expr):
+        return None
+    path = []
+    while expr.type != ExprType.Parameter:
+        if expr.type == ExprType.Attr:
+            path.append(('attr', expr.name))
+        else:
+            path.append(('index', expr.key.value))
+        expr = expr.expr
+    path.reverse()
+    return tuple(path)
+
+def get_selector_path(selector) -> Optional[Tuple[tuple, ...]]:
+    '''
+    get the path of a selector like `lambda x: x.a['b']`, see `get_path()`.
+    '''
+    func_expr = to_func_expr(selector)
+    if func_expr is None or len(func_expr.args) != 1:
+        return None
+    return get_path(func_expr.body)
+
+
+def _is_stale(items: list, size: int, last) -> bool:
+    '''
+    check is the first `size` items which indexed are changed for sure,
+    by the count of the `items` and the identity of the `last` indexed item.
+
+    this is only a safety net, the changes are not always detected,
+    like `items.pop(0); items.append(3)` on `[1, 2, 3]`, which keep the last item `3`.
+    '''
+    if len(items) < size:
+        return True
+    return size > 0 and items[size - 1] is not last
+
+
+class HashIndex:
+    '''
+    a dict index `{key: [position, ...]}` of a list.
+
+    the index catch up the appended items when lookup,
+    any other modify of the list (remove, insert, replace or sort the items) require call `rebuild()`.
+    '''
+    def __init__(self, items: list, selector):
+        self._items = items
+        self._selector = selector
+        self._positions = {}
+        self._size = 0
+        self._last = None
+        # a item which the key cannot be hashed or selected.
+        self._broken = False
+
+    def rebuild(self):
+        self._positions = {}
+        self._size = 0
+        self._last = None
+        self._broken = False
+
+    def _update(self):
+        if _is_stale(self._items, self._size, self._last):
+            self.rebuild()
+        positions = self._positions
+        selector = self._selector
+        for i in range(self._size, len(self._items)):
+            try:
+                positions.setdefault(selector(self._items[i]), []).append(i)
+            except Exception: # pylint: disable=W0703
+                # the scan should raise it, or not.
+                self._broken = True
+        self._size = len(self._items)
+        if self._size:
+            self._last = self._items[-1]
+
+    def lookup(self, keys) -> Optional[List[int]]:
+        '''
+        get the sorted positions of the items which the key equals any of the `keys`.
+
+        return `None` if the index cannot be used.
+        '''
+        self._update()
+        if self._broken:
+            return None
+        try:
+            if len(keys) == 1:
+                return self._positions.get(keys[0], [])
+            positions = set()
+            for key in keys:
+                positions.update(self._positions.get(key, ()))
+        except TypeError:
+            # unhashable
+            return None
+        return sorted(positions)
+
+
+class SortedIndex:
+    '''
+    a sorted list of the keys and the positions of a list,
+    which can lookup the keys or the ranges of the keys by `bisect`.
+
+    like `HashIndex`, the index catch up the appended items when lookup,
+    any other modify of the list require call `rebuild()`.
+    '''
+    def __init__(self, items: list, selector):
+        self._items = items
+        self._selector = selector
+        self._keys = []
+        self._positions = []
+        self._size = 0
+        self._last = None
+        # a item which the key cannot be selected or ordered.
+        self._broken = False
+
+    def rebuild(self):
+        self._keys = []
+        self._positions = []
+        self._size = 0
+        self._last = None
+        self._broken = False
+
+    def _update(self):
+        if _is_stale(self._items, self._size, self._last):
+            self.rebuild()
+        if self._size == len(self._items):
+            return
+        size, self._size = self._size, len(self._items)
+        self._last = self._items[-1]
+        if self._broken:
+            return
+        try:
+            pairs = [(self._selector(self._items[i]), i) for i in range(size, len(self._items))]
+            if any(key != key for key, _ in pairs):
+                # like float('nan')
+                raise TypeError
+            # the sort is stable, so the positions of the same keys are ascending.
+            pairs = sorted(list(zip(self._keys, self._positions)) + pairs, key=itemgetter(0))
+        except Exception: # pylint: disable=W0703
+            self._broken = True
+            self._keys = []
+            self._positions = []
+            return
+        self._keys = [key for key, _ in pairs]
+        self._positions = [position for _, position in pairs]
+
+    def lookup(self, keys) -> Optional[List[int]]:
+        '''
+        get the sorted positions of the items which the key equals any of the `keys`.
+
+        return `None` if the index cannot be used.
+        '''
+        self._update()
+        if self._broken:
+            return None
+        positions = []
+        try:
+            for key in set(keys):
+                start = bisect.bisect_left(self._keys, key)
+                end = bisect.bisect_right(self._keys, key, start)
+                positions.extend(self._positions[start:end])
+        except TypeError:
+            return None
+        return sorted(positions)
+
+    def lookup_range(self, lower: Optional[tuple], upper: Optional[tuple]) -> Optional[List[int]]:
+        '''
+        get the sorted positions of the items which the key in the range.
+
+        the bounds are `(value, closed)` or `None` for infinity.
+
+        return `None` if the index cannot be used.
+        '''
+        self._update()
+        if self._broken:
+            return None
+        try:
+            start, end = 0, len(self._keys)
+            if lower is not None:
+                start = (bisect.bisect_left if lower[1] else bisect.bisect_right)(self._keys, lower[0])
+            if upper is not None:
+                end = (bisect.bisect_right if upper[1] else bisect.bisect_left)(self._keys, upper[0], start)
+        except TypeError:
+            return None
+        return sorted(self._positions[start:max(start, end)])
+
+    def iter_positions(self) -> Optional[List[int]]:
+        '''
+        get the positions of the items which ordered by the key,
+        the items which have the same key are kept in the original order.
+
+        return `None` if the index cannot be used.
+        '''
+        self._update()
+        if self._broken:
+            return None
+        return self._positions
+
+
+class IndexLookup:
+    '''
+    a lookup from a conjunct of a predicate, like `x.a == key` or `x.a in keys`.
+    '''
+    def __init__(self, index, op: str, value_expr: IExpr):
+        self._index = index
+        self._op = op
+        self._value_expr = value_expr
+
+    def get_positions(self) -> Optional[List[int]]:
+        '''
+        get the sorted positions of the items which may match the predicate,
+        or `None` if the index cannot be used.
+        '''
+        try:
+            value = self._value_expr.resolve_value()
+        except Exception: # pylint: disable=W0703
+            return None
+        if self._op == '==':
+            keys = [value]
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            keys = list(value)
+        else:
+            return None
+        return self._index.lookup(keys)
+
+
+class RangeLookup:
+    '''
+    a lookup from the conjuncts of a predicate on the same key of a `SortedIndex`,
+    like `lo <= x.a < hi`.
+
+    the bounds are merged by `merge_predicates()` when execute.
+    '''
+    def __init__(self, index: SortedIndex, bounds: List[Tuple[str, IExpr]]):
+        self._index = index
+        self._bounds = bounds
+
+    def get_positions(self) -> Optional[List[int]]:
+        '''
+        get the sorted positions of the items which may match the predicate,
+        or `None` if the index cannot be used.
+        '''
+        predicates = []
+        try:
+            for op, value_expr in self._bounds:
+                value = value_expr.resolve_value()
+                if op == 'in' and not isinstance(value, (list, tuple, set, frozenset)):
+                    return None
+                predicates.append(Predicate.create_binary(op, value))
+            predicates = merge_predicates(predicates)
+        except PredicateConflictError:
+            return []
+        except Exception: # pylint: disable=W0703
+            return None
+        lower = upper = None
+        for predicate in predicates:
+            if predicate.op == '==':
+                return self._index.lookup([predicate.value])
+            if predicate.op == 'in':
+                return self._index.lookup(list(predicate.value))
+            if predicate.op in ('>', '>='):
+                lower = (predicate.value, predicate.op == '>=')
+            elif predicate.op in ('<', '<='):
+                upper = (predicate.value, predicate.op == '<=')
+        if lower is None and upper is None:
+            return None
+        return self._index.lookup_range(lower, upper)
+
+
+def _get_conjuncts(expr):
+    conjuncts = []
+    stack = [expr]
+    while stack:
+        expr = stack.pop()
+        if expr.type == ExprType.Binary and expr.op == 'and':
+            stack.append(expr.right)
+            stack.append(expr.left)
+        else:
+            conjuncts.append(expr)
+    return conjuncts
+
+_SWAPPED_OPS = {'==': '==', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+def _get_comparison(conjunct: IExpr) -> Optional[Tuple[tuple, str, IExpr]]:
+    '''
+    get `(path, op, value_expr)` from a conjunct like `x.a < value` or `value > x.a`.
+    '''
+    if conjunct.type != ExprType.Binary:
+        return None
+    if conjunct.op == 'in':
+        sides = [(conjunct.left, 'in', conjunct.right)]
+    elif conjunct.op in _SWAPPED_OPS:
+        sides = [
+            (conjunct.left, conjunct.op, conjunct.right),
+            (conjunct.right, _SWAPPED_OPS[conjunct.op], conjunct.left)
+        ]
+    else:
+        return None
+    for path_expr, op, value_expr in sides:
+        # the calls are evaluated for each item when scan, so they cannot be looked up once.
+        if require_argument(value_expr) or not is_pure(value_expr):
+            continue
+        path = get_path(path_expr)
+        if path is not None:
+            return path, op, value_expr
+    return None
+
+def get_index_lookup(indexes: dict, predicate):
+    '''
+    find the conjuncts of the `predicate` which can be answered by one of the `indexes` (`{path: index}`).
+
+    return a `IndexLookup`, a `RangeLookup` or `None`.
+    '''
+    func_expr = to_func_expr(predicate)
+    if func_expr is None or len(func_expr.args) != 1:
+        return None
+    # the closure variables should be read on each execution.
+    func_expr = fold_const_exprs(func_expr, snapshot_policy=ConstFoldingExprVisitor.LAZY_CLOSURE)
+    comparisons = [c for c in map(_get_comparison, _get_conjuncts(func_expr.body)) if c and c[0] in indexes]
+    for path, op, value_expr in comparisons:
+        index = indexes[path]
+        if isinstance(index, SortedIndex):
+            return RangeLookup(index, [(o, v) for p, o, v in comparisons if p == path])
+        if op in ('==', 'in'):
+            return IndexLookup(index, op, value_expr)
+    return None
@@ -5,29 +5,117 @@
 # queryable for Iterable
 # ----------
 
+import itertools
 from typing import Union
-from collections.abc import Iterable
+from collections.abc import Iterable, Sized
 
+from asq.queryables import Grouping
+from asq.selectors import identity
 from typeguard import typechecked
 
 from .expr import CallExpr, ValueExpr, Make
 from .queryable import AbstractQueryable, IQueryProvider, ReduceInfo
 # load funcs for all extensions
-from .funcs import _
+from .funcs import _, LinqQuery
+from .extras._common import bind_call_args
+from .extras._common.predicate.normalizer import get_conflict_reason
+from .indexes import HashIndex, SortedIndex, get_selector_path, get_index_lookup
+from .aggregates import get_aggregate_plan
+from .ordering import get_top_query_args, try_find
+from .sorting import iter_external_sorted
+from .spill import SpillStats, iter_groups, iter_key_set_op
+from . import joins
 
 
 class NextIterableQuery(AbstractQueryable):
-    def __init__(self, expr):
-        super().__init__(expr, PROVIDER)
+    def __init__(self, expr, provider=None):
+        super().__init__(expr, provider or PROVIDER)
 
     def update_reduce_info(self, reduce_info):
         reduce_info.add_node(ReduceInfo.TYPE_MEMORY, self.expr)
 
 
 class IterableQuery(NextIterableQuery):
+    '''
+    the queryable for the in-memory items.
+
+    if `chunk_size` is not `None`, the query is executed chunk by chunk,
+    see `ChunkedIterableQueryProvider`.
+
+    `size_hint` is the count of the items if it is known but the items has no `__len__`.
+
+    if `sort_budget` is not `None`, the sorts keep at most `sort_budget` items in memory,
+    the other items are spilled to the temp files, see `ExternalOrderByQuery`.
+
+    if `spill_budget` is not `None`, `group_by()`, `distinct()`, `union()`, `intersect()`,
+    `difference()` and the hash joins keep at most about `spill_budget` items or keys in memory,
+    the other states are spilled to the temp files, see `SpillQuery`.
+
+    the items which spilled by `sort_budget` or `spill_budget` are pickled,
+    so they must be picklable (or a `TypeError` is raised), and the results are the copies of them.
+    '''
     @typechecked
-    def __init__(self, items: Iterable):
-        super().__init__(Make.ref(items))
+    def __init__(self, items: Iterable, *, chunk_size: int = None, size_hint: int = None,
+                 sort_budget: int = None, spill_budget: int = None):
+        if chunk_size is not None:
+            provider = ChunkedIterableQueryProvider(chunk_size, sort_budget=sort_budget, spill_budget=spill_budget)
+        elif sort_budget is not None or spill_budget is not None:
+            provider = IterableQueryProvider(sort_budget=sort_budget, spill_budget=spill_budget)
+        else:
+            provider = None
+        super().__init__(Make.ref(items), provider)
+        self._indexes = {}
+        self._size_hint = size_hint
+
+    @property
+    def size_hint(self):
+        '''
+        the declared count of the items, which used to plan the joins
+        when the items has no `__len__`.
+        '''
+        return self._size_hint
+
+    @property
+    def indexes(self):
+        '''
+        a dict `{path: index}`, see `index_by()`.
+        '''
+        return self._indexes
+
+    def index_by(self, selector, *, ordered: bool = False):
+        '''
+        add a hash index for the key `selector` like `lambda x: x.id`,
+        then `where(lambda x: x.id == ?)` and `where(lambda x: x.id in ?)` lookup the index
+        instead of scan all items.
+
+        if `ordered` is `True`, add a sorted index instead,
+        which also can be used by the range predicates like `where(lambda x: lo <= x.id < hi)`
+        and by `order_by(lambda x: x.id)`.
+
+        the items must be a `list`; the appended items are indexed when lookup,
+        any other modify of the list (remove, insert, replace or sort the items)
+        require call `rebuild_indexes()`, otherwise the lookups may miss the items.
+
+        return the query itself.
+        '''
+        items = self.expr.value
+        if not isinstance(items, list):
+            raise TypeError('the items must be a list')
+        path = get_selector_path(selector)
+        if path is None:
+            raise ValueError('the selector must be like `lambda x: x.a[\'b\']`')
+        self._indexes[path] = (SortedIndex if ordered else HashIndex)(items, selector)
+        return self
+
+    def rebuild_indexes(self):
+        '''
+        rebuild all indexes after the items are modified not by append, see `index_by()`.
+
+        return the query itself.
+        '''
+        for index in self._indexes.values():
+            index.rebuild()
+        return self
 
     def __str__(self):
         return f'IQueryable({self.expr.value})'
@@ -36,11 +124,586 @@ class IterableQuery(NextIterableQuery):
         reduce_info.add_node(ReduceInfo.TYPE_SRC, self.expr)
 
 
+class IndexedWhereQuery(AbstractQueryable):
+    '''
+    a `where()` which get the items by a index, then test the predicate on them.
+    '''
+    def __init__(self, expr, source: IterableQuery, lookup, predicate):
+        super().__init__(expr, source.provider)
+        self._source = source
+        self._lookup = lookup
+        self._predicate = predicate
+
+    def __iter__(self):
+        items = self._source.expr.value
+        positions = self._lookup.get_positions()
+        if positions is None:
+            return filter(self._predicate, items)
+        return filter(self._predicate, [items[i] for i in positions])
+
+    def update_reduce_info(self, reduce_info):
+        reduce_info.add_node(ReduceInfo.TYPE_MEMORY, self.expr)
+
+
+class IndexedOrderByQuery(AbstractQueryable):
+    '''
+    a `order_by()` which yield the items by the order of a `SortedIndex`.
+    '''
+    def __init__(self, expr, source: IterableQuery, index: SortedIndex):
+        super().__init__(expr, source.provider)
+        self._source = source
+        self._index = index
+
+    def __iter__(self):
+        items = self._source.expr.value
+        positions = self._index.iter_positions()
+        if positions is None:
+            # let it raise the error like `TypeError`
+            return iter(self.expr.resolve_value())
+        return (items[i] for i in positions)
+
+    def update_reduce_info(self, reduce_info):
+        reduce_info.add_node(ReduceInfo.TYPE_MEMORY, self.expr)
+
+
+class ExternalOrderByQuery(AbstractQueryable):
+    '''
+    a `order_by()` (and some `then_by()`) which sort the items by a external merge sort,
+    see `lquery.sorting.iter_external_sorted()`.
+    '''
+    def __init__(self, expr, provider, source, keys: tuple):
+        super().__init__(expr, provider)
+        self._source = source
+        self._keys = keys
+
+    @property
+    def source(self):
+        return self._source
+
+    @property
+    def keys(self):
+        return self._keys
+
+    def __iter__(self):
+        return iter_external_sorted(self._source, self._keys, self.provider.sort_budget, self.provider.spill_stats)
+
+    def update_reduce_info(self, reduce_info):
+        reduce_info.add_node(ReduceInfo.TYPE_MEMORY, self.expr)
+
+
+class JoinQuery(AbstractQueryable):
+    '''
+    a `join()` or `group_join()` which executed by a strategy of `lquery.joins`.
+    '''
+    def __init__(self, expr, provider, strategy: str, iter_results):
+        super().__init__(expr, provider)
+        self._strategy = strategy
+        self._iter_results = iter_results
+
+    @property
+    def strategy(self):
+        return self._strategy
+
+    def __iter__(self):
+        # `asq` test the sources by `iter()`, which should not execute the join.
+        yield from self._iter_results()
+
+    def update_reduce_info(self, reduce_info):
+        reduce_info.add_node(ReduceInfo.TYPE_MEMORY, self.expr)
+
+
+class SpillQuery(AbstractQueryable):
+    '''
+    a `group_by()`, `distinct()`, `union()`, `intersect()` or `difference()`
+    which spill the states to the temp files if they are larger than the `spill_budget`,
+    see `lquery.spill`.
+    '''
+    def __init__(self, expr, provider, iter_results):
+        super().__init__(expr, provider)
+        self._iter_results = iter_results
+
+    def __iter__(self):
+        # `asq` test the sources by `iter()`, which should not execute the query.
+        yield from self._iter_results()
+
+    def update_reduce_info(self, reduce_info):
+        reduce_info.add_node(ReduceInfo.TYPE_MEMORY, self.expr)
+
+
+class GroupAggregateQuery(AbstractQueryable):
+    '''
+    a `group_by()` which the results are computed by the accumulators of each key,
+    see `lquery.aggregates`.
+    '''
+    def __init__(self, expr, provider, source, plan, key_selector, element_selector):
+        super().__init__(expr, provider)
+        self._source = source
+        self._plan = plan
+        self._key_selector = key_selector
+        self._element_selector = element_selector
+
+    def __iter__(self):
+        return self._plan.execute(self._source, self._key_selector, self._element_selector)
+
+    def update_reduce_info(self, reduce_info):
+        reduce_info.add_node(ReduceInfo.TYPE_MEMORY, self.expr)
+
+
+class TopQuery(AbstractQueryable):
+    '''
+    a `take()` of a `order_by()` which keep the items by a bounded heap,
+    see `lquery.ordering`.
+    '''
+    def __init__(self, expr, provider, chain, count: int):
+        super().__init__(expr, provider)
+        self._chain = chain
+        self._count = count
+
+    def __iter__(self):
+        yield from self._chain.take(self._count)
+
+    def update_reduce_info(self, reduce_info):
+        reduce_info.add_node(ReduceInfo.TYPE_MEMORY, self.expr)
+
+
+def _get_key_selector(expr: CallExpr):
+    return bind_call_args(expr).arguments.get('key_selector', identity)
+
+def _get_size(source):
+    if isinstance(source, IterableQuery):
+        if source.size_hint is not None:
+            return source.size_hint
+        source = source.expr.value
+    elif isinstance(source, AbstractQueryable):
+        return None
+    return len(source) if isinstance(source, Sized) else None
+
+def _is_ordered_by(source, key_selector):
+    '''
+    test whether the `source` is a `order_by()` by the same key path as the `key_selector`.
+    '''
+    if not isinstance(source, AbstractQueryable) or not isinstance(source.expr, CallExpr):
+        return False
+    if source.expr.func.resolve_value() is not LinqQuery.order_by:
+        return False
+    path = get_selector_path(key_selector)
+    return path is not None and path == get_selector_path(_get_key_selector(source.expr))
+
+def plan_join(outer, inner, outer_key_selector, inner_key_selector, *,
+              spill_budget: int = None, spill_stats: SpillStats = None):
+    '''
+    choose a join strategy, return `(strategy, iter_matches)`,
+    see `lquery.joins`.
+
+    if `spill_budget` is not `None`, the hash joins are replaced by the grace hash join.
+    '''
+    if isinstance(inner, IterableQuery):
+        index = inner.indexes.get(get_selector_path(inner_key_selector))
+        if index is not None:
+            return joins.STRATEGY_INDEX, lambda: joins.index_join(
+                outer, inner.expr.value, index, outer_key_selector, inner_key_selector)
+    args = (outer, inner, outer_key_selector, inner_key_selector)
+    if _is_ordered_by(outer, outer_key_selector) and _is_ordered_by(inner, inner_key_selector):
+        return joins.STRATEGY_MERGE, lambda: joins.merge_join(*args)
+    if spill_budget is not None:
+        return joins.STRATEGY_GRACE_HASH, lambda: joins.grace_hash_join(*args, spill_budget, spill_stats)
+    outer_size, inner_size = _get_size(outer), _get_size(inner)
+    if outer_size is not None and (inner_size is None or outer_size < inner_size):
+        return joins.STRATEGY_HASH_OUTER, lambda: joins.hash_outer_join(*args)
+    return joins.STRATEGY_HASH, lambda: joins.hash_join(*args)
+
+
+_SORT_FUNCS = {
+    # func: (descending, then)
+    LinqQuery.order_by: (False, False),
+    LinqQuery.order_by_descending: (True, False),
+    LinqQuery.then_by: (False, True),
+    LinqQuery.then_by_descending: (True, True),
+}
+
+_SET_FUNCS = {
+    LinqQuery.distinct, LinqQuery.union, LinqQuery.intersect, LinqQuery.difference,
+}
+
+
 class IterableQueryProvider(IQueryProvider):
+    # the queries which are already sorted, so the items should not be sorted again.
+    SORTED_QUERY_TYPES = (IndexedOrderByQuery, )
+
+    def __init__(self, *, sort_budget: int = None, spill_budget: int = None):
+        if sort_budget is not None and sort_budget < 1:
+            raise ValueError('sort_budget must be positive')
+        if spill_budget is not None and spill_budget < 1:
+            raise ValueError('spill_budget must be positive')
+        self._sort_budget = sort_budget
+        self._spill_budget = spill_budget
+        self._spill_stats = SpillStats()
+
+    @property
+    def sort_budget(self):
+        '''
+        the max count of the items which a sort keep in memory, or `None` for unlimited.
+        '''
+        return self._sort_budget
+
+    @property
+    def spill_budget(self):
+        '''
+        the max count of the items or keys which a `SpillQuery` or a grace hash join keep in memory,
+        or `None` for unlimited.
+        '''
+        return self._spill_budget
+
+    @property
+    def spill_stats(self):
+        '''
+        the `SpillStats` of the data which the queries of this provider spilled to the temp files.
+        '''
+        return self._spill_stats
+
     def create_query(self, expr: CallExpr):
-        return NextIterableQuery(expr)
+        # the next queries keep the provider only if it has the options.
+        has_options = self._sort_budget is not None or self._spill_budget is not None
+        return self.try_create_empty_query(expr) or \
+            self.try_create_indexed_query(expr) or \
+            self.try_create_join_query(expr) or \
+            self.try_create_aggregate_query(expr) or \
+            self.try_create_top_query(expr) or \
+            self.try_create_external_sort_query(expr) or \
+            self.try_create_spill_query(expr) or \
+            self.try_create_parallel_query(expr) or \
+            NextIterableQuery(expr, self if has_options else None)
+
+    def try_create_spill_query(self, expr: CallExpr):
+        '''
+        return a `SpillQuery` for `group_by()`, `distinct()`, `union()`, `intersect()` and `difference()`
+        if the `spill_budget` is set, otherwise return `None`.
+        '''
+        if self._spill_budget is None:
+            return None
+        func = expr.func.resolve_value()
+        if func is not LinqQuery.group_by and func not in _SET_FUNCS:
+            return None
+        try:
+            bound_args = bind_call_args(expr)
+        except TypeError:
+            return None
+        bound_args.apply_defaults()
+        budget, stats = self._spill_budget, self._spill_stats
+        if func is LinqQuery.group_by:
+            source, key_selector, element_selector, result_selector = bound_args.args
+            if not all(callable(x) for x in (key_selector, element_selector, result_selector)):
+                # let `asq` raise the error.
+                return None
+            def iter_results():
+                for key, elements in iter_groups(source, key_selector, element_selector, budget, stats):
+                    yield result_selector(key, Grouping(key, elements))
+            return SpillQuery(expr, self, iter_results)
+        if func is LinqQuery.distinct:
+            (source, selector), second = bound_args.args, ()
+        else:
+            source, second, selector = bound_args.args
+            if not isinstance(second, Iterable):
+                return None
+        if not callable(selector):
+            return None
+        intersect = func is LinqQuery.intersect
+        def iter_results():
+            if func is LinqQuery.union:
+                return iter_key_set_op(itertools.chain(source, second), selector, (), budget, stats)
+            return iter_key_set_op(source, selector, second, budget, stats, intersect=intersect)
+        return SpillQuery(expr, self, iter_results)
+
+    def try_create_external_sort_query(self, expr: CallExpr):
+        '''
+        return a `ExternalOrderByQuery` for `order_by()` and `then_by()` if the `sort_budget` is set,
+        otherwise return `None`.
+        '''
+        if self._sort_budget is None:
+            return None
+        func = expr.func.resolve_value()
+        if func not in _SORT_FUNCS or len(expr.args) > 2 or expr.kwargs:
+            return None
+        source = expr.args[0].value
+        key_selector = expr.args[1].value if len(expr.args) == 2 else identity
+        if not callable(key_selector):
+            # let `asq` raise the error.
+            return None
+        descending, then = _SORT_FUNCS[func]
+        if not then:
+            return ExternalOrderByQuery(expr, self, source, ((key_selector, descending), ))
+        if isinstance(source, ExternalOrderByQuery):
+            return ExternalOrderByQuery(expr, self, source.source, source.keys + ((key_selector, descending), ))
+        return None
+
+    def try_create_parallel_query(self, expr: CallExpr):
+        '''
+        return a query of `ParallelQueryProvider` for `as_parallel()`, otherwise return `None`.
+        '''
+        if expr.func.resolve_value() is not LinqQuery.as_parallel:
+            return None
+        bound_args = bind_call_args(expr)
+        bound_args.apply_defaults()
+        _, workers, ordered, chunk_size = bound_args.args
+        from .parallel import ParallelQueryProvider
+        provider = ParallelQueryProvider(workers, ordered=ordered, chunk_size=chunk_size,
+                                         sort_budget=self._sort_budget, spill_budget=self._spill_budget)
+        return NextIterableQuery(expr, provider)
+
+    def try_create_join_query(self, expr: CallExpr):
+        '''
+        return a `JoinQuery` for `join()` and `group_join()`, otherwise return `None`.
+        '''
+        func = expr.func.resolve_value()
+        if func is LinqQuery.join:
+            iter_results = joins.iter_join_results
+        elif func is LinqQuery.group_join:
+            iter_results = joins.iter_group_join_results
+        else:
+            return None
+        try:
+            bound_args = bind_call_args(expr)
+        except TypeError:
+            return None
+        bound_args.apply_defaults()
+        outer, inner, outer_key_selector, inner_key_selector, result_selector = bound_args.args
+        if not isinstance(inner, Iterable):
+            return None
+        if not all(callable(x) for x in (outer_key_selector, inner_key_selector, result_selector)):
+            # let `asq` raise the error.
+            return None
+        strategy, iter_matches = plan_join(outer, inner, outer_key_selector, inner_key_selector,
+                                           spill_budget=self._spill_budget, spill_stats=self._spill_stats)
+        return JoinQuery(expr, self, strategy, lambda: iter_results(iter_matches(), result_selector))
+
+    def try_create_indexed_query(self, expr: CallExpr):
+        '''
+        return a `IndexedWhereQuery` if the `where()` can lookup a index,
+        or a `IndexedOrderByQuery` if the `order_by()` can use a sorted index,
+        otherwise return `None`.
+        '''
+        if expr.func.resolve_value() is LinqQuery.where and len(expr.args) == 2:
+            source = expr.args[0].value
+            if not isinstance(source, IterableQuery) or not source.indexes:
+                return None
+            if not isinstance(expr.args[1], ValueExpr):
+                return None
+            predicate = expr.args[1].value
+            lookup = get_index_lookup(source.indexes, predicate)
+            if lookup is not None:
+                return IndexedWhereQuery(expr, source, lookup, predicate)
+        if expr.func.resolve_value() is LinqQuery.order_by:
+            source = expr.args[0].value
+            if not isinstance(source, IterableQuery) or not source.indexes:
+                return None
+            path = get_selector_path(_get_key_selector(expr))
+            index = source.indexes.get(path)
+            if isinstance(index, SortedIndex):
+                return IndexedOrderByQuery(expr, source, index)
+        return None
+
+    def try_create_aggregate_query(self, expr: CallExpr):
+        '''
+        return a `GroupAggregateQuery` for the `group_by()` which only the keys and the aggregates are used,
+        like `group_by(...).select(lambda g: (g.key, g.count()))`, otherwise return `None`.
+        '''
+        func = expr.func.resolve_value()
+        if func is LinqQuery.select and len(expr.args) == 2 and not expr.kwargs:
+            group_by_query = expr.args[0].value
+            if not isinstance(group_by_query, AbstractQueryable) or not isinstance(group_by_query.expr, CallExpr):
+                return None
+            group_by_expr = group_by_query.expr
+            if group_by_expr.func.resolve_value() is not LinqQuery.group_by:
+                return None
+            if 'result_selector' in bind_call_args(group_by_expr).arguments:
+                return None
+            result_selector, key_arg = expr.args[1].value, False
+        elif func is LinqQuery.group_by:
+            group_by_expr = expr
+            result_selector = bind_call_args(group_by_expr).arguments.get('result_selector')
+            if result_selector is None:
+                return None
+            key_arg = True
+        else:
+            return None
+        arguments = bind_call_args(group_by_expr).arguments
+        key_selector = arguments.get('key_selector', identity)
+        element_selector = arguments.get('element_selector', identity)
+        if not all(callable(x) for x in (key_selector, element_selector, result_selector)):
+            # let `asq` raise the error.
+            return None
+        plan = get_aggregate_plan(result_selector, key_arg=key_arg)
+        if plan is None:
+            return None
+        return GroupAggregateQuery(expr, self, arguments['self'], plan, key_selector, element_selector)
+
+    def try_create_top_query(self, expr: CallExpr):
+        '''
+        return a `TopQuery` for `order_by(...).take(n)`, otherwise return `None`.
+        '''
+        args = get_top_query_args(expr)
+        if args is None or isinstance(args[0].ordered_query, self.SORTED_QUERY_TYPES):
+            return None
+        if self._sort_budget is not None and args[1] > self._sort_budget:
+            # the heap is larger than the budget, so take from the merged runs.
+            return None
+        return TopQuery(expr, self, *args)
+
+    def try_create_empty_query(self, expr: CallExpr):
+        '''
+        return a `EmptyQuery` if the query never yield any item, otherwise return `None`.
+        '''
+        if expr.func.resolve_value() is LinqQuery.where and len(expr.args) == 2:
+            if not isinstance(expr.args[1], ValueExpr):
+                # like the predicate which rewrited by the providers.
+                return None
+            reason = get_conflict_reason(expr.args[1].value)
+            if reason is not None:
+                from .empty import EmptyQuery
+                return EmptyQuery(expr, reason)
+        return None
 
     def execute(self, expr: Union[ValueExpr, CallExpr]):
+        if isinstance(expr, CallExpr):
+            executed, result = try_find(expr, skip_types=self.SORTED_QUERY_TYPES)
+            if executed:
+                return result
         return expr.resolve_value()
 
 PROVIDER = IterableQueryProvider()
+
+
+def _split_chunks(items, chunk_size: int):
+    if isinstance(items, list):
+        for i in range(0, len(items), chunk_size):
+            yield items[i:i+chunk_size]
+    else:
+        iterator = iter(items)
+        while True:
+            chunk = list(itertools.islice(iterator, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+
+class ChunkedIterableQueryProvider(IterableQueryProvider):
+    '''
+    execute the query chunk by chunk instead of item by item.
+
+    the continuous `where()` and `select()` are applied on each chunk
+    by one `filter()` or `map()` call, and the sinks like `to_list()` receive the whole chunks.
+
+    the predicates and selectors are called for a whole chunk before any result of it is yielded,
+    so a `take()` after them may call them for up to `chunk_size - 1` more items.
+    '''
+    _CHUNK_FUNCS = {
+        LinqQuery.where: lambda predicate: lambda chunk: list(filter(predicate, chunk)),
+        LinqQuery.select: lambda selector: lambda chunk: list(map(selector, chunk)),
+    }
+
+    def __init__(self, chunk_size: int, *, sort_budget: int = None, spill_budget: int = None):
+        super().__init__(sort_budget=sort_budget, spill_budget=spill_budget)
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive')
+        self._chunk_size = chunk_size
+
+    @property
+    def chunk_size(self):
+        return self._chunk_size
+
+    def create_query(self, expr: CallExpr):
+        return self.try_create_empty_query(expr) or \
+            self.try_create_indexed_query(expr) or \
+            self.try_create_join_query(expr) or \
+            self.try_create_aggregate_query(expr) or \
+            self.try_create_top_query(expr) or \
+            self.try_create_external_sort_query(expr) or \
+            self.try_create_spill_query(expr) or \
+            self.try_create_parallel_query(expr) or \
+            NextIterableQuery(expr, self)
+
+    def _get_stage(self, expr):
+        '''
+        get `(func, arg)` if the `expr` is a `where()` or a `select()` which can be applied on the chunks,
+        otherwise return `None`.
+        '''
+        if not isinstance(expr, CallExpr) or len(expr.args) != 2 or expr.kwargs:
+            return None
+        if not isinstance(expr.args[1], ValueExpr):
+            return None
+        func = expr.func.resolve_value()
+        if func not in self._CHUNK_FUNCS:
+            return None
+        return func, expr.args[1].value
+
+    def _get_chunk_func(self, expr):
+        '''
+        get a func which apply the `expr` on a chunk, or `None` if the `expr` cannot be chunked.
+        '''
+        stage = self._get_stage(expr)
+        if stage is None:
+            return None
+        func, arg = stage
+        return self._CHUNK_FUNCS[func](arg)
+
+    def _get_stages(self, expr):
+        '''
+        split the `expr` into the source and the continuous stages on it,
+        return `(source, [(func, arg), ...])`.
+        '''
+        stages = []
+        while True:
+            stage = self._get_stage(expr)
+            if stage is None:
+                source = super().execute(expr)
+                break
+            stages.append(stage)
+            queryable = expr.args[0].value
+            if not isinstance(queryable, NextIterableQuery):
+                # like a query of the database.
+                source = queryable
+                break
+            expr = queryable.expr
+        stages.reverse()
+        return source, stages
+
+    def _iter_chunks(self, expr):
+        source, stages = self._get_stages(expr)
+        yield from self._iter_stage_chunks(source, stages)
+
+    def _iter_stage_chunks(self, source, stages):
+        funcs = [self._CHUNK_FUNCS[func](arg) for func, arg in stages]
+        for chunk in _split_chunks(source, self._chunk_size):
+            for func in funcs:
+                chunk = func(chunk)
+                if not chunk:
+                    break
+            if chunk:
+                yield chunk
+
+    def iter_chunks(self, queryable: NextIterableQuery):
+        '''
+        execute the `queryable` and iterate the results as lists.
+        '''
+        return self._iter_chunks(queryable.expr)
+
+    def execute(self, expr: Union[ValueExpr, CallExpr]):
+        if self._get_chunk_func(expr) is not None:
+            return itertools.chain.from_iterable(self._iter_chunks(expr))
+        if isinstance(expr, CallExpr) and expr.func.resolve_value() is LinqQuery.to_list:
+            items = []
+            for chunk in self._iter_chunks(expr.args[0].value.expr):
+                items.extend(chunk)
+            return items
+        return super().execute(expr)
+
+
+def iter_chunks(items: Iterable, chunk_size: int):
+    '''
+    split the `items` into lists with `chunk_size` items at most.
+
+    if the `items` is a query of `ChunkedIterableQueryProvider`, the chunks of the query are used.
+    '''
+    if isinstance(items, NextIterableQuery) and isinstance(items.provider, ChunkedIterableQueryProvider):
+        return items.provider.iter_chunks(items)
+    return _split_chunks(items, chunk_size)
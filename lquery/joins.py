@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# the join strategies for the in-memory items.
+# ----------
+
+'''
+each strategy yield `(outer, key, inners)` for each outer item by the outer order,
+the `inners` are the inner items which the key equals the `key`, by the inner order.
+
+so `join()` and `group_join()` get the same results as `asq`:
+
+- `STRATEGY_HASH`: build a dict from the inner items, then probe it by the outer items;
+- `STRATEGY_HASH_OUTER`: build a dict from the outer items, then stream the inner items,
+  for a small outer side and a large inner side;
+- `STRATEGY_MERGE`: merge two sides which already ordered by the keys, both sides are streamed;
+- `STRATEGY_INDEX`: lookup the index of the inner items for each outer item;
+- `STRATEGY_GRACE_HASH`: like `STRATEGY_HASH`, but if the inner items are larger than a budget,
+  partition both sides into the temp files by the keys and join each partition alone.
+'''
+
+from asq.queryables import Grouping
+
+from .spill import STATE_INDEX, SpillStats, get_state_weight, iter_partitioned
+
+STRATEGY_HASH = 'hash'
+STRATEGY_HASH_OUTER = 'hash-outer'
+STRATEGY_MERGE = 'merge'
+STRATEGY_INDEX = 'index'
+STRATEGY_GRACE_HASH = 'grace-hash'
+
+
+def hash_join(outer, inner, outer_key_selector, inner_key_selector):
+    lookup = {}
+    for item in inner:
+        lookup.setdefault(inner_key_selector(item), []).append(item)
+    for item in outer:
+        key = outer_key_selector(item)
+        yield item, key, lookup.get(key, [])
+
+def hash_outer_join(outer, inner, outer_key_selector, inner_key_selector):
+    outer = list(outer)
+    keys = [outer_key_selector(x) for x in outer]
+    positions = {}
+    for position, key in enumerate(keys):
+        positions.setdefault(key, []).append(position)
+    matches = [[] for _ in outer]
+    for item in inner:
+        for position in positions.get(inner_key_selector(item), ()):
+            matches[position].append(item)
+    return zip(outer, keys, matches)
+
+def _reduce_join(records):
+    lookup = {}
+    for index, key, item in records:
+        if index == STATE_INDEX:
+            lookup.setdefault(key, []).append(item)
+        else:
+            yield index, item, key, lookup.get(key, [])
+
+def grace_hash_join(outer, inner, outer_key_selector, inner_key_selector, budget: int, stats: SpillStats):
+    lookup = {}
+    size = 0
+    inner = iter(inner)
+    for item in inner:
+        lookup.setdefault(inner_key_selector(item), []).append(item)
+        size += 1
+        if size > budget:
+            break
+    else:
+        for item in outer:
+            key = outer_key_selector(item)
+            yield item, key, lookup.get(key, [])
+        return
+
+    def iter_records():
+        # the inner items are written before the outer items, so each partition build the lookup first.
+        for key, items in lookup.items():
+            for item in items:
+                yield STATE_INDEX, key, item
+        lookup.clear()
+        for item in inner:
+            yield STATE_INDEX, inner_key_selector(item), item
+        for index, item in enumerate(outer):
+            yield index, outer_key_selector(item), item
+
+    for _, item, key, inners in iter_partitioned(iter_records(), _reduce_join, budget, stats, get_state_weight):
+        yield item, key, inners
+
+def merge_join(outer, inner, outer_key_selector, inner_key_selector):
+    _end = object()
+    inner = iter(inner)
+    def next_inner():
+        item = next(inner, _end)
+        return item, (None if item is _end else inner_key_selector(item))
+    inner_item, inner_key = next_inner()
+    run_key, run = _end, []
+    for item in outer:
+        key = outer_key_selector(item)
+        if run_key is _end or run_key != key:
+            run_key, run = key, []
+            while inner_item is not _end and inner_key < key:
+                inner_item, inner_key = next_inner()
+            while inner_item is not _end and inner_key == key:
+                run.append(inner_item)
+                inner_item, inner_key = next_inner()
+        yield item, key, run
+
+def index_join(outer, inner_items: list, index, outer_key_selector, inner_key_selector):
+    for item in outer:
+        key = outer_key_selector(item)
+        positions = index.lookup([key])
+        if positions is None:
+            # the index cannot be used, like a unhashable key.
+            yield item, key, [x for x in inner_items if inner_key_selector(x) == key]
+        else:
+            yield item, key, [inner_items[i] for i in positions]
+
+
+def iter_join_results(matches, result_selector):
+    for outer, _, inners in matches:
+        for inner in inners:
+            yield result_selector(outer, inner)
+
+def iter_group_join_results(matches, result_selector):
+    for outer, key, inners in matches:
+        yield result_selector(outer, Grouping(key, inners))
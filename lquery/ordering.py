@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# the rewrites for the ordered in-memory queries.
+# ----------
+
+'''
+the queries which only need a few items of a `order_by()` do not need to sort all items:
+
+- `order_by(key).take(n)` keep the `n` smallest items by a bounded heap like `heapq.nsmallest()`,
+  which is O(items * log(n)) time and O(n) memory;
+- `order_by(key).first()`, `last()` and the `*_or_default()` are a O(items) scan.
+
+the keys of `then_by()` are also supported,
+the `where()` and `select()` between them are applied before taking the items,
+and the results are same as the stable sort of `asq`.
+'''
+
+import heapq
+import operator
+from typing import Optional
+
+from asq.selectors import identity
+
+from .expr import CallExpr, ValueExpr
+from .queryable import AbstractQueryable
+from .funcs import LinqQuery
+from .extras._common import bind_call_args
+from .sorting import make_key_func
+
+_ORDER_FUNCS = {
+    LinqQuery.order_by: False,
+    LinqQuery.order_by_descending: True,
+}
+
+_THEN_FUNCS = {
+    LinqQuery.then_by: False,
+    LinqQuery.then_by_descending: True,
+}
+
+_STEP_FUNCS = (LinqQuery.where, LinqQuery.select)
+
+
+def _where(items, predicate):
+    return (kv for kv in items if predicate(kv[1]))
+
+def _select(items, selector):
+    return ((kv[0], selector(kv[1])) for kv in items)
+
+
+class OrderedChain:
+    '''
+    a `order_by()` or `order_by_descending()` with some `then_by()`,
+    which followed by some `where()` and `select()`.
+    '''
+    def __init__(self, ordered_query, source, keys: tuple, steps: list):
+        self._ordered_query = ordered_query
+        self._source = source
+        self._keys = keys
+        self._steps = steps
+
+    @property
+    def ordered_query(self):
+        '''
+        the query of the last `order_by()` or `then_by()`.
+        '''
+        return self._ordered_query
+
+    def add_step(self, func, arg):
+        return OrderedChain(self._ordered_query, self._source, self._keys, self._steps + [(func, arg)])
+
+    def _iter_decorated(self, key_func):
+        '''
+        iterate `(key, item)` by the order of the source.
+        '''
+        items = ((key_func(x), x) for x in self._source)
+        for func, arg in self._steps:
+            items = (_where if func is LinqQuery.where else _select)(items, arg)
+        return items
+
+    def take(self, count: int) -> list:
+        key_func, reverse = make_key_func(self._keys)
+        select = heapq.nlargest if reverse else heapq.nsmallest
+        return [item for _, item in select(count, self._iter_decorated(key_func), key=operator.itemgetter(0))]
+
+    def find(self, last: bool):
+        '''
+        return `(True, item)` for the first (or last) item of the sorted items,
+        or `(False, None)` if there is no items.
+        '''
+        key_func, reverse = make_key_func(self._keys)
+        compare = operator.gt if reverse else operator.lt
+        found, best_key, best = False, None, None
+        for key, item in self._iter_decorated(key_func):
+            if not found or compare(key, best_key) != last:
+                found, best_key, best = True, key, item
+        return found, best
+
+
+def get_ordered_chain(queryable) -> Optional[OrderedChain]:
+    '''
+    get the `OrderedChain` if the `queryable` is a `order_by()` (and some `then_by()`) which followed by
+    some `where()` and `select()`, otherwise return `None`.
+    '''
+    steps = []
+    keys = []
+    ordered_query = None
+    while isinstance(queryable, AbstractQueryable) and isinstance(queryable.expr, CallExpr):
+        expr = queryable.expr
+        func = expr.func.resolve_value()
+        if func in _ORDER_FUNCS or func in _THEN_FUNCS:
+            if len(expr.args) > 2 or expr.kwargs:
+                return None
+            key_selector = expr.args[1].value if len(expr.args) == 2 else identity
+            if not callable(key_selector):
+                return None
+            keys.append((key_selector, _ORDER_FUNCS.get(func, _THEN_FUNCS.get(func))))
+            ordered_query = ordered_query or queryable
+            if func in _ORDER_FUNCS:
+                steps.reverse()
+                keys.reverse()
+                return OrderedChain(ordered_query, expr.args[0].value, tuple(keys), steps)
+            queryable = expr.args[0].value
+            continue
+        if ordered_query is None and func in _STEP_FUNCS and len(expr.args) == 2 and not expr.kwargs:
+            if not isinstance(expr.args[1], ValueExpr) or not callable(expr.args[1].value):
+                return None
+            steps.append((func, expr.args[1].value))
+            queryable = expr.args[0].value
+            continue
+        return None
+    return None
+
+
+_FIND_FUNCS = {
+    # func: last
+    LinqQuery.first: False,
+    LinqQuery.first_or_default: False,
+    LinqQuery.last: True,
+    LinqQuery.last_or_default: True,
+}
+
+def get_top_query_args(expr: CallExpr):
+    '''
+    get `(chain, count)` if the `expr` is a `take(count)` of a `OrderedChain`, otherwise return `None`.
+    '''
+    if expr.func.resolve_value() is not LinqQuery.take:
+        return None
+    chain = get_ordered_chain(expr.args[0].value)
+    if chain is None:
+        return None
+    try:
+        count = bind_call_args(expr).arguments.get('count_', 1)
+    except TypeError:
+        return None
+    if type(count) is not int: # pylint: disable=C0123
+        return None
+    return chain, count
+
+def try_find(expr: CallExpr, *, skip_types: tuple = ()):
+    '''
+    execute `first()`, `last()` and the `*_or_default()` of a `OrderedChain` by a scan,
+    unless the query of `order_by()` is a instance of `skip_types`.
+
+    return `(True, result)`, or `(False, None)` if the `expr` is not one of them.
+    '''
+    if not isinstance(expr, CallExpr):
+        return False, None
+    func = expr.func.resolve_value()
+    if func not in _FIND_FUNCS:
+        return False, None
+    chain = get_ordered_chain(expr.args[0].value)
+    if chain is None or isinstance(chain.ordered_query, skip_types):
+        return False, None
+    try:
+        arguments = bind_call_args(expr).arguments
+    except TypeError:
+        return False, None
+    predicate = arguments.get('predicate')
+    if predicate is not None:
+        if not callable(predicate):
+            return False, None
+        chain = chain.add_step(LinqQuery.where, predicate)
+    found, item = chain.find(_FIND_FUNCS[func])
+    if not found:
+        # let `asq` return the default or raise the error.
+        kwargs = dict((k, v) for k, v in arguments.items() if k != 'self')
+        return True, func([], **kwargs)
+    return True, item
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# execute the queries by a process pool.
+# ----------
+
+'''
+`as_parallel()` execute the continuous `where()` and `select()` after it by a process pool:
+
+- the source is split into the chunks in the main process, and the chunks are sent to the workers;
+- the funcs are pickled, the funcs which cannot be pickled like the lambdas are decompiled as `FuncExpr`
+  and emitted again in the workers. if a func cannot be sent, the query is executed in the main process;
+- if `ordered` is `True`, the chunks are yielded in the order of the source,
+  otherwise the chunks are yielded once they are done;
+- `sum()`, `count()`, `min()` and `max()` are computed for each chunk by the workers,
+  then the results of the chunks are combined tree-wise.
+  the sums of the floats may be different in the last digits from the sequential `sum()`.
+
+at most `2 * workers` chunks are sent but not yielded, so the memory is bounded.
+'''
+
+import io
+import os
+import pickle
+import importlib
+import collections
+from collections.abc import Sized
+from types import ModuleType
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from asq.selectors import identity
+
+from .expr import CallExpr
+from .expr.builder import to_func_expr
+from .expr.ast_emitter import emit
+from .funcs import LinqQuery
+from .extras._common import bind_call_args
+from .iterable import NextIterableQuery, ChunkedIterableQueryProvider, _split_chunks
+
+_STAGE_KINDS = {
+    LinqQuery.where: 'where',
+    LinqQuery.select: 'select',
+}
+
+_REDUCE_FUNCS = {
+    LinqQuery.count: 'count',
+    LinqQuery.sum: 'sum',
+    LinqQuery.min: 'min',
+    LinqQuery.max: 'max',
+}
+
+
+class _Pickler(pickle.Pickler):
+    # the decompiled funcs may reference the modules, like `lambda x: math.sqrt(x)`.
+    def persistent_id(self, obj):
+        if isinstance(obj, ModuleType):
+            return ('module', obj.__name__)
+        return None
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        _, name = pid
+        return importlib.import_module(name)
+
+def _dumps(obj) -> bytes:
+    buffer = io.BytesIO()
+    _Pickler(buffer, pickle.HIGHEST_PROTOCOL).dump(obj)
+    return buffer.getvalue()
+
+def _is_picklable(func) -> bool:
+    try:
+        _dumps(func)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+def dump_stages(stages: list):
+    '''
+    pickle the `[(func, arg), ...]` of the `where()` and `select()` for the workers,
+    return `None` if any func cannot be sent.
+    '''
+    items = []
+    for func, arg in stages:
+        if _is_picklable(arg):
+            items.append((_STAGE_KINDS[func], False, arg))
+            continue
+        func_expr = to_func_expr(arg)
+        if func_expr is None or emit(func_expr) is None:
+            return None
+        items.append((_STAGE_KINDS[func], True, func_expr))
+    try:
+        return _dumps(items)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        # like a closure which reference a lock
+        return None
+
+
+# the stages which loaded in the worker, by the payload.
+_LOADED_STAGES = {}
+_MAX_LOADED_STAGES = 16
+
+def _load_stages(payload: bytes):
+    stages = _LOADED_STAGES.get(payload)
+    if stages is None:
+        stages = []
+        for kind, is_expr, func in _Unpickler(io.BytesIO(payload)).load():
+            stages.append((kind, emit(func) if is_expr else func))
+        if len(_LOADED_STAGES) >= _MAX_LOADED_STAGES:
+            _LOADED_STAGES.clear()
+        _LOADED_STAGES[payload] = stages
+    return stages
+
+def run_chunk(payload: bytes, chunk: list, reduce: str = None):
+    '''
+    apply the stages on the `chunk` in the worker,
+    return the chunk, or the result of the `reduce` (`'count'`, `'sum'`, `'min'` or `'max'`).
+
+    the results of `'min'` and `'max'` are `(has_value, value)`.
+    '''
+    for kind, func in _load_stages(payload):
+        chunk = list(filter(func, chunk)) if kind == 'where' else list(map(func, chunk))
+    if reduce is None:
+        return chunk
+    if reduce == 'count':
+        return len(chunk)
+    if reduce == 'sum':
+        return sum(chunk)
+    if not chunk:
+        return False, None
+    return True, (min(chunk) if reduce == 'min' else max(chunk))
+
+
+def _combine_min(left, right):
+    return right if right < left else left
+
+def _combine_max(left, right):
+    return right if right > left else left
+
+_COMBINE_FUNCS = {
+    'count': lambda left, right: left + right,
+    'sum': lambda left, right: left + right,
+    'min': _combine_min,
+    'max': _combine_max,
+}
+
+def combine_tree(parts: list, combine):
+    '''
+    combine the adjacent `parts` by pairs until one is left.
+    '''
+    while len(parts) > 1:
+        parts = [combine(*parts[i:i + 2]) if i + 1 < len(parts) else parts[i] for i in range(0, len(parts), 2)]
+    return parts[0]
+
+
+class ParallelQueryProvider(ChunkedIterableQueryProvider):
+    '''
+    execute the continuous `where()` and `select()` by a process pool of `workers` processes,
+    see `lquery.parallel`.
+
+    if `workers` is `None`, the count of the CPUs is used.
+    '''
+    def __init__(self, workers: int = None, *, ordered: bool = True, chunk_size: int = 1000,
+                 sort_budget: int = None, spill_budget: int = None):
+        super().__init__(chunk_size, sort_budget=sort_budget, spill_budget=spill_budget)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError('workers must be positive')
+        self._workers = workers
+        self._ordered = ordered
+
+    @property
+    def workers(self):
+        return self._workers
+
+    @property
+    def ordered(self):
+        return self._ordered
+
+    def _map_chunks(self, payload: bytes, chunks, reduce: str = None, ordered: bool = True):
+        pending = collections.deque()
+        def pop_results():
+            if ordered:
+                return [pending.popleft().result()]
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+            return [future.result() for future in done]
+        with ProcessPoolExecutor(self._workers) as pool:
+            try:
+                for chunk in chunks:
+                    pending.append(pool.submit(run_chunk, payload, chunk, reduce))
+                    if len(pending) >= self._workers * 2:
+                        yield from pop_results()
+                while pending:
+                    yield from pop_results()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _iter_stage_chunks(self, source, stages):
+        payload = dump_stages(stages) if stages else None
+        if payload is None:
+            yield from super()._iter_stage_chunks(source, stages)
+            return
+        for chunk in self._map_chunks(payload, _split_chunks(source, self._chunk_size), ordered=self._ordered):
+            if chunk:
+                yield chunk
+
+    def _try_reduce(self, expr: CallExpr):
+        '''
+        compute `sum()`, `count()`, `min()` or `max()` by the workers, return `(executed, result)`.
+        '''
+        reduce = _REDUCE_FUNCS.get(expr.func.resolve_value())
+        if reduce is None:
+            return False, None
+        try:
+            bound_args = bind_call_args(expr)
+        except TypeError:
+            return False, None
+        bound_args.apply_defaults()
+        queryable, arg = bound_args.args
+        if not isinstance(queryable, NextIterableQuery) or queryable.provider is not self:
+            return False, None
+        if arg is not None and not callable(arg):
+            # let `asq` raise the error.
+            return False, None
+        source, stages = self._get_stages(queryable.expr)
+        if reduce == 'count':
+            if arg is not None:
+                stages.append((LinqQuery.where, arg))
+        elif arg is not identity:
+            stages.append((LinqQuery.select, arg))
+        if not stages:
+            # nothing to compute by the workers, send the items costs more than reduce them.
+            if reduce == 'count' and isinstance(source, Sized):
+                return True, len(source)
+            return False, None
+        payload = dump_stages(stages)
+        if payload is None:
+            return False, None
+        parts = list(self._map_chunks(payload, _split_chunks(source, self._chunk_size), reduce))
+        if reduce in ('min', 'max'):
+            parts = [value for has_value, value in parts if has_value]
+            if not parts:
+                # let `asq` raise the error.
+                return True, expr.func.resolve_value()([])
+        elif not parts:
+            return True, 0
+        return True, combine_tree(parts, _COMBINE_FUNCS[reduce])
+
+    def execute(self, expr):
+        if isinstance(expr, CallExpr):
+            executed, result = self._try_reduce(expr)
+            if executed:
+                return result
+        return super().execute(expr)
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# the mergeable sketches for the approximate aggregates.
+# ----------
+
+'''
+- `HyperLogLog` estimate the count of the distinct values, for `count_distinct()`;
+- `KLLSketch` estimate the quantiles of the values, for `quantile()`.
+
+both sketches keep a small state which not grows with the count of the values,
+and can be merged, so the sketches of the partitions (or the processes) can be combined
+into the sketch of all values.
+
+the values are hashed by a stable hash, so the sketches which built in the other processes can be merged,
+unless the values are not the `None`, numbers, `str`, `bytes` or the tuples of them,
+which are hashed by `hash()`.
+'''
+
+import math
+import numbers
+import random
+import struct
+from hashlib import blake2b
+from operator import itemgetter
+
+
+def _normalize_number(value):
+    '''
+    get the int or the float which equals the number `value`, or the `value` itself.
+    '''
+    if isinstance(value, complex) and not value.imag:
+        value = value.real
+    for convert in (int, float):
+        try:
+            number = convert(value)
+        except (TypeError, ValueError, OverflowError):
+            continue
+        if number == value:
+            return number
+    return value
+
+def _encode(value) -> bytes:
+    # the equal numbers should have the same encoding, like `1 == 1.0 == True`.
+    if isinstance(value, str):
+        return b's' + value.encode('utf-8', 'surrogatepass')
+    if isinstance(value, bytes):
+        return b'b' + value
+    if isinstance(value, numbers.Number) and not isinstance(value, (int, float)):
+        # like `Decimal(1)` or `Fraction(1, 2)`, which equals a int or a float.
+        value = _normalize_number(value)
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, int):
+        return b'i' + str(int(value)).encode()
+    if isinstance(value, float):
+        return b'f' + struct.pack('<d', value)
+    if value is None:
+        return b'n'
+    if isinstance(value, tuple):
+        parts = [_encode(x) for x in value]
+        return b't' + b''.join(len(x).to_bytes(4, 'little') + x for x in parts)
+    return b'h' + hash(value).to_bytes(8, 'little', signed=True)
+
+def hash64(value) -> int:
+    '''
+    get a 64 bits hash of the `value`, which is same in all processes for the builtin values.
+
+    raise `TypeError` if the `value` is unhashable, like `distinct()`.
+    '''
+    hash(value)
+    return int.from_bytes(blake2b(_encode(value), digest_size=8).digest(), 'little')
+
+
+class HyperLogLog:
+    '''
+    estimate the count of the distinct values by the HyperLogLog algorithm.
+
+    the state is `2 ** precision` bytes, the standard error is about `1.04 / sqrt(2 ** precision)`,
+    about 0.81% for the default precision.
+    the small counts are estimated by the linear counting, which is almost exact.
+    '''
+    def __init__(self, precision: int = 14):
+        if not 4 <= precision <= 18:
+            raise ValueError('precision must be in [4, 18]')
+        self._precision = precision
+        self._registers = bytearray(1 << precision)
+
+    @property
+    def precision(self):
+        return self._precision
+
+    def add(self, value):
+        x = hash64(value)
+        bits = 64 - self._precision
+        index = x >> bits
+        rank = bits - (x & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'HyperLogLog'):
+        '''
+        merge the `other` sketch into this sketch, return this sketch.
+        '''
+        if other.precision != self._precision:
+            raise ValueError('cannot merge the sketches with different precisions')
+        self._registers = bytearray(map(max, self._registers, other._registers))
+        return self
+
+    def estimate(self) -> float:
+        m = len(self._registers)
+        alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self._registers)
+        zeros = self._registers.count(0)
+        if zeros and estimate <= 2.5 * m:
+            # linear counting
+            estimate = m * math.log(m / zeros)
+        return estimate
+
+    def __len__(self):
+        return round(self.estimate())
+
+
+class KLLSketch:
+    '''
+    estimate the quantiles of the values by the KLL sketch.
+
+    the values are kept in the compactors, each compactor sort its values when it is full,
+    then promote one of two values to the next compactor, which the weight is double.
+    the state is about `3 * k` values, the rank error is about `1.7 / k`,
+    the quantiles are exact if the count of the values is less than `k`.
+
+    the values must be comparable with each other.
+    the `seed` make the compactions repeatable.
+    '''
+    def __init__(self, k: int = 200, *, seed=0):
+        if k < 8:
+            raise ValueError('k must be at least 8')
+        self._k = k
+        self._random = random.Random(seed)
+        self._compactors = [[]]
+        self._count = 0
+        self._size = 0
+        self._max_size = self._get_max_size()
+
+    @property
+    def count(self):
+        '''
+        the count of the values which added into the sketch.
+        '''
+        return self._count
+
+    def _get_capacity(self, level: int) -> int:
+        depth = len(self._compactors) - level - 1
+        return max(2, math.ceil(self._k * (2 / 3) ** depth))
+
+    def _get_max_size(self) -> int:
+        return sum(self._get_capacity(h) for h in range(len(self._compactors)))
+
+    def _compress(self):
+        while self._size >= self._max_size:
+            for level, items in enumerate(self._compactors):
+                if len(items) >= self._get_capacity(level):
+                    break
+            if level + 1 == len(self._compactors):
+                self._compactors.append([])
+                self._max_size = self._get_max_size()
+            items.sort()
+            # the odd value is kept in the level, so the total weight is not changed.
+            kept = [items.pop()] if len(items) % 2 else []
+            promoted = items[self._random.getrandbits(1)::2]
+            self._compactors[level + 1].extend(promoted)
+            self._compactors[level] = kept
+            self._size -= len(items) - len(promoted)
+
+    def add(self, value):
+        self._compactors[0].append(value)
+        self._count += 1
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'KLLSketch'):
+        '''
+        merge the `other` sketch into this sketch, return this sketch.
+        '''
+        while len(self._compactors) < len(other._compactors):
+            self._compactors.append([])
+        for level, items in enumerate(other._compactors):
+            self._compactors[level].extend(items)
+        self._count += other._count
+        self._size += other._size
+        self._max_size = self._get_max_size()
+        self._compress()
+        return self
+
+    def quantile(self, q: float):
+        '''
+        get the value which the rank is `ceil(q * count)` (at least 1) in the sorted values,
+        so `quantile(0)` is the min value and `quantile(1)` is the max value.
+        '''
+        if not 0 <= q <= 1:
+            raise ValueError('q must be in [0, 1]')
+        if not self._count:
+            raise ValueError('the sketch is empty')
+        items = sorted(((v, 1 << h) for h, c in enumerate(self._compactors) for v in c), key=itemgetter(0))
+        rank = max(1, math.ceil(q * self._count))
+        weight = 0
+        for value, w in items:
+            weight += w
+            if weight >= rank:
+                return value
+        return items[-1][0]
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# sort the items by one or more keys.
+# ----------
+
+'''
+`order_by()`, `then_by()` and the `*_descending()` build a `SortedItems`,
+which sort the items once by a composite key when iterate:
+
+- if all keys are ascending (or all descending), the key is the tuple of the keys;
+- otherwise the numbers of the descending keys are negated,
+  and the other values of the descending keys are compared in the reversed order.
+
+the sort is stable like `asq`, the items which have the same keys are kept in the original order.
+
+`iter_external_sorted()` sort the items which are larger than the memory,
+see `IterableQuery(..., sort_budget=?)`.
+'''
+
+import heapq
+import itertools
+from collections.abc import Iterable
+from operator import itemgetter
+
+from asq.selectors import identity
+
+from .spill import SpillStats, SpillFile, get_batch_size
+
+
+class _Reversed:
+    '''
+    a value which compared in the reversed order.
+    '''
+    __slots__ = ('value', )
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    __hash__ = None
+
+
+def _is_numbers(values: list):
+    # `bool` is excluded since `-True` is not a `bool`.
+    return all(type(x) in (int, float) for x in values) # pylint: disable=C0123
+
+def make_key_func(keys: tuple):
+    '''
+    get a func which return the composite key of a item, and whether it should sort in the reversed order.
+
+    the `keys` are `((key_selector, descending), ...)`.
+    '''
+    if len(keys) == 1:
+        return keys[0][0], keys[0][1]
+    selectors = [s for s, _ in keys]
+    if len(set(d for _, d in keys)) == 1:
+        return (lambda x: tuple(s(x) for s in selectors)), keys[0][1]
+    def key_func(item):
+        return tuple((_Reversed(s(item)) if d else s(item)) for s, d in keys)
+    return key_func, False
+
+
+def sort_items(items, keys: tuple) -> list:
+    '''
+    sort the `items` by the `keys` (`((key_selector, descending), ...)`), return a new list.
+    '''
+    items = list(items)
+    if len(set(d for _, d in keys)) == 1:
+        key_func, reverse = make_key_func(keys)
+        # `sorted()` is stable even if reverse.
+        return sorted(items, key=key_func, reverse=reverse)
+    columns = []
+    for selector, descending in keys:
+        column = [selector(x) for x in items]
+        if descending:
+            if _is_numbers(column):
+                column = [-x for x in column]
+            else:
+                column = [_Reversed(x) for x in column]
+        columns.append(column)
+    composite_keys = list(zip(*columns))
+    positions = sorted(range(len(items)), key=composite_keys.__getitem__)
+    return [items[i] for i in positions]
+
+
+def _ensure_callable(func_name: str, key_selector):
+    if not callable(key_selector):
+        raise TypeError(f'{func_name}() parameter key_selector={key_selector!r} is not callable')
+
+
+class SortedItems(Iterable):
+    '''
+    the items which sorted by some keys, the items are sorted on each iteration.
+    '''
+    def __init__(self, items, keys: tuple):
+        self._items = items
+        self._keys = keys
+
+    @property
+    def items(self):
+        return self._items
+
+    @property
+    def keys(self):
+        '''
+        the keys of the sort, `((key_selector, descending), ...)`.
+        '''
+        return self._keys
+
+    @staticmethod
+    def order_by(items, key_selector=identity, descending: bool = False):
+        _ensure_callable('order_by_descending' if descending else 'order_by', key_selector)
+        return SortedItems(items, ((key_selector, descending), ))
+
+    def then_by(self, key_selector=identity, descending: bool = False):
+        '''
+        return a new `SortedItems` which sort the items which have the same keys by the `key_selector`.
+        '''
+        _ensure_callable('then_by_descending' if descending else 'then_by', key_selector)
+        return SortedItems(self._items, self._keys + ((key_selector, descending), ))
+
+    def __iter__(self):
+        # sort on the first `next()`, `asq` test the sources by `iter()`.
+        yield from sort_items(self._items, self._keys)
+
+
+# the max count of the run files which are opened by a merge.
+_MAX_MERGE_RUNS = 128
+
+def iter_external_sorted(items, keys: tuple, budget: int, stats: SpillStats = None):
+    '''
+    sort the `items` by the `keys` (`((key_selector, descending), ...)`),
+    which keep at most `budget` items in memory.
+
+    the items are sorted by runs of `budget` items, the runs are pickled into the temp files,
+    then merged lazily, so only the results which are iterated are merged.
+    the temp files are removed when the results are exhausted or closed.
+
+    the spilled data are counted by the `stats`.
+    '''
+    if budget < 1:
+        raise ValueError('budget must be positive')
+    key_func, reverse = make_key_func(keys)
+    get_key = itemgetter(0)
+    # a merge load a batch from each run, which should be in the budget too.
+    batch_size = get_batch_size(budget, _MAX_MERGE_RUNS)
+    def spill(pairs):
+        file = SpillFile(batch_size, stats)
+        try:
+            file.extend(pairs)
+        except BaseException:
+            file.close()
+            raise
+        return file
+    files = []
+    try:
+        items = iter(items)
+        while True:
+            run = [(key_func(x), x) for x in itertools.islice(items, budget)]
+            if not files and len(run) < budget:
+                # all items are in memory.
+                run.sort(key=get_key, reverse=reverse)
+                for _, item in run:
+                    yield item
+                return
+            if not run:
+                break
+            run.sort(key=get_key, reverse=reverse)
+            if not files and stats is not None:
+                stats.spills += 1
+            files.append(spill(run))
+            del run
+        # `heapq.merge()` is stable, the items of the earlier runs are yielded first,
+        # so the runs are merged by the groups of the adjacent runs.
+        while len(files) > _MAX_MERGE_RUNS:
+            merged_files = []
+            for start in range(0, len(files), _MAX_MERGE_RUNS):
+                group = files[start:start + _MAX_MERGE_RUNS]
+                merged_files.append(spill(heapq.merge(*group, key=get_key, reverse=reverse)))
+                for file in group:
+                    file.close()
+            files = merged_files
+        for _, item in heapq.merge(*files, key=get_key, reverse=reverse):
+            yield item
+    finally:
+        for file in files:
+            file.close()
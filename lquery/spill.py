@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# spill the states of the in-memory operators to the temp files.
+# ----------
+
+'''
+`group_by()`, `distinct()`, `union()`, `intersect()`, `difference()` and the hash joins
+keep the keys in a dict or a set. under a budget (see `IterableQuery(..., spill_budget=?)`),
+they start in memory, and once the state is larger than the budget:
+
+1. the state and the rest of the items are written as `(index, key, payload)` records
+   into the temp files (the partitions) by the hash of the key;
+2. each partition is reduced alone, the partitions which are still larger than the budget
+   are partitioned again by another hash;
+3. the results of the partitions are merged by the index, so the order is same as in memory.
+
+the counters of the data which spilled are kept in a `SpillStats`.
+
+the items, the keys and the payloads must be picklable once they are spilled,
+otherwise a `TypeError` is raised. the results which read from the temp files are the copies
+of the items, not the items themselves.
+'''
+
+import heapq
+import itertools
+import pickle
+import tempfile
+from operator import itemgetter
+
+# the max count of the records of each `pickle.dump()` call.
+_MAX_BATCH_SIZE = 1000
+# the count of the partitions of each pass.
+_PARTITIONS = 16
+# the max count of the passes, the partitions of the last pass are reduced even if they are large.
+_MAX_PASSES = 2
+
+# the index of the records which are the state, like the keys of the second items of `intersect()`.
+STATE_INDEX = -1
+
+
+def get_state_weight(record) -> int:
+    '''
+    the weight of the `(index, key, payload)` records which only the state is kept in memory when reduce.
+    '''
+    return 1 if record[0] == STATE_INDEX else 0
+
+
+class SpillStats:
+    '''
+    the counters of the data which spilled to the temp files.
+    '''
+    def __init__(self):
+        self.spills = 0
+        self.files = 0
+        self.records = 0
+        self.bytes = 0
+
+    def reset(self):
+        self.__init__()
+
+    def __repr__(self):
+        return f'SpillStats(spills={self.spills}, files={self.files}, records={self.records}, bytes={self.bytes})'
+
+
+class SpillFile:
+    '''
+    a temp file of the pickled records, which written by batches and read once.
+    '''
+    def __init__(self, batch_size: int, stats: SpillStats = None):
+        self._file = tempfile.TemporaryFile()
+        self._batch_size = batch_size
+        self._stats = stats
+        self._batch = []
+        # the sum of the weights of the records
+        self.size = 0
+        # the count of the records, the records may weigh 0
+        self.count = 0
+        if stats is not None:
+            stats.files += 1
+
+    def _flush(self):
+        if self._batch:
+            try:
+                pickle.dump(self._batch, self._file, pickle.HIGHEST_PROTOCOL)
+            except (pickle.PicklingError, TypeError, AttributeError) as error:
+                raise TypeError(f'the spilled items must be picklable: {error}') from error
+            if self._stats is not None:
+                self._stats.records += len(self._batch)
+            self._batch = []
+
+    def write(self, record, weight: int = 1):
+        self._batch.append(record)
+        self.size += weight
+        self.count += 1
+        if len(self._batch) >= self._batch_size:
+            self._flush()
+
+    def extend(self, records):
+        for record in records:
+            self.write(record)
+
+    def __iter__(self):
+        self._flush()
+        if self._stats is not None:
+            self._stats.bytes += self._file.tell()
+        self._file.seek(0)
+        while True:
+            try:
+                batch = pickle.load(self._file)
+            except EOFError:
+                return
+            yield from batch
+
+    def close(self):
+        self._file.close()
+
+
+def get_batch_size(budget: int, files: int) -> int:
+    '''
+    get the batch size which keep the batches of the `files` in the `budget`.
+    '''
+    return max(1, min(_MAX_BATCH_SIZE, budget // files))
+
+
+class _Partitioner:
+    def __init__(self, reduce, get_weight, budget: int, stats: SpillStats):
+        self._reduce = reduce
+        self._get_weight = get_weight
+        self._budget = budget
+        self._stats = stats
+        self._batch_size = get_batch_size(budget, _PARTITIONS ** _MAX_PASSES)
+
+    def _partition(self, records, salt: int):
+        files = []
+        try:
+            for _ in range(_PARTITIONS):
+                files.append(SpillFile(self._batch_size, self._stats))
+            for record in records:
+                files[hash((salt, record[1])) % _PARTITIONS].write(record, self._get_weight(record))
+        except BaseException:
+            for file in files:
+                file.close()
+            raise
+        return files
+
+    def run(self, records, outputs: list, salt: int = 0):
+        '''
+        partition the `records`, append the reduced results of each partition into `outputs`.
+        '''
+        files = self._partition(records, salt)
+        try:
+            for file in files:
+                if file.size > self._budget and salt + 1 < _MAX_PASSES:
+                    self.run(file, outputs, salt + 1)
+                elif file.count:
+                    output = SpillFile(self._batch_size, self._stats)
+                    outputs.append(output)
+                    output.extend(self._reduce(file))
+                file.close()
+        finally:
+            for file in files:
+                file.close()
+
+
+def iter_partitioned(records, reduce, budget: int, stats: SpillStats, get_weight=lambda _: 1):
+    '''
+    partition the `(index, key, payload)` records by the keys, and `reduce()` each partition,
+    which yield `(index, ...)` by the index.
+
+    yield the results of all partitions by the index.
+    '''
+    stats.spills += 1
+    outputs = []
+    try:
+        _Partitioner(reduce, get_weight, budget, stats).run(records, outputs)
+        yield from heapq.merge(*outputs, key=itemgetter(0))
+    finally:
+        for output in outputs:
+            output.close()
+
+
+# group_by()
+
+def _reduce_groups(records):
+    groups = {}
+    for index, key, elements in records:
+        group = groups.get(key)
+        if group is None:
+            groups[key] = (index, key, elements)
+        else:
+            group[2].extend(elements)
+    # the first index of the keys are ascending.
+    return groups.values()
+
+def iter_groups(items, key_selector, element_selector, budget: int, stats: SpillStats):
+    '''
+    yield `(key, elements)` by the order of the first item of the keys, like `asq.Lookup`.
+    '''
+    groups = {}
+    size = 0
+    items = iter(items)
+    index = -1
+    for index, item in zip(itertools.count(), items):
+        key = key_selector(item)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = (index, key, [element_selector(item)])
+        else:
+            group[2].append(element_selector(item))
+        size += 1
+        if size > budget:
+            break
+    else:
+        for _, key, elements in groups.values():
+            yield key, elements
+        return
+
+    def iter_records():
+        yield from groups.values()
+        groups.clear()
+        for i, item in zip(itertools.count(index + 1), items):
+            yield i, key_selector(item), [element_selector(item)]
+
+    get_weight = lambda record: len(record[2])
+    for _, key, elements in iter_partitioned(iter_records(), _reduce_groups, budget, stats, get_weight):
+        yield key, elements
+
+
+# distinct(), union(), intersect() and difference()
+
+def _reduce_distinct(records):
+    seen = set()
+    for index, key, item in records:
+        if index == STATE_INDEX:
+            seen.add(key)
+        elif key not in seen:
+            seen.add(key)
+            yield index, item
+
+def _reduce_intersect(records):
+    second_keys = set()
+    for index, key, item in records:
+        if index == STATE_INDEX:
+            second_keys.add(key)
+        elif key in second_keys:
+            second_keys.remove(key)
+            yield index, item
+
+def iter_key_set_op(items, selector, second, budget: int, stats: SpillStats, *, intersect: bool = False):
+    '''
+    if `intersect` is `True`, yield the first item of each key which also in the `second` items,
+    like `asq.Queryable.intersect()`;
+    otherwise yield the first item of each key which not in the `second` items,
+    like `asq.Queryable.difference()`, or `distinct()` if the `second` is empty.
+    '''
+    if intersect:
+        reduce, get_weight = _reduce_intersect, get_state_weight
+    else:
+        reduce, get_weight = _reduce_distinct, lambda _: 1
+    keys = set()
+    second = iter(second)
+    for item in second:
+        keys.add(selector(item))
+        if len(keys) > budget:
+            def iter_records():
+                for key in keys:
+                    yield STATE_INDEX, key, None
+                keys.clear()
+                for item in second:
+                    yield STATE_INDEX, selector(item), None
+                for index, item in enumerate(items):
+                    yield index, selector(item), item
+            for _, item in iter_partitioned(iter_records(), reduce, budget, stats, get_weight):
+                yield item
+            return
+
+    items = iter(items)
+    for index, item in zip(itertools.count(), items):
+        key = selector(item)
+        if intersect:
+            if key in keys:
+                keys.remove(key)
+                yield item
+        elif key not in keys:
+            keys.add(key)
+            yield item
+            if len(keys) > budget:
+                def iter_records():
+                    for key in keys:
+                        yield STATE_INDEX, key, None
+                    keys.clear()
+                    for i, item in zip(itertools.count(index + 1), items):
+                        yield i, selector(item), item
+                for _, item in iter_partitioned(iter_records(), reduce, budget, stats, get_weight):
+                    yield item
+                return
+
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# the builder must build the same exprs on all python versions.
+# ----------
+
+import itertools
+
+import pytest
+
+from lquery.expr import Make
+from lquery.expr.builder import to_func_expr
+
+GLOBAL_LIST = [1, 3, 5]
+
+def _make_cases():
+    local_value = 2
+    return [
+        (lambda x: x,
+         "FuncExpr(ParameterExpr('x'), (ParameterExpr('x'),))"),
+        (lambda x: 1,
+         "FuncExpr(ConstExpr(1), (ParameterExpr('x'),))"),
+        (lambda x: x['a'],
+         "FuncExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), (ParameterExpr('x'),))"),
+        (lambda x: x.a.b,
+         "FuncExpr(AttrExpr(AttrExpr(ParameterExpr('x'), 'a'), 'b'), (ParameterExpr('x'),))"),
+        (lambda x: not x['a'],
+         "FuncExpr(UnaryExpr('not', IndexExpr(ParameterExpr('x'), ConstExpr('a'))), (ParameterExpr('x'),))"),
+        (lambda x: -x['a'],
+         "FuncExpr(UnaryExpr('-', IndexExpr(ParameterExpr('x'), ConstExpr('a'))), (ParameterExpr('x'),))"),
+        (lambda x: +x['a'],
+         "FuncExpr(UnaryExpr('+', IndexExpr(ParameterExpr('x'), ConstExpr('a'))), (ParameterExpr('x'),))"),
+        (lambda x: ~x['a'],
+         "FuncExpr(UnaryExpr('~', IndexExpr(ParameterExpr('x'), ConstExpr('a'))), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] + 1,
+         "FuncExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), '+', ConstExpr(1)), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] ** 2,
+         "FuncExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), '**', ConstExpr(2)), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] >= 1,
+         "FuncExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), '>=', ConstExpr(1)), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] in GLOBAL_LIST,
+         "FuncExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), 'in', ReferenceExpr([1, 3, 5])), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] not in (1, 2),
+         "FuncExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), 'not in', ConstExpr((1, 2))), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] is None,
+         "FuncExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), 'is', ConstExpr(None)), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] is not None,
+         "FuncExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), 'is not', ConstExpr(None)), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] == local_value,
+         "FuncExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), '==', DerefExpr(2)), (ParameterExpr('x'),))"),
+        (lambda x: len(x['l']),
+         "FuncExpr(CallExpr(ReferenceExpr(<built-in function len>), IndexExpr(ParameterExpr('x'), ConstExpr('l'))), (ParameterExpr('x'),))"),
+        (lambda x: max(x['a'], x['b']),
+         "FuncExpr(CallExpr(ReferenceExpr(<built-in function max>), IndexExpr(ParameterExpr('x'), ConstExpr('a')), IndexExpr(ParameterExpr('x'), ConstExpr('b'))), (ParameterExpr('x'),))"),
+        (lambda x: sorted(x['l'], reverse=True),
+         "FuncExpr(CallExpr(ReferenceExpr(<built-in function sorted>), IndexExpr(ParameterExpr('x'), ConstExpr('l')), reverse=ConstExpr(True)), (ParameterExpr('x'),))"),
+        (lambda x: dict(a=x['a']),
+         "FuncExpr(CallExpr(ReferenceExpr(<class 'dict'>), a=IndexExpr(ParameterExpr('x'), ConstExpr('a'))), (ParameterExpr('x'),))"),
+        (lambda x: x['s'].startswith('a'),
+         "FuncExpr(CallExpr(AttrExpr(IndexExpr(ParameterExpr('x'), ConstExpr('s')), 'startswith'), ConstExpr('a')), (ParameterExpr('x'),))"),
+        (lambda x: x['d'].get('k', None),
+         "FuncExpr(CallExpr(AttrExpr(IndexExpr(ParameterExpr('x'), ConstExpr('d')), 'get'), ConstExpr('k'), ConstExpr(None)), (ParameterExpr('x'),))"),
+        (lambda x: x.f(1, k=2),
+         "FuncExpr(CallExpr(AttrExpr(ParameterExpr('x'), 'f'), ConstExpr(1), k=ConstExpr(2)), (ParameterExpr('x'),))"),
+        (lambda x, y: x + y,
+         "FuncExpr(BinaryExpr(ParameterExpr('x'), '+', ParameterExpr('y')), (ParameterExpr('x'), ParameterExpr('y')))"),
+        (lambda x, y: y.get(x),
+         "FuncExpr(CallExpr(AttrExpr(ParameterExpr('y'), 'get'), ParameterExpr('x')), (ParameterExpr('x'), ParameterExpr('y')))"),
+        (lambda x: [],
+         "FuncExpr(BuildListExpr(), (ParameterExpr('x'),))"),
+        (lambda x: [1, 2, 3],
+         "FuncExpr(BuildListExpr(ConstExpr(1), ConstExpr(2), ConstExpr(3)), (ParameterExpr('x'),))"),
+        (lambda x: [x['a'], 1],
+         "FuncExpr(BuildListExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), ConstExpr(1)), (ParameterExpr('x'),))"),
+        (lambda x: {'a': x['a'], 'b': 1},
+         "FuncExpr(BuildDictExpr((ConstExpr('a'), IndexExpr(ParameterExpr('x'), ConstExpr('a'))), (ConstExpr('b'), ConstExpr(1))), (ParameterExpr('x'),))"),
+        (lambda x: {x['s']: x['a']},
+         "FuncExpr(BuildDictExpr((IndexExpr(ParameterExpr('x'), ConstExpr('s')), IndexExpr(ParameterExpr('x'), ConstExpr('a')))), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] > 0 and x['b'] > 1,
+         "FuncExpr(BinaryExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), '>', ConstExpr(0)), 'and', BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('b')), '>', ConstExpr(1))), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] or x['b'],
+         "FuncExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), 'or', IndexExpr(ParameterExpr('x'), ConstExpr('b'))), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] and x['b'] and x['c'],
+         "FuncExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), 'and', BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('b')), 'and', IndexExpr(ParameterExpr('x'), ConstExpr('c')))), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] or x['b'] or x['c'],
+         "FuncExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), 'or', BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('b')), 'or', IndexExpr(ParameterExpr('x'), ConstExpr('c')))), (ParameterExpr('x'),))"),
+        (lambda x: x['a'] and (x['b'] or x['c']),
+         "FuncExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), 'and', BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('b')), 'or', IndexExpr(ParameterExpr('x'), ConstExpr('c')))), (ParameterExpr('x'),))"),
+        (lambda x: (x['a'] == 1) & (x['b'] == 2),
+         "FuncExpr(BinaryExpr(BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('a')), '==', ConstExpr(1)), '&', BinaryExpr(IndexExpr(ParameterExpr('x'), ConstExpr('b')), '==', ConstExpr(2))), (ParameterExpr('x'),))"),
+        (lambda x: 'k' in x['d'] and x['d']['k'] == 1,
+         "FuncExpr(BinaryExpr(BinaryExpr(ConstExpr('k'), 'in', IndexExpr(ParameterExpr('x'), ConstExpr('d'))), 'and', BinaryExpr(IndexExpr(IndexExpr(ParameterExpr('x'), ConstExpr('d')), ConstExpr('k')), '==', ConstExpr(1))), (ParameterExpr('x'),))"),
+    ]
+
+CASES = _make_cases()
+
+@pytest.mark.parametrize('func, expected', CASES)
+def test_build(func, expected):
+    assert repr(to_func_expr(func)) == expected
+
+OPERANDS = ["x['a']", 'x.b', '3', "len(x['l'])", "x['d'].get('k', 0)", "(x['a'] + 1)"]
+OPS = ['+', '-', '*', '/', '//', '%', '**', '&', '|', '^',
+       '<', '<=', '==', '!=', '>', '>=', 'in', 'not in', 'is', 'is not']
+
+def _build_body(source):
+    return to_func_expr(eval(f'lambda x: {source}')).body # pylint: disable=W0123
+
+@pytest.mark.parametrize('left, op, right', [
+    (l, op, r) for l, op, r in itertools.product(OPERANDS, OPS, OPERANDS)
+    if l != r and not (op.startswith('is') and '3' in (l, r))
+])
+def test_build_binary_op(left, op, right):
+    func_expr = to_func_expr(eval(f'lambda x: {left} {op} {right}')) # pylint: disable=W0123
+    expected = Make.binary_op(_build_body(left), op, _build_body(right))
+    assert repr(func_expr.body) == repr(expected)
+
+@pytest.mark.parametrize('func', [
+    lambda x: 1 if x else 2,
+    lambda x: [y for y in x],
+    lambda x: undefined_name, # pylint: disable=E0602
+])
+def test_build_not_supported(func):
+    assert to_func_expr(func) is None
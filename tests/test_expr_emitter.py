@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# round-trip tests: build -> emit -> compare results
+# ----------
+
+import sys
+import itertools
+
+import pytest
+
+from lquery.expr.builder import to_func_expr
+from lquery.expr import emitter, ast_emitter
+
+EMITTERS = [emitter.emit, ast_emitter.emit]
+
+ROWS = [
+    {'a': 1, 'b': 2, 's': 'abc', 'l': [1, 2], 'd': {'k': 1}},
+    {'a': -3, 'b': 7, 's': '', 'l': [], 'd': {'k': 0}},
+    {'a': 0, 'b': 1, 's': 'x', 'l': [3], 'd': {'k': 'v'}},
+    {'a': 5, 'b': 5, 's': 'bcd', 'l': [1], 'd': {}},
+]
+
+class Box:
+    def __init__(self, value):
+        self.value = value
+
+    def twice(self):
+        return self.value * 2
+
+GLOBAL_LIST = [1, 3, 5]
+GLOBAL_BOX = Box(4)
+
+def _make_corpus():
+    local_value = 2
+    local_box = Box(3)
+    corpus = [
+        lambda x: x['a'],
+        lambda x: not x['a'],
+        lambda x: -x['a'],
+        lambda x: ~x['a'],
+        lambda x: x['a'] in GLOBAL_LIST,
+        lambda x: x['a'] not in GLOBAL_LIST,
+        lambda x: x['a'] is None,
+        lambda x: x['a'] is not None,
+        lambda x: x['a'] == local_value,
+        lambda x: x['a'] < local_box.value,
+        lambda x: x['a'] + GLOBAL_BOX.value,
+        lambda x: GLOBAL_BOX.twice() > x['b'],
+        lambda x: len(x['l']),
+        lambda x: len(x['s']) > 1 and x['a'] > 0,
+        lambda x: max(x['a'], x['b']),
+        lambda x: sorted(x['l'], reverse=True),
+        lambda x: dict(a=x['a'], b=x['b']),
+        lambda x: x['s'].upper(),
+        lambda x: x['s'].startswith('a'),
+        lambda x: x['d'].get('k', None),
+        lambda x: [x['a'], x['b'], 1],
+        lambda x: [],
+        lambda x: {'a': x['a'], 'b': 1},
+        lambda x: {x['s']: x['a']},
+        lambda x: x['a'] > 0 and x['b'] > 1 or x['s'] == 'x',
+        lambda x: (x['a'] > 0 or x['b'] > 5) and not x['s'],
+        lambda x: x['a'] and (x['b'] and x['s']),
+        lambda x: x['a'] or (x['b'] or x['s']),
+        lambda x: (x['a'] == 1) & (x['b'] == 2),
+        lambda x: (x['a'] == 1) | (x['b'] == 2),
+        lambda x: 'k' in x['d'] and x['d']['k'] == 1,
+        # repeated paths:
+        lambda x: 'k' in x['d'] and x['d']['k'] == 1 and x['d']['k'] != x['a'],
+        lambda x: (x['a'] > 0 and x['d']) or x['d'],
+        lambda x: x['a'] > 0 or x['d']['k'] == 1 or x['d']['k'] == 0,
+        lambda x: (x['a'] and x['d']['k']) == x['d']['k'],
+        lambda x: [x['a'], x['a'] + x['b'], x['b']],
+        lambda x: {'a': x['d']['k'], x['d']['k']: 1},
+        lambda x: {x['a']: x['d'], x['d']['k']: x['a']},
+        # chained comparisons:
+        lambda x: 0 <= x['a'] < 5,
+        lambda x: x['a'] < x['b'] <= local_value < 9,
+        lambda x: 0 < x['a'] < 5 or x['b'] == 7,
+        lambda x: x['b'] > 1 and -1 <= x['a'] < x['b'],
+        # tuples and nested lambdas:
+        lambda x: (x['a'], x['b']),
+        lambda x: (x['a'], local_value) == (1, 2),
+        lambda x: sorted(x['l'], key=lambda v: -v),
+        lambda x: max(x['l'], default=0, key=lambda v: GLOBAL_BOX.value - v),
+    ]
+    # combinations of operators
+    operands = ["x['a']", "x['b']", '3', 'local_value', "len(x['l'])", "x['d'].get('k', 0)"]
+    ops = ['+', '-', '*', '/', '//', '%', '**', '&', '|', '^', '<', '<=', '==', '!=', '>', '>=']
+    namespace = dict(globals(), local_value=local_value)
+    for left, op, right in itertools.product(operands, ops, operands):
+        if left == right or 'x' not in left + right:
+            continue
+        corpus.append(eval(f'lambda x: {left} {op} {right}', namespace))
+    return corpus
+
+CORPUS = _make_corpus()
+
+def _call(func, row):
+    try:
+        return 'value', func(row)
+    except Exception as err: # pylint: disable=W0703
+        return 'error', type(err)
+
+def test_corpus_is_large():
+    assert len(CORPUS) > 300
+
+@pytest.mark.parametrize('emit', EMITTERS)
+@pytest.mark.parametrize('func', CORPUS)
+def test_round_trip(func, emit):
+    func_expr = to_func_expr(func)
+    if func_expr is None:
+        pytest.skip('not supported by the builder')
+    compiled_func = emit(func_expr)
+    assert compiled_func is not None, repr(func_expr)
+    for row in ROWS:
+        assert _call(compiled_func, row) == _call(func, row)
+
+@pytest.mark.parametrize('emit', EMITTERS)
+def test_closure_is_lazy_load(emit):
+    value = 1
+    compiled_func = emit(to_func_expr(lambda x: x == value))
+    assert compiled_func(1)
+    value = 2
+    assert compiled_func(2)
+
+def test_ast_emitter_bind_refs_as_defaults():
+    items = [1, 2]
+    compiled_func = ast_emitter.emit(to_func_expr(lambda x: x in items))
+    assert compiled_func.__kwdefaults__ is not None
+    assert compiled_func(1) and not compiled_func(3)
+
+class LookupCounterDict(dict):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lookups = []
+
+    def __getitem__(self, key):
+        self.lookups.append(key)
+        return super().__getitem__(key)
+
+@pytest.mark.parametrize('emit', EMITTERS)
+def test_repeated_paths_are_evaluated_once(emit):
+    if emit is ast_emitter.emit and sys.version_info < (3, 8):
+        pytest.skip('require the assignment expression')
+    # the expr from `_TinyDb2ExprVisitor.rewrite_add_cond_has_key()`:
+    compiled_func = emit(to_func_expr(
+        lambda x: 'a' in x and 'b' in x['a'] and x['a']['b'] == 1 and x['a']['c'] > x['a']['b']
+    ))
+    row = LookupCounterDict(a={'b': 1, 'c': 2})
+    assert compiled_func(row) is True
+    assert row.lookups == ['a']
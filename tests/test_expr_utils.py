@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+#
+# ----------
+
+import datetime
+
+from lquery.expr import ConstExpr, DerefExpr, ExprFlags
+from lquery.expr.builder import to_func_expr
+from lquery.expr.utils import (
+    require_argument, read_closure, is_pure, is_parameter_path,
+    iter_parameter_paths, get_repeated_paths,
+    fold_const_exprs, has_foldable_exprs, ConstFoldingExprVisitor
+)
+
+ITEMS = [1, 2, 3]
+
+def _fold(func, **kwargs):
+    return fold_const_exprs(to_func_expr(func), **kwargs).body
+
+def test_require_argument_in_build_list():
+    assert require_argument(to_func_expr(lambda x: [1, x]).body)
+    assert require_argument(to_func_expr(lambda x: {'k': x}).body)
+    assert not require_argument(to_func_expr(lambda x: [1, ITEMS]).body)
+
+def test_flags():
+    value = 1
+    body = to_func_expr(lambda x: x['a'] > value and len(x['b']) == 2).body
+    assert body.flags == ExprFlags.REQUIRE_ARGUMENT | ExprFlags.READ_CLOSURE | ExprFlags.CALL
+    assert read_closure(body.left) and not read_closure(body.right)
+    assert is_pure(body.left) and not is_pure(body.right)
+    assert not require_argument(body.left.right)
+
+def test_is_parameter_path():
+    body = to_func_expr(lambda x: [x.a['b'], x[x.a], x['a'].b.c, x, ITEMS[0]]).body
+    assert [is_parameter_path(e) for e in body.items] == [True, False, True, False, False]
+
+def test_iter_parameter_paths():
+    body = to_func_expr(lambda x: x['a']['b'] > len(ITEMS) and x[x.c] == 1).body
+    assert [str(e) for e in iter_parameter_paths(body)] == ["x['a']['b']", "x['a']", 'x.c']
+    assert get_repeated_paths(to_func_expr(lambda x: 'b' in x['a'] and x['a']['b'] == 1)) == \
+        {repr(to_func_expr(lambda x: x['a']).body)}
+
+def test_fold_call():
+    body = _fold(lambda x: x['a'] > len(ITEMS))
+    assert isinstance(body.right, ConstExpr)
+    assert body.right.value == 3
+
+def test_fold_binary_and_unary():
+    delta = datetime.timedelta(days=1)
+    body = _fold(lambda x: x > datetime.datetime(2000, 1, 2) - delta)
+    assert body.right.value == datetime.datetime(2000, 1, 1)
+    body = _fold(lambda x: x == -(1 + 2))
+    assert body.right.value == -3
+
+def test_fold_build_list_and_dict():
+    value = 1
+    assert _fold(lambda x: x == [value, 2]).right.value == [1, 2]
+    body = _fold(lambda x: {'a': value, 'b': x})
+    assert isinstance(body.kvps[0][1], ConstExpr)
+    assert body.kvps[1][1] is not None
+
+def test_fold_method_args():
+    body = _fold(lambda x: x.get(str(1), len(ITEMS)))
+    assert [a.value for a in body.args] == ['1', 3]
+
+def test_fold_getattr():
+    body = _fold(lambda x: getattr(x, 'a' + 'b'))
+    assert str(body) == 'x.ab'
+
+def test_fold_keep_error():
+    body = _fold(lambda x: x and 1 / 0)
+    assert not isinstance(body.right, ConstExpr)
+
+def test_fold_nothing():
+    func_expr = to_func_expr(lambda x: x['a'] > 1)
+    assert fold_const_exprs(func_expr) is func_expr
+
+def test_fold_snapshot_policy():
+    value = 1
+    assert _fold(lambda x: x == value).right.value == 1
+    body = _fold(lambda x: x == value + 1, snapshot_policy=ConstFoldingExprVisitor.LAZY_CLOSURE)
+    assert isinstance(body.right.left, DerefExpr)
+    body = _fold(lambda x: x == len(ITEMS), snapshot_policy=ConstFoldingExprVisitor.LAZY_CLOSURE)
+    assert not isinstance(body.right, ConstExpr)
+    assert _fold(lambda x: x == ITEMS[0] + 1, snapshot_policy=ConstFoldingExprVisitor.LAZY_CLOSURE).right.value == 2
+
+def test_has_foldable_exprs():
+    value = 1
+    assert has_foldable_exprs(to_func_expr(lambda x: x > len(ITEMS)))
+    assert not has_foldable_exprs(to_func_expr(lambda x: x > value))
+    assert has_foldable_exprs(to_func_expr(lambda x: x > value + 1))
+    assert not has_foldable_exprs(to_func_expr(lambda x: x > value + 1),
+                                  snapshot_policy=ConstFoldingExprVisitor.LAZY_CLOSURE)
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+#
+# ----------
+
+import sys
+
+import pytest
+
+from lquery.expr import Make, ConstExpr
+from lquery.expr.builder import to_func_expr
+from lquery.expr.visitor import (
+    ExprVisitor, DefaultExprVisitor, ExprsIterExprVisitor,
+    get_sub_exprs, iter_exprs
+)
+
+# deeper than the recursion limit
+DEPTH = sys.getrecursionlimit() * 2
+
+def make_or_chain(size):
+    x = Make.parameter('x')
+    body = None
+    for i in range(size):
+        clause = Make.binary_op(Make.index(x, Make.const('a')), '==', Make.const(i))
+        body = clause if body is None else Make.binary_op(body, 'or', clause)
+    return Make.func(body, x)
+
+
+class IncreaseConstExprVisitor(DefaultExprVisitor):
+    def visit_const_expr(self, expr):
+        if isinstance(expr.value, int):
+            return Make.const(expr.value + 1)
+        return expr
+
+
+class CountBinaryExprVisitor(ExprVisitor):
+    def visit(self, expr):
+        return 0
+
+    def visit_binary_expr(self, expr):
+        left = yield expr.left
+        right = yield expr.right
+        return left + right + 1
+
+
+class CatchErrorExprVisitor(ExprVisitor):
+    def visit_const_expr(self, expr):
+        raise ValueError(expr.value)
+
+    def visit_unary_expr(self, expr):
+        try:
+            yield expr.expr
+        except ValueError as error:
+            return 'catched', error.args[0]
+        return None
+
+    def visit_binary_expr(self, expr):
+        return (yield expr.left)
+
+
+def test_get_sub_exprs():
+    expr = to_func_expr(lambda x: max(x['a'], 1, key=abs)).body
+    assert [str(e) for e in get_sub_exprs(expr)] == [str(expr.func), "x['a']", '1', str(expr.kwargs['key'])]
+    assert get_sub_exprs(Make.const(1)) == ()
+
+def test_iter_exprs():
+    expr = to_func_expr(lambda x: x['a'] > 1 and [x, {'k': 2}]).body
+    assert [str(e) for e in iter_exprs(expr)] == [
+        str(expr), str(expr.left), "x['a']", 'x', "'a'", '1', str(expr.right), 'x',
+        str(expr.right.items[1]), "'k'", '2'
+    ]
+    assert list(expr.accept(ExprsIterExprVisitor())) == list(iter_exprs(expr))
+
+def test_run_returns_same_expr_if_nothing_changed():
+    func_expr = to_func_expr(lambda x: x['a'] > 1 and -x['b'] < 0)
+    assert DefaultExprVisitor().run(func_expr) is func_expr
+
+def test_run_rebuild():
+    func_expr = to_func_expr(lambda x: x['a'] > 1 and -x['b'] < 0)
+    assert str(IncreaseConstExprVisitor().run(func_expr)) == str(to_func_expr(lambda x: x['a'] > 2 and -x['b'] < 1))
+
+def test_run_with_plain_methods():
+    assert ExprVisitor().run(Make.const(1)).value == 1
+    assert CountBinaryExprVisitor().run(make_or_chain(5)) == 0 # func expr is not visited
+    assert CountBinaryExprVisitor().run(make_or_chain(5).body) == 9
+
+def test_run_throw_error_into_generator():
+    expr = Make.binary_op(Make.const(1), '+', Make.const(2))
+    with pytest.raises(ValueError):
+        CatchErrorExprVisitor().run(expr)
+    assert CatchErrorExprVisitor().run(Make.unary_op(expr, '-')) == ('catched', 1)
+
+def test_run_deep_tree():
+    func_expr = make_or_chain(DEPTH)
+    assert DefaultExprVisitor().run(func_expr) is func_expr
+    assert CountBinaryExprVisitor().run(func_expr.body) == DEPTH * 2 - 1
+    rebuilt = IncreaseConstExprVisitor().run(func_expr)
+    assert isinstance(rebuilt.body.right.right, ConstExpr)
+    assert rebuilt.body.right.right.value == DEPTH
+    assert sum(1 for _ in iter_exprs(func_expr)) == DEPTH * 6
+
+def test_build_long_chain():
+    # the jumps use `EXTENDED_ARG`
+    func = eval('lambda x: ' + ' or '.join(f'x == {i}' for i in range(100))) # pylint: disable=W0123
+    func_expr = to_func_expr(func)
+    assert func_expr is not None
+    assert CountBinaryExprVisitor().run(func_expr.body) == 199
@@ -8,7 +8,10 @@
 import pytest
 from pytest import raises
 
-from lquery.extras._common.predicate import Predicate, BinaryPredicate, PredicateConflictError
+from lquery.extras._common.predicate import (
+    Predicate, BinaryPredicate, PredicateConflictError,
+    merge_predicates
+)
 
 def unpack(predicate: Predicate):
     if isinstance(predicate, BinaryPredicate):
@@ -50,3 +53,65 @@ def test_binary_merge_conflict():
     assert merge(eq_3, Predicate.create_binary('>=', 3)) is eq_3
     assert merge(eq_3, Predicate.create_binary('>', 2)) is eq_3
     assert merge(eq_3, Predicate.create_binary('>=', 2)) is eq_3
+
+def test_binary_merge_eq_and_lt():
+    eq_3 = Predicate.create_binary('==', 3)
+
+    with raises(PredicateConflictError):
+        eq_3.merge(Predicate.create_binary('<', 3))
+
+    with raises(PredicateConflictError):
+        eq_3.merge(Predicate.create_binary('<=', 2))
+
+    assert merge(eq_3, Predicate.create_binary('<=', 3)) is eq_3
+    assert merge(eq_3, Predicate.create_binary('<', 4)) is eq_3
+
+def test_binary_check_conflict():
+    def check(lower, upper):
+        lower, upper = Predicate.create_binary(*lower), Predicate.create_binary(*upper)
+        lower.check_conflict(upper)
+        upper.check_conflict(lower)
+
+    check(('>', 1), ('<', 2))
+    check(('>=', 1), ('<=', 1))
+    for lower, upper in [(('>', 1), ('<', 1)), (('>=', 1), ('<', 1)), (('>', 2), ('<=', 1))]:
+        with raises(PredicateConflictError):
+            check(lower, upper)
+
+def test_merge_predicates():
+    predicates = [Predicate.create_binary(op, v) for op, v in [('>', 1), ('<', 5), ('>', 3), ('<=', 4)]]
+    assert [unpack(x) for x in merge_predicates(predicates)] == [('>', 3), ('<=', 4)]
+
+    predicates = [Predicate.create_binary(op, v) for op, v in [('>', 1), ('<', 5), ('==', 3)]]
+    assert [unpack(x) for x in merge_predicates(predicates)] == [('==', 3)]
+
+    with raises(PredicateConflictError):
+        merge_predicates([Predicate.create_binary('>', 5), Predicate.create_binary('<', 5)])
+
+def test_binary_merge_sets():
+    in_123 = Predicate.create_binary('in', [1, 2, 3])
+
+    assert unpack(merge(in_123, Predicate.create_binary('in', [2, 3, 4]))) == ('in', [2, 3])
+    assert unpack(merge(in_123, Predicate.create_binary('>', 2))) == ('==', 3)
+    assert unpack(merge(in_123, Predicate.create_binary('!=', 2))) == ('in', [1, 3])
+    assert unpack(merge(in_123, Predicate.create_binary('not in', [1, 2]))) == ('==', 3)
+    assert unpack(merge(Predicate.create_binary('!=', 1), Predicate.create_binary('!=', 2))) == ('not in', [1, 2])
+
+    with raises(PredicateConflictError):
+        in_123.merge(Predicate.create_binary('==', 4))
+
+    with raises(PredicateConflictError):
+        in_123.merge(Predicate.create_binary('not in', [1, 2, 3]))
+
+def test_merge_predicates_by_interval_set():
+    def merge_all(*ops):
+        return [unpack(x) for x in merge_predicates([Predicate.create_binary(*x) for x in ops])]
+
+    assert merge_all(('>=', 1), ('<=', 9), ('!=', 3), ('not in', [4, 20])) == [
+        ('>=', 1), ('<=', 9), ('not in', [3, 4])
+    ]
+    assert merge_all(('>', 1), ('<=', 2), ('in', [0, 2, 3])) == [('==', 2)]
+    assert merge_all(('>', 1), ('!=', 'a')) == [('>', 1), ('!=', 'a')]
+
+    with raises(TypeError):
+        merge_all(('>', 1), ('<', 'a'))
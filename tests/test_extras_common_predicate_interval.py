@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+#
+# ----------
+
+import itertools
+
+import pytest
+
+from lquery.extras._common.predicate.interval import IntervalSet
+
+OPS = ['==', '!=', '>', '>=', '<', '<=', 'in', 'not in']
+VALUES = [1, 2, 3]
+SAMPLES = [x / 2 for x in range(-2, 10)]
+
+def match(op, value, sample):
+    return {
+        '==': lambda: sample == value,
+        '!=': lambda: sample != value,
+        '>': lambda: sample > value,
+        '>=': lambda: sample >= value,
+        '<': lambda: sample < value,
+        '<=': lambda: sample <= value,
+        'in': lambda: sample in value,
+        'not in': lambda: sample not in value,
+    }[op]()
+
+def contains(values: IntervalSet, sample):
+    for interval in values.intervals:
+        lower, upper = interval.lower, interval.upper
+        if lower[0] is not None and not match('>=' if lower[1] else '>', lower[0], sample):
+            continue
+        if upper[0] is not None and not match('<=' if upper[1] else '<', upper[0], sample):
+            continue
+        return True
+    return False
+
+def operands():
+    for op in OPS:
+        if op in ('in', 'not in'):
+            for size in range(len(VALUES) + 1):
+                for value in itertools.combinations(VALUES, size):
+                    yield op, list(value)
+        else:
+            for value in VALUES:
+                yield op, value
+
+OPERANDS = list(operands())
+
+def test_repr():
+    assert repr(IntervalSet.from_op('>', 1)) == 'IntervalSet((1, +inf))'
+    assert repr(IntervalSet.from_op('!=', 1)) == 'IntervalSet((-inf, 1) (1, +inf))'
+    assert repr(IntervalSet.from_op('in', [2, 1, 2])) == 'IntervalSet([1, 1] [2, 2])'
+    assert repr(IntervalSet.from_op('in', [])) == 'IntervalSet()'
+
+def test_from_op():
+    for op, value in OPERANDS:
+        values = IntervalSet.from_op(op, value)
+        for sample in SAMPLES:
+            assert contains(values, sample) == match(op, value, sample)
+
+@pytest.mark.parametrize('first', OPERANDS)
+def test_algebra(first):
+    first_values = IntervalSet.from_op(*first)
+    assert first_values.complement().complement() == first_values
+    for second in OPERANDS:
+        second_values = IntervalSet.from_op(*second)
+        intersection = first_values.intersection(second_values)
+        union = first_values.union(second_values)
+        assert intersection == second_values.intersection(first_values)
+        for sample in SAMPLES:
+            first_match, second_match = match(*first, sample), match(*second, sample)
+            assert contains(intersection, sample) == (first_match and second_match)
+            assert contains(union, sample) == (first_match or second_match)
+        if intersection.is_empty:
+            continue
+        # the ops must match the same values:
+        ops = intersection.to_ops()
+        assert ops is not None
+        for sample in SAMPLES:
+            assert all(match(op, value, sample) for op, value in ops) == contains(intersection, sample)
+
+def test_to_ops():
+    assert IntervalSet.all().to_ops() == []
+    assert IntervalSet.from_op('in', [1]).to_ops() == [('==', 1)]
+    assert IntervalSet.from_op('not in', [1, 2]).to_ops() == [('not in', [1, 2])]
+    assert IntervalSet.from_op('>', 1).union(IntervalSet.from_op('<', 0)).to_ops() is None
+    between = IntervalSet.from_op('>=', 1).intersection(IntervalSet.from_op('<', 5))
+    assert between.to_ops() == [('>=', 1), ('<', 5)]
+    assert between.intersection(IntervalSet.from_op('not in', [0, 2, 3])).to_ops() == [
+        ('>=', 1), ('<', 5), ('not in', [2, 3])
+    ]
+
+def test_not_ordered_values():
+    with pytest.raises(TypeError):
+        IntervalSet.from_op('>', float('nan'))
+    with pytest.raises(TypeError):
+        IntervalSet.from_op('==', None)
+    with pytest.raises(TypeError):
+        IntervalSet.from_op('in', [1, 'a'])
+    with pytest.raises(TypeError):
+        IntervalSet.from_op('>', 1).intersection(IntervalSet.from_op('<', 'a'))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+#
+# ----------
+
+import pytest
+
+from lquery.expr.builder import to_func_expr
+from lquery.iterable import IterableQuery
+from lquery.extras._common.predicate.normalizer import (
+    PredicateNormalizer, TooManyClausesError,
+    get_conflict_reason
+)
+
+def clauses_str(clauses):
+    return [sorted(str(term) for term in clause) for clause in clauses]
+
+def test_to_dnf():
+    normalizer = PredicateNormalizer(to_func_expr(lambda x: ((x > 1) | (x < -1)) & (x != 5)))
+    assert clauses_str(normalizer.to_dnf()) == [
+        ['x != 5', 'x > 1'],
+        ['x != 5', 'x < -1'],
+    ]
+
+def test_to_cnf():
+    normalizer = PredicateNormalizer(to_func_expr(lambda x: ((x > 1) & (x < 3)) | (x == 5)))
+    assert clauses_str(normalizer.to_cnf()) == [
+        ['x == 5', 'x > 1'],
+        ['x < 3', 'x == 5'],
+    ]
+
+def test_not_is_pushed_down():
+    normalizer = PredicateNormalizer(to_func_expr(lambda x: not (x['a'] == 1 or x['b'])))
+    assert clauses_str(normalizer.to_dnf()) == [
+        ["not (x['a'] == 1)", "not (x['b'])"],
+    ]
+
+def test_const_on_left():
+    normalizer = PredicateNormalizer(to_func_expr(lambda x: 1 < x['a']))
+    assert clauses_str(normalizer.to_dnf()) == [["x['a'] > 1"]]
+
+def test_too_many_clauses():
+    func = lambda x: ((x == 1) | (x == 2)) & ((x == 3) | (x == 4)) & ((x == 5) | (x == 6))
+    assert get_conflict_reason(func) is not None
+    normalizer = PredicateNormalizer(to_func_expr(func), max_clauses=4)
+    with pytest.raises(TooManyClausesError):
+        normalizer.to_dnf()
+
+@pytest.mark.parametrize('func', [
+    lambda x: x > 5 and x < 3,
+    lambda x: x == 1 and x == 2,
+    lambda x: x['a'] >= 3 and x['b'] and x['a'] < 3,
+    lambda x: (x['a'] > 3) & (x['a'] < 3),
+    lambda x: ((x > 5) | (x == 1)) & (x < 1),
+    lambda x: not (x['b'] or not x['a'] > 1) and x['a'] < 1,
+    lambda x: 5 < x and x < 3,
+    lambda x: x in (1, 2) and x in (3, 4),
+    lambda x: x in (1, 2) and x != 1 and x != 2,
+    lambda x: x['a'] not in (1, 2) and x['a'] == 2,
+])
+def test_conflict(func):
+    assert get_conflict_reason(func)
+
+@pytest.mark.parametrize('func', [
+    lambda x: x > 3 and x < 5,
+    lambda x: x >= 3 and x <= 3,
+    lambda x: x['a'] > 5 and x['b'] < 3,
+    lambda x: ((x > 5) | (x == 1)) & (x < 3),
+    lambda x: not (x > 5 and x < 3),
+    # the negated compares are unknown, `not (x <= 5)` is true for `nan`:
+    lambda x: not (x <= 5 or x >= 3),
+    lambda x: x > 5 and x < 'a',
+    lambda x: x > 5 and x.startswith('a'),
+    lambda x, y: x > 5 and x < 3,
+    lambda x: x > 5 and len(x) < 3,
+    lambda x: x in (1, 2) and x in (2, 3),
+    lambda x: x in 'abc' and x == 'd',
+    lambda x: 1 in x and x == 2,
+])
+def test_no_conflict(func):
+    assert get_conflict_reason(func) is None
+
+def test_iterable_query_always_empty():
+    query = IterableQuery(range(10)).where(lambda x: x > 5 and x < 3).select(lambda x: x * 2)
+    assert query.to_list() == []
+    assert query.get_reduce_info().mode == query.get_reduce_info().MODE_EMPTY
+
+    query = IterableQuery(range(10)).where(lambda x: x > 5 and x < 8)
+    assert query.to_list() == [6, 7]
+    assert query.get_reduce_info().mode != query.get_reduce_info().MODE_EMPTY
+
+def test_iterable_query_calls_not_evaluated_when_build():
+    it = iter([1, 2, 3, 4])
+    query = IterableQuery([2, 3, 4]).where(lambda x: x >= next(it))
+    assert next(it) == 1
+    assert query.to_list() == [2, 3, 4]
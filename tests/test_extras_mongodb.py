@@ -24,6 +24,7 @@ class FakeCollection:
         self.projection = None
         self.skip = None
         self.limit = None
+        self.sort = None
         self.call_counter = 0
 
     def find(self, filter=None, projection=None, skip=0, limit=0, sort=None):
@@ -32,6 +33,7 @@ class FakeCollection:
         self.projection = projection
         self.skip = skip
         self.limit = limit
+        self.sort = sort
         return self._items[:]
 
 
@@ -197,6 +199,13 @@ class TestMongoDbWhereFields(unittest.TestCase):
         mongo_query.where(lambda x: x['status'] < 17 and x['status'] > 15).to_list()
         self.assertDictEqual(fc.filter, {'status': {'$gt': 15, '$lt': 17}})
 
+    def test_query_select_documents_by_ge_and_le(self):
+        fc = FakeCollection()
+        mongo_query = QUERY_CLS(fc)
+        query = mongo_query.where(lambda x: x['status'] >= 15).where(lambda x: x['status'] > 15)
+        query.where(lambda x: x['status'] <= 17).to_list()
+        self.assertDictEqual(fc.filter, {'status': {'$gt': 15, '$lte': 17}})
+
     def test_query_select_documents_by_gt_and_lt_always_empty(self):
         fc = FakeCollection()
         mongo_query = QUERY_CLS(fc)
@@ -253,6 +262,22 @@ class TestMongoDbWhereFieldIn(unittest.TestCase):
         # x['status'] in ['A', 'B', 'C'] mean:
         self.assertDictEqual(fc.filter, {'status': {'$in': ['A', 'B']}})
 
+    def test_query_select_documents_by_in_and_in(self):
+        fc = FakeCollection()
+        mongo_query = QUERY_CLS(fc)
+        query = mongo_query.where(lambda x: x['status'] in ['A', 'B', 'C'])
+        query.where(lambda x: x['status'] in ['B', 'C', 'D']).where(lambda x: x['status'] != 'C').to_list()
+        self.assertDictEqual(fc.filter, {'status': {'$eq': 'B'}})
+
+    def test_query_select_documents_by_in_and_gt_always_empty(self):
+        fc = FakeCollection()
+        mongo_query = QUERY_CLS(fc)
+        query = mongo_query.where(lambda x: x['status'] in ['A', 'B']).where(lambda x: x['status'] > 'B')
+        query.to_list()
+        self.assertEqual(fc.filter, None)
+        reduce_info = query.get_reduce_info()
+        self.assertEqual(reduce_info.mode, reduce_info.MODE_EMPTY)
+
     def test_query_select_documents_by_in_reversed(self):
         '''
         match one element of `x['status']` equals `A`
@@ -413,3 +438,53 @@ def test_field_exists():
     query = source.where(lambda x: not hasattr(x.name, 'first') == True)
     assert query.query_options.filter == {'name.first': {'$exists': False}}
 
+
+def test_sort():
+    fc = FakeCollection()
+    source = QUERY_CLS(fc)
+
+    source.to_list()
+    assert fc.sort is None
+
+    source.order_by(lambda x: x['age']).to_list()
+    assert fc.sort == [('age', 1), ('_id', 1)]
+
+    source.order_by_descending(lambda x: x['size']['h']).then_by(lambda x: x.name).to_list()
+    assert fc.sort == [('size.h', -1), ('name', 1), ('_id', 1)]
+
+    # a stable sort of the sorted documents.
+    source.order_by(lambda x: x['a']).then_by_descending(lambda x: x['_id']).order_by(lambda x: x['b']).to_list()
+    assert fc.sort == [('b', 1), ('a', 1), ('_id', -1)]
+
+    # the `then_by()` after the latest `order_by()`
+    source.order_by(lambda x: x['a']).order_by(lambda x: x['b']).then_by(lambda x: x['d']).to_list()
+    assert fc.sort == [('b', 1), ('d', 1), ('a', 1), ('_id', 1)]
+    # each field occur once
+    source.order_by_descending(lambda x: x['a']).order_by(lambda x: x['a']).to_list()
+    assert fc.sort == [('a', 1), ('_id', 1)]
+    source.order_by(lambda x: x['a']).then_by(lambda x: x['b']).order_by(lambda x: x['b']) \
+        .then_by_descending(lambda x: x['a']).then_by(lambda x: x['c']).to_list()
+    assert fc.sort == [('b', 1), ('a', -1), ('c', 1), ('_id', 1)]
+
+    query = source.where(lambda x: x['a'] > 1).order_by(lambda x: x['b']).where(lambda x: x['c'] == 2).take(3)
+    assert query.query_options.filter == {'a': {'$gt': 1}, 'c': 2}
+    assert query.query_options.sort == [('b', 1)]
+    assert query.query_options.limit == 3
+
+
+def test_sort_not_support():
+    items = [{'a': 2, 'b': 1}, {'a': 1, 'b': 2}, {'a': 1, 'b': 1}]
+    fc = FakeCollection(items)
+    source = QUERY_CLS(fc)
+
+    # mongodb sort the documents before skip and limit.
+    source.take(2).order_by(lambda x: x['a']).to_list()
+    assert fc.limit == 2
+    assert fc.sort is None
+
+    assert source.order_by(lambda x: x['a'] + x['b']).to_list() == [items[2], items[0], items[1]]
+    assert fc.sort is None
+
+    # all keys are sorted in memory.
+    assert source.order_by(lambda x: x['a']).then_by(lambda x: -x['b']).to_list() == [items[1], items[2], items[0]]
+    assert fc.sort is None
@@ -13,3 +13,69 @@ def test_regex():
     query = QUERY_CLS(None)
     query = query.where(lambda x: re.search('x{10}', x.name))
     assert query.query_options.filter == {'name': {'$regex': 'x{10}'}}
+
+def test_regex_with_flags():
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: re.search('x{10}', x.name, re.I))
+    assert query.query_options.filter == {'name': {'$regex': 'x{10}', '$options': 'i'}}
+
+def test_regex_match_is_anchored():
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: re.match('abc', x.name))
+    assert query.query_options.filter == {'name': {'$regex': '^abc'}}
+
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: re.match('a|b', x.name))
+    assert query.query_options.filter == {'name': {'$regex': '^(?:a|b)'}}
+
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: re.match('^a|b', x.name))
+    assert query.query_options.filter == {'name': {'$regex': '^(?:^a|b)'}}
+
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: re.match('^ab', x.name))
+    assert query.query_options.filter == {'name': {'$regex': '^ab'}}
+
+def test_regex_compiled_pattern():
+    pattern = re.compile('abc', re.IGNORECASE)
+
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: pattern.match(x.name))
+    assert query.query_options.filter == {'name': {'$regex': '^abc', '$options': 'i'}}
+
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: re.search(pattern, x.name))
+    assert query.query_options.filter == {'name': {'$regex': 'abc', '$options': 'i'}}
+
+def test_startswith():
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: x.name.startswith('a.b'))
+    assert query.query_options.filter == {'name': {'$regex': '^a\\.b'}}
+
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: x['size']['uom'].startswith('c'))
+    assert query.query_options.filter == {'size.uom': {'$regex': '^c'}}
+
+def test_lower():
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: x.name.lower() == 'abc')
+    assert query.query_options.filter == {'name': {'$regex': '^abc\\z', '$options': 'i'}}
+
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: x.name.lower().startswith('ab'))
+    assert query.query_options.filter == {'name': {'$regex': '^ab', '$options': 'i'}}
+
+    # never match:
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: x.name.lower() == 'ABC')
+    assert query.get_reduce_info().mode == query.get_reduce_info().MODE_EMPTY
+
+def test_lower_with_collation():
+    query = QUERY_CLS(None, collation={'locale': 'en', 'strength': 2})
+    query = query.where(lambda x: x.name.lower() == 'abc')
+    assert query.query_options.filter == {'name': 'abc'}
+
+def test_regex_conflict_run_in_memory():
+    query = QUERY_CLS(None)
+    query = query.where(lambda x: x.name.startswith('a') and x.name.startswith('b'))
+    assert not hasattr(query, 'query_options')
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+# compare the results of the columnar query with python.
+# ----------
+
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+from lquery.extras.numpy import ColumnarQuery, Column, _compile, _Env
+
+RECORDS = [
+    {'a': 1, 'b': 2.5, 's': 'abc', 'f': True, 'big': 2 ** 60, 'm': 1},
+    {'a': -3, 'b': 0.0, 's': '', 'f': False, 'big': 1, 'm': 'x'},
+    {'a': 0, 'b': float('nan'), 's': 'x', 'f': True, 'big': 2, 'm': 2.5},
+    {'a': 5, 'b': -7.25, 's': 'bcd', 'f': False, 'big': 3, 'm': None},
+    {'a': 5, 'b': 1.0, 's': 'abc', 'f': True, 'big': 4, 'm': 1},
+]
+
+ITEMS = [1, 5]
+NAMES = ('abc', 'zzz')
+
+def _vectorized(func):
+    '''
+    check the lambda is compiled and can be executed without fallback.
+    '''
+    plan = _compile(func)
+    assert plan is not None
+    table = ColumnarQuery(RECORDS).table
+    plan(_Env(table, None, None))
+
+PREDICATES = [
+    lambda x: x['a'] > 1,
+    lambda x: 1 < x['a'],
+    lambda x: x['a'] == 5 and x['s'] == 'abc',
+    lambda x: x['a'] < 0 or x['b'] > 1,
+    lambda x: not x['f'],
+    lambda x: x['a'] in ITEMS,
+    lambda x: x['a'] not in [0, 1.0],
+    lambda x: x['s'] in NAMES,
+    lambda x: x['s'] >= 'abc' and x['s'] < 'bz',
+    lambda x: x['s'] <= 'b',
+    lambda x: 'b' > x['s'],
+    lambda x: x['s'],
+    lambda x: x['a'],
+    lambda x: x['b'],
+    lambda x: x['b'] == x['b'],
+    lambda x: (x['a'] > 0) & (x['b'] > 0),
+    lambda x: (x['a'] > 0) | x['f'],
+    lambda x: x['a'] * 2 + 1 > x['b'],
+    lambda x: x['a'] % 2 == 1,
+    lambda x: -x['a'] > 0,
+]
+
+SELECTORS = [
+    lambda x: x['a'],
+    lambda x: x['a'] + x['b'],
+    lambda x: x['a'] // 2,
+    lambda x: x['a'] / 2,
+    lambda x: x['a'] - 1.5,
+    lambda x: x['a'] > 0,
+    lambda x: x['f'] + x['f'],
+    lambda x: ~x['a'],
+    lambda x: x['a'] & 3,
+    lambda x: x['f'] ^ True,
+    lambda x: x['a'] and x['a'] + 1,
+    lambda x: x['a'] or -1,
+    lambda x: x['s'],
+    lambda x: 1,
+]
+
+FALLBACK_LAMBDAS = [
+    lambda x: x['big'] * 2,         # not a small int
+    lambda x: x['m'],               # mixed types
+    lambda x: 10 // (x['a'] + 3),   # division by zero
+    lambda x: x['a'] and x['b'],    # int or float
+    lambda x: x['s'] + '!',
+    lambda x: x['b'] in [float('nan')],
+    lambda x: [x['a']],
+]
+
+def _to_comparable(items):
+    return [('nan',) if isinstance(x, float) and x != x else (type(x), x) for x in items]
+
+@pytest.mark.parametrize('predicate', PREDICATES)
+def test_where(predicate):
+    _vectorized(predicate)
+    assert ColumnarQuery(RECORDS).where(predicate).to_list() == [r for r in RECORDS if predicate(r)]
+
+@pytest.mark.parametrize('selector', SELECTORS)
+def test_select(selector):
+    _vectorized(selector)
+    result = ColumnarQuery(RECORDS).select(selector).to_list()
+    assert _to_comparable(result) == _to_comparable([selector(r) for r in RECORDS])
+
+@pytest.mark.parametrize('func', FALLBACK_LAMBDAS)
+def test_fallback(func):
+    query = ColumnarQuery(RECORDS)
+    try:
+        expected = [func(r) for r in RECORDS]
+    except Exception as error: # pylint: disable=W0703
+        with pytest.raises(type(error)):
+            query.select(func).to_list()
+    else:
+        assert _to_comparable(query.select(func).to_list()) == _to_comparable(expected)
+
+def test_fallback_not_compiled():
+    query = ColumnarQuery(RECORDS).where(lambda x: len(x['s']) > 1)
+    assert query.to_list() == [r for r in RECORDS if len(r['s']) > 1]
+    assert query.select(lambda x: x['a']).to_list() == [1, 5, 5]
+
+def test_chain():
+    query = ColumnarQuery(RECORDS) \
+        .where(lambda x: x['a'] >= 0) \
+        .where(lambda x: x['s'] != 'x') \
+        .select(lambda x: x['a'] * 10) \
+        .where(lambda x: x < 50)
+    assert query.to_list() == [10]
+    assert list(query) == [10]
+
+def test_short_circuit():
+    empty = {}
+    query = ColumnarQuery(RECORDS).where(lambda x: x['a'] > -5 or empty['k'] == 1)
+    assert query.to_list() == RECORDS
+    assert query.count() == 5
+    query = ColumnarQuery(RECORDS).select(lambda x: x['a'] < -5 and empty['k'])
+    assert query.to_list() == [False] * 5
+    # raise like python
+    with pytest.raises(KeyError):
+        ColumnarQuery(RECORDS).where(lambda x: x['a'] > 0 or empty['k'] == 1).to_list()
+
+def test_closure_is_read_on_execute():
+    value = 0
+    query = ColumnarQuery(RECORDS).where(lambda x: x['a'] > value)
+    assert query.count() == 3
+    value = 1
+    assert query.count() == 2
+
+def test_calls_not_evaluated_when_build():
+    calls = []
+    def probe():
+        calls.append(1)
+        return 0
+    query = ColumnarQuery(RECORDS).where(lambda x: x['a'] > probe())
+    assert calls == []
+    assert query.count() == 3
+
+def test_reduce():
+    query = ColumnarQuery(RECORDS)
+    assert query.count() == 5
+    assert query.count(lambda x: x['f']) == 3
+    assert query.sum(lambda x: x['a']) == 8
+    assert query.sum(lambda x: x['f']) == 3
+    assert query.min(lambda x: x['a']) == -3
+    assert query.max(lambda x: x['s']) == 'x'
+    assert query.min(lambda x: x['s']) == ''
+    assert query.average(lambda x: x['a']) == 8 / 5
+    assert query.where(lambda x: x['a'] > 0).sum(lambda x: x['b']) == 2.5 - 7.25 + 1.0
+    selected = query.select(lambda x: x['a'])
+    assert selected.max() == 5
+    assert selected.sum() == 8
+    assert isinstance(selected.sum(), int)
+
+def test_reduce_fallback():
+    query = ColumnarQuery(RECORDS)
+    assert query.sum(lambda x: x['big']) == sum(r['big'] for r in RECORDS)
+    # nan
+    assert str(query.max(lambda x: x['b'])) == str(max(r['b'] for r in RECORDS))
+    empty = query.where(lambda x: x['a'] > 100)
+    assert empty.sum(lambda x: x['a']) == 0
+    with pytest.raises(ValueError):
+        empty.min(lambda x: x['a'])
+    with pytest.raises(ValueError):
+        empty.average(lambda x: x['a'])
+    # the rows are the records
+    with pytest.raises(TypeError):
+        query.sum()
+
+def test_records_not_all_dict():
+    records = [{'a': 1}, {'b': 2}, {'a': 3}]
+    query = ColumnarQuery(records)
+    assert query.table.get_column('a') is None
+    with pytest.raises(KeyError):
+        query.select(lambda x: x['a']).to_list()
+    assert query.where(lambda x: 'a' in x).select(lambda x: x['a']).to_list() == [1, 3]
+
+def test_column_from_values():
+    assert Column.from_values([1, 2]).kind == 'int'
+    assert Column.from_values([1, 2.0]).kind == 'object'
+    assert Column.from_values([True, 1]).kind == 'object'
+    assert Column.from_values([2 ** 60]).kind == 'object'
+    column = Column.from_values(['b', 'a', 'b'])
+    assert column.kind == 'str'
+    assert column.categories.tolist() == ['a', 'b']
+    assert column.to_list() == ['b', 'a', 'b']
+
+def test_conflict_predicate():
+    query = ColumnarQuery(RECORDS).where(lambda x: x['a'] > 5 and x['a'] < 1)
+    assert query.get_reduce_info().mode == query.get_reduce_info().MODE_EMPTY
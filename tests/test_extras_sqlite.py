@@ -7,7 +7,10 @@
 
 import sqlite3
 
+import pytest
+
 from lquery.extras.sqlite import new, SQLiteDbContext
+from lquery.iterable import IterableQuery
 
 def test_sqlite():
     conn = sqlite3.connect(':memory:')
@@ -24,3 +27,54 @@ def test_sqlite():
     assert len(table.query().to_list()) == 3
     query = table.query().where(lambda x: x.trans == 'BUY2').select(lambda x: x.date)
     assert set(query) == set(['2016-01-05', '2017-01-05'])
+
+def test_sqlite_insert_chunked_query():
+    conn = sqlite3.connect(':memory:')
+    context = SQLiteDbContext(conn)
+    conn.cursor().execute('CREATE TABLE numbers (value int, text text)')
+    conn.commit()
+    table = context.table('numbers')
+    table.INSERT_CHUNK_SIZE = 7
+    table.insert_many(IterableQuery(range(100), chunk_size=16)
+                      .where(lambda x: x % 3 == 0)
+                      .select(lambda x: new(value=x, text=str(x))))
+    table.insert_many(new(value=x, text='') for x in range(100, 110))
+    assert [x.value for x in table.query().to_list()] == list(range(0, 100, 3)) + list(range(100, 110))
+
+def test_sqlite_order_by():
+    conn = sqlite3.connect(':memory:')
+    context = SQLiteDbContext(conn)
+    conn.cursor().execute('CREATE TABLE rows (a int, b text, c real)')
+    conn.commit()
+    table = context.table('rows')
+    rows = [new(a=i % 3, b=str(i % 4), c=float(i)) for i in range(20)]
+    table.insert_many(rows)
+
+    def as_tuples(items):
+        return [(x.a, x.b, x.c) for x in items]
+
+    for make_query in [
+            lambda q: q.order_by(lambda x: x.a),
+            lambda q: q.order_by_descending(lambda x: x.b).then_by(lambda x: x.a),
+            lambda q: q.order_by(lambda x: x.a).then_by_descending(lambda x: x.b),
+            lambda q: q.order_by(lambda x: x.b).order_by_descending(lambda x: x.a),
+            lambda q: q.order_by(lambda x: x.c).order_by(lambda x: x.a).then_by_descending(lambda x: x.b),
+            lambda q: q.order_by_descending(lambda x: x.a).order_by(lambda x: x.a).then_by(lambda x: x.b),
+        ]:
+        query = make_query(table.query())
+        assert 'ORDER BY' in query.get_sqlstr()
+        assert as_tuples(query) == as_tuples(make_query(IterableQuery(rows)))
+
+    query = table.query().order_by_descending(lambda x: x.b).then_by(lambda x: x.a)
+    assert query.get_sqlstr() == 'SELECT * FROM rows ORDER BY "b" DESC, "a", rowid'
+    expected = IterableQuery(rows).order_by_descending(lambda x: x.b).then_by(lambda x: x.a).take(3)
+    assert as_tuples(query.take(3)) == as_tuples(expected)
+    assert query.first().c == 3.0
+    query = table.query().order_by(lambda x: x.c).order_by(lambda x: x.a).then_by_descending(lambda x: x.b)
+    assert query.get_sqlstr() == 'SELECT * FROM rows ORDER BY "a", "b" DESC, "c", rowid'
+
+    # sort in memory
+    query = table.query().order_by(lambda x: x.a).then_by(lambda x: -x.c)
+    assert as_tuples(query) == as_tuples(IterableQuery(rows).order_by(lambda x: x.a).then_by(lambda x: -x.c))
+    with pytest.raises(AttributeError):
+        table.query().order_by(lambda x: x.d).to_list()
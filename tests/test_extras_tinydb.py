@@ -11,9 +11,9 @@ import unittest
 
 import pytest
 
-from tinydb import TinyDB
+from tinydb import TinyDB, Query
 from tinydb.storages import MemoryStorage
-from lquery.extras.tinydb import TinyDbQuery, patch
+from lquery.extras.tinydb import TinyDbQuery, NextTinyDbQuery, patch
 
 def get_example_db_1():
     db = TinyDB(storage=MemoryStorage)
@@ -68,6 +68,31 @@ def test_get_items_by_doc_id():
     query = TinyDbQuery(table)
     assert query.where(lambda x: x.doc_id == 2).to_list() == [{'int': 1, 'char': 'b'}]
     assert query.where(lambda x: x.doc_id == 8).to_list() == []
+    # the values which equals a int
+    assert query.where(lambda x: x.doc_id == 2.0).to_list() == [{'int': 1, 'char': 'b'}]
+    assert query.where(lambda x: x.doc_id in [2.5, '2', float('nan'), 3.0]).to_list() == [{'int': 2, 'char': 'b'}]
+
+def test_get_items_by_doc_id_lookup():
+    db = get_example_db_1()
+    table = db.table()
+    query = TinyDbQuery(table)
+    ids = [3, 1, 9]
+
+    assert query.where(lambda x: x.doc_id == 2).doc_ids == frozenset([2])
+    assert query.where(lambda x: x.doc_id in ids).to_list() == [
+        {'int': 1, 'char': 'a'},
+        {'int': 2, 'char': 'b'}
+    ]
+    assert query.where(lambda x: x.doc_id in ids and x.char == 'b').to_list() == [
+        {'int': 2, 'char': 'b'}
+    ]
+    assert query.where(lambda x: x.char == 'b').where(lambda x: x.doc_id in ids).to_list() == [
+        {'int': 2, 'char': 'b'}
+    ]
+
+    query = query.where(lambda x: x.doc_id == 1).where(lambda x: x.doc_id == 2)
+    assert query.get_reduce_info().mode == query.get_reduce_info().MODE_EMPTY
+    assert query.to_list() == []
 
 def test_get_items_by_index_which_not_exists():
     db = get_example_db_1()
@@ -92,11 +117,8 @@ def test_get_items_by_index_deep():
     assert query.where(lambda x: x['dict']['key_not_exists'] == 1).to_list() == []
     assert query.where(lambda x: x['key_not_exists']['dict'] == 1).to_list() == []
 
-    with pytest.raises(TypeError):
-        # TypeError: argument of type 'int' is not iterable
-        # user should know `x['int']` is not a dict.
-        # I don't want call `isinstance` for each times.
-        assert query.where(lambda x: x['int']['dict'] == 1).to_list() == []
+    # `tinydb.Query` treat `x['int']` which is not a dict as not match.
+    assert query.where(lambda x: x['int']['dict'] == 1).to_list() == []
 
 def test_get_items_by_attr_deep():
     db = get_example_db_2()
@@ -143,6 +165,99 @@ def test_get_items_by_in():
     ]
     assert query.where(lambda x: 'item-some' in x.list).to_list() == []
 
+def test_where_to_tinydb_query():
+    db = get_example_db_2()
+    table = db.table()
+    query = TinyDbQuery(table)
+
+    assert query.where(lambda x: x.int == 1).cond == (Query()['int'] == 1)
+    assert query.where(lambda x: 1 < x['dict']['key']).cond == (Query()['dict']['key'] > 1)
+    assert query.where(lambda x: x.char in ['a', 'c']).cond == Query()['char'].one_of(('a', 'c'))
+    assert query.where(lambda x: x.int == 1 and not x.char == 'a').cond ==\
+        (Query()['int'] == 1) & ~(Query()['char'] == 'a')
+    assert query.where(lambda x: x.int == 1).where(lambda x: x.char == 'b').cond ==\
+        (Query()['int'] == 1) & (Query()['char'] == 'b')
+
+    assert query.where(lambda x: x.int == 1 or x.char == 'b').to_list() == [
+        {'int': 1, 'char': 'a', 'dict': {'key': 1}},
+        {'int': 1, 'char': 'b', 'dict': {'key': 2}},
+        {'int': 2, 'char': 'b', 'dict': {'key': 2}},
+    ]
+    assert query.where(lambda x: x.char not in ['a']).where(lambda x: 'key' in x.dict).to_list() == [
+        {'int': 1, 'char': 'b', 'dict': {'key': 2}},
+        {'int': 2, 'char': 'b', 'dict': {'key': 2}},
+    ]
+
+    # cache by tinydb
+    query.where(lambda x: x.int == 1).to_list()
+    assert (Query()['int'] == 1) in table._query_cache
+
+def test_where_to_tinydb_query_reduce_info():
+    db = get_example_db_1()
+    table = db.table()
+    reduce_info = TinyDbQuery(table)\
+        .where(lambda x: x.int == 1)\
+        .where(lambda x: x.doc_id > 1)\
+        .get_reduce_info()
+    assert [x.type for x in reduce_info.details] == [
+        reduce_info.TYPE_SRC, reduce_info.TYPE_SQL, reduce_info.TYPE_MEMORY
+    ]
+
+def test_take_and_terminal_methods():
+    db = get_example_db_1()
+    table = db.table()
+    query = TinyDbQuery(table)
+
+    assert query.take(2).limit == 2
+    assert query.take(2).take(1).limit == 1
+    assert query.where(lambda x: x.char == 'b').take(1).to_list() == [{'int': 1, 'char': 'b'}]
+    # where after take cannot merge into the condition:
+    assert query.take(1).where(lambda x: x.char == 'b').to_list() == []
+
+    assert query.count() == 3
+    assert query.count(lambda x: x.char == 'b') == 2
+    assert query.where(lambda x: x.int == 1).count(lambda x: x.char == 'b') == 1
+    assert query.take(2).count() == 2
+    assert query.where(lambda x: x.doc_id == 1).count(lambda x: x.doc_id == 2) == 0
+
+    assert query.any(lambda x: x.char == 'b') is True
+    assert query.any(lambda x: x.char == 'c') is False
+    assert query.where(lambda x: x.char == 'c').any() is False
+    assert query.first(lambda x: x.char == 'b') == {'int': 1, 'char': 'b'}
+    assert query.first_or_default(None, lambda x: x.char == 'c') is None
+    with pytest.raises(ValueError):
+        query.first(lambda x: x.char == 'c')
+
+def test_take_stop_reading():
+    db = get_example_db_1()
+    table = db.table()
+    query = TinyDbQuery(table)
+    readed = []
+    def predicate(value):
+        readed.append(value)
+        return True
+    cond = Query()['int'].test(predicate)
+    assert NextTinyDbQuery(query.expr, table, cond).with_limit(1).to_list() == [{'int': 1, 'char': 'a'}]
+    assert len(readed) == 1
+
+def test_fold_consts_once_per_execution():
+    db = get_example_db_1()
+    table = db.table()
+    calls = []
+    def get_min_doc_id():
+        calls.append(min_doc_id)
+        return min_doc_id
+    min_doc_id = 1
+    # `x.doc_id > ?` exec in memory:
+    query = TinyDbQuery(table).where(lambda x: x.doc_id > get_min_doc_id())
+    # the calls are not folded when the query is built.
+    assert calls == []
+    assert query.to_list() == [{'int': 1, 'char': 'b'}, {'int': 2, 'char': 'b'}]
+    assert calls == [1]
+    min_doc_id = 2
+    assert query.to_list() == [{'int': 2, 'char': 'b'}]
+    assert calls == [1, 2]
+
 def test_patch():
     db = get_example_db_1()
     table = db.table()
@@ -9,11 +9,20 @@ import sys
 import traceback
 import unittest
 import itertools
+import tempfile
+import threading
 
 import pytest
 
+from asq import query as asq_query
+
 from lquery import enumerable
 from lquery.funcs import LinqQuery
+from lquery.iterable import (
+    IterableQuery, ChunkedIterableQueryProvider, IndexedWhereQuery, IndexedOrderByQuery, GroupAggregateQuery, TopQuery,
+    ExternalOrderByQuery, SpillQuery, iter_chunks
+)
+from lquery import sorting, spill
 
 def query1() -> LinqQuery:
     return enumerable([
@@ -255,6 +264,569 @@ def test_not_exists_method():
     with pytest.raises(AttributeError):
         query1().some_not_exists_method()
 
+@pytest.mark.parametrize('chunk_size', [1, 3, 4, 100])
+def test_chunked_query(chunk_size):
+    items = list(range(10))
+    query = IterableQuery(items, chunk_size=chunk_size)
+    assert isinstance(query.provider, ChunkedIterableQueryProvider)
+    query = query.where(lambda x: x % 2).select(lambda x: x * 10).where(lambda x: x > 10)
+    assert query.to_list() == [30, 50, 70, 90]
+    assert list(query) == [30, 50, 70, 90]
+    assert query.order_by_descending().take(2).to_list() == [90, 70]
+    assert query.count() == 4
+    # not a list
+    assert IterableQuery(iter(items), chunk_size=chunk_size).select(lambda x: -x).to_list() == \
+        [-x for x in items]
+
+def test_chunked_query_apply_on_chunks():
+    calls = []
+    def predicate(x):
+        calls.append(x)
+        return True
+    query = IterableQuery(range(10), chunk_size=4).where(predicate)
+    assert next(iter(query)) == 0
+    assert calls == [0, 1, 2, 3]
+    assert [len(c) for c in iter_chunks(query, 100)] == [4, 4, 2]
+
+def test_chunked_query_empty():
+    assert IterableQuery([1, 2], chunk_size=2).where(lambda x: x > 5).to_list() == []
+    assert IterableQuery([], chunk_size=2).select(lambda x: x).to_list() == []
+
+def test_chunked_query_invalid_chunk_size():
+    with pytest.raises(ValueError):
+        IterableQuery([], chunk_size=0)
+
+def test_iter_chunks():
+    assert list(iter_chunks([1, 2, 3], 2)) == [[1, 2], [3]]
+    assert list(iter_chunks(iter([1, 2, 3]), 2)) == [[1, 2], [3]]
+    assert list(iter_chunks(IterableQuery([1, 2, 3]), 2)) == [[1, 2], [3]]
+
+
+class Row:
+    def __init__(self, id_, name):
+        self.id = id_
+        self.name = name
+
+    def __repr__(self):
+        return f'Row({self.id!r}, {self.name!r})'
+
+def test_index_by():
+    rows = [Row(i % 5, str(i)) for i in range(20)]
+    query = IterableQuery(rows).index_by(lambda x: x.id)
+    key = 3
+    where_query = query.where(lambda x: x.id == key)
+    assert isinstance(where_query, IndexedWhereQuery)
+    assert [r.name for r in where_query] == ['3', '8', '13', '18']
+    key = 4
+    assert [r.name for r in where_query] == ['4', '9', '14', '19']
+    assert [r.name for r in query.where(lambda x: 2 == x.id and x.name > '5')] == ['7']
+    assert [r.name for r in query.where(lambda x: x.id in (1, 0, 1)).take(3)] == ['0', '1', '5']
+    assert query.where(lambda x: x.id == 7).to_list() == []
+    assert query.where(lambda x: x.id == 1).select(lambda x: x.name).to_list() == ['1', '6', '11', '16']
+    # the calls are not looked up by the index
+    calls = []
+    def probe():
+        calls.append(1)
+        return 2
+    where_query = query.where(lambda x: x.id == probe())
+    assert not isinstance(where_query, IndexedWhereQuery) and calls == []
+    assert [r.name for r in where_query] == ['2', '7', '12', '17']
+
+def test_index_by_maintain_under_appends():
+    rows = [Row(1, 'a')]
+    query = IterableQuery(rows).index_by(lambda x: x.id)
+    where_query = query.where(lambda x: x.id == 1)
+    assert len(where_query.to_list()) == 1
+    rows.append(Row(1, 'b'))
+    rows.append(Row(2, 'c'))
+    assert [r.name for r in where_query] == ['a', 'b']
+    rows.pop(0)
+    assert [r.name for r in where_query] == ['b']
+    # the other modifies require rebuild
+    rows.remove(rows[0])
+    rows.append(Row(1, 'd'))
+    rows.insert(0, Row(1, 'e'))
+    rows.append(Row(3, 'f'))
+    assert query.rebuild_indexes() is query
+    assert [r.name for r in where_query] == ['e', 'd']
+    rows[0] = Row(2, 'g')
+    query.rebuild_indexes()
+    assert [r.name for r in where_query] == ['d']
+
+def test_index_by_rebuild_after_remove():
+    items = [1, 2, 3]
+    query = IterableQuery(items).index_by(lambda x: x)
+    assert query.where(lambda x: x == 3).to_list() == [3]
+    items.pop(0)
+    items.append(3)
+    # the last item is still `3`, so the change cannot be detected
+    query.rebuild_indexes()
+    assert query.where(lambda x: x == 3).to_list() == [3, 3]
+    sorted_query = IterableQuery(items).index_by(lambda x: x, ordered=True)
+    assert sorted_query.where(lambda x: x >= 3).to_list() == [3, 3]
+    items.pop(0)
+    items.append(3)
+    sorted_query.rebuild_indexes()
+    assert sorted_query.where(lambda x: x >= 3).to_list() == [3, 3, 3]
+
+def test_index_by_fallback_to_scan():
+    rows = [{'id': 1}, {'id': [2]}, {'id': 1}]
+    query = IterableQuery(rows).index_by(lambda x: x['id'])
+    # the key of a item is unhashable
+    assert query.where(lambda x: x['id'] == 1).to_list() == [{'id': 1}, {'id': 1}]
+    rows = [{'id': 1}, {}]
+    query = IterableQuery(rows).index_by(lambda x: x['id'])
+    with pytest.raises(KeyError):
+        query.where(lambda x: x['id'] == 1).to_list()
+    # unhashable lookup value
+    query = IterableQuery([{'id': 1}]).index_by(lambda x: x['id'])
+    assert query.where(lambda x: x['id'] in [[1], 1]).to_list() == [{'id': 1}]
+
+def test_index_by_not_used():
+    query = IterableQuery([Row(1, 'a')]).index_by(lambda x: x.id)
+    assert not isinstance(query.where(lambda x: x.name == 'a'), IndexedWhereQuery)
+    assert not isinstance(query.where(lambda x: x.id == 1 or x.name == 'a'), IndexedWhereQuery)
+    assert not isinstance(query.where(lambda x: x.id == x.name), IndexedWhereQuery)
+    with pytest.raises(ValueError):
+        query.index_by(lambda x: x.id + 1)
+    with pytest.raises(TypeError):
+        IterableQuery(iter([])).index_by(lambda x: x)
+
+def test_index_by_chunked_query():
+    query = IterableQuery([Row(i % 3, str(i)) for i in range(9)], chunk_size=2).index_by(lambda x: x.id)
+    assert query.where(lambda x: x.id == 2).select(lambda x: x.name).to_list() == ['2', '5', '8']
+
+def test_sorted_index_range():
+    rows = [Row(i % 10, str(i)) for i in range(30)]
+    query = IterableQuery(rows).index_by(lambda x: x.id, ordered=True)
+    lo, hi = 3, 5
+    where_query = query.where(lambda x: lo <= x.id < hi)
+    assert isinstance(where_query, IndexedWhereQuery)
+    assert where_query.to_list() == [r for r in rows if lo <= r.id < hi]
+    lo, hi = 8, 100
+    assert where_query.to_list() == [r for r in rows if 8 <= r.id]
+    # merged bounds
+    assert query.where(lambda x: x.id > 2 and x.id >= 4 and 6 > x.id and x.id <= 7).to_list() == \
+        [r for r in rows if 4 <= r.id < 6]
+    assert query.where(lambda x: x.id > 2 and x.id in [1, 3, 8] and x.name != '3').to_list() == \
+        [r for r in rows if r.id in (3, 8) and r.name != '3']
+    assert query.where(lambda x: x.id == 4).to_list() == [r for r in rows if r.id == 4]
+    # conflict bounds
+    lo, hi = 5, 5
+    assert where_query.to_list() == []
+
+def test_sorted_index_order_by():
+    rows = [Row(i % 3, str(i)) for i in range(7)]
+    query = IterableQuery(rows).index_by(lambda x: x.id, ordered=True)
+    order_by_query = query.order_by(lambda x: x.id)
+    assert isinstance(order_by_query, IndexedOrderByQuery)
+    # stable
+    assert [r.name for r in order_by_query] == ['0', '3', '6', '1', '4', '2', '5']
+    rows.append(Row(-1, 'a'))
+    rows.append(Row(1, 'b'))
+    assert [r.name for r in order_by_query] == ['a', '0', '3', '6', '1', '4', 'b', '2', '5']
+    assert order_by_query.select(lambda x: x.id).take(2).to_list() == [-1, 0]
+    # remove then append require rebuild
+    del rows[:2]
+    rows.extend([Row(5, 'c'), Row(0, 'd')])
+    query.rebuild_indexes()
+    assert [r.name for r in order_by_query] == ['a', '3', '6', 'd', '4', 'b', '2', '5', 'c']
+    assert not isinstance(query.order_by(lambda x: x.name), IndexedOrderByQuery)
+    values = IterableQuery([3, 1, 2]).index_by(lambda x: x, ordered=True)
+    assert values.order_by().to_list() == [1, 2, 3]
+
+def test_sorted_index_fallback_to_scan():
+    # cannot be ordered
+    rows = [{'id': 1}, {'id': 'a'}, {'id': 2}]
+    query = IterableQuery(rows).index_by(lambda x: x['id'], ordered=True)
+    assert query.where(lambda x: x['id'] == 'a').to_list() == [{'id': 'a'}]
+    with pytest.raises(TypeError):
+        query.where(lambda x: x['id'] > 1).to_list()
+    with pytest.raises(TypeError):
+        query.order_by(lambda x: x['id']).to_list()
+    rows[1]['id'] = 3
+    query.indexes[(('index', 'id'), )].rebuild()
+    assert query.where(lambda x: x['id'] > 1).to_list() == [{'id': 3}, {'id': 2}]
+    # the value cannot be compared with the keys
+    with pytest.raises(TypeError):
+        query.where(lambda x: x['id'] < 'b').to_list()
+    # `in` a str
+    query = IterableQuery(['a', 'b', 'ab']).index_by(lambda x: x, ordered=True)
+    assert query.where(lambda x: x in 'abc').to_list() == ['a', 'b', 'ab']
+
+OUTER = [Row(i % 4, f'o{i}') for i in range(10)]
+INNER = [Row(i % 6, f'i{i}') for i in range(15)] + [Row(1, 'skewed')] * 5
+
+def _by_id(x):
+    return x.id
+
+JOIN_CASES = [
+    ('hash', lambda: IterableQuery(INNER), lambda: IterableQuery(OUTER)),
+    ('hash', lambda: IterableQuery(iter(OUTER)), lambda: iter(INNER)),
+    ('hash-outer', lambda: IterableQuery(OUTER), lambda: iter(INNER)),
+    ('hash-outer', lambda: IterableQuery(OUTER[:3]), lambda: INNER),
+    ('hash-outer', lambda: IterableQuery(iter(OUTER), size_hint=10), lambda: IterableQuery(INNER)),
+    ('merge',
+        lambda: IterableQuery(OUTER).order_by(_by_id),
+        lambda: IterableQuery(INNER).order_by(lambda r: r.id)),
+    ('merge',
+        lambda: IterableQuery(OUTER).index_by(_by_id, ordered=True).order_by(_by_id),
+        lambda: IterableQuery(INNER).order_by(_by_id)),
+    ('index', lambda: IterableQuery(OUTER), lambda: IterableQuery(INNER).index_by(_by_id)),
+    ('index', lambda: IterableQuery(OUTER), lambda: IterableQuery(INNER).index_by(_by_id, ordered=True)),
+]
+
+@pytest.mark.parametrize('strategy,make_outer,make_inner', JOIN_CASES)
+def test_join(strategy, make_outer, make_inner):
+    result_selector = lambda o, i: (o.name, i.name)
+    query = make_outer().join(make_inner(), _by_id, _by_id, result_selector)
+    assert query.strategy == strategy
+    expected = asq_query(list(make_outer())).join(list(make_inner()), _by_id, _by_id, result_selector)
+    assert query.to_list() == expected.to_list()
+
+@pytest.mark.parametrize('strategy,make_outer,make_inner', JOIN_CASES)
+def test_group_join(strategy, make_outer, make_inner):
+    result_selector = lambda o, g: (o.name, g.key, [x.name for x in g])
+    query = make_outer().group_join(make_inner(), _by_id, _by_id, result_selector)
+    assert query.strategy == strategy
+    expected = asq_query(list(make_outer())).group_join(list(make_inner()), _by_id, _by_id, result_selector)
+    assert query.to_list() == expected.to_list()
+
+def test_join_plan():
+    query = IterableQuery([1, 2, 3])
+    assert query.join([1, 2]).strategy == 'hash'
+    assert query.join(iter([1, 2])).strategy == 'hash-outer'
+    assert query.where(lambda x: x > 1).join([1, 2]).strategy == 'hash'
+    assert query.order_by().join(IterableQuery([2, 1]).order_by()).strategy == 'merge'
+    assert query.order_by().join(IterableQuery([2, 1])).strategy == 'hash'
+    assert query.order_by(lambda x: -x).join(IterableQuery([2, 1]).order_by()).strategy == 'hash'
+    assert query.join(IterableQuery([2, 1]).index_by(lambda x: x)).strategy == 'index'
+    assert query.join([1, 2], result_selector=lambda o, i: o + i).where(lambda x: x > 2).to_list() == [4]
+    # let `asq` raise the errors
+    with pytest.raises(TypeError):
+        query.join(1).to_list()
+    with pytest.raises(TypeError):
+        query.join([1], outer_key_selector=1).to_list()
+    # unhashable keys
+    with pytest.raises(TypeError):
+        query.join([[1]], inner_key_selector=lambda x: x).to_list()
+    indexed = IterableQuery([[1], [2]]).index_by(lambda x: x)
+    assert IterableQuery([[2]]).join(indexed).to_list() == [([2], [2])]
+
+GROUP_ROWS = [{'k': i % 4, 'v': (i * 7) % 10, 's': str(i)} for i in range(30)]
+
+AGGREGATE_SELECTORS = [
+    lambda g: (g.key, g.count()),
+    lambda g: [g.key, len(g), g.sum(lambda x: x['v']), g.average(lambda x: x['v'])],
+    lambda g: {'min': g.min(lambda x: x['v']), 'max': g.max(lambda x: x['s']), 'first': g.first()['s']},
+    lambda g: g.sum(lambda x: x['v']) / g.count() + g.key,
+    lambda g: str(g.key) + ':' + str(g.max(lambda x: x['v'] * 2)),
+]
+
+@pytest.mark.parametrize('selector', AGGREGATE_SELECTORS)
+def test_group_by_aggregate(selector):
+    key = lambda x: x['k']
+    query = IterableQuery(GROUP_ROWS).group_by(key).select(selector)
+    assert isinstance(query, GroupAggregateQuery)
+    assert query.to_list() == asq_query(GROUP_ROWS).group_by(key).select(selector).to_list()
+
+def test_group_by_aggregate_result_selector():
+    key, element = lambda x: x['k'], lambda x: x['v']
+    result_selector = lambda k, g: (k, sum(g), min(g), max(g), len(g))
+    query = IterableQuery(GROUP_ROWS).group_by(key, element, result_selector)
+    assert isinstance(query, GroupAggregateQuery)
+    assert query.to_list() == asq_query(GROUP_ROWS).group_by(key, element, result_selector).to_list()
+    # iterators are consumed once
+    query = IterableQuery(iter(GROUP_ROWS)).group_by(key, element, result_selector)
+    assert query.to_list() == asq_query(GROUP_ROWS).group_by(key, element, result_selector).to_list()
+
+def test_group_by_aggregate_closure_is_read_on_execute():
+    selector = lambda x: x['v']
+    query = IterableQuery(GROUP_ROWS).group_by(lambda x: x['k']).select(lambda g: g.sum(selector))
+    assert isinstance(query, GroupAggregateQuery)
+    expected = asq_query(GROUP_ROWS).group_by(lambda x: x['k']).select(lambda g: g.sum(lambda x: x['v'])).to_list()
+    assert query.to_list() == expected
+    selector = lambda x: x['v'] * 2
+    assert query.to_list() == [x * 2 for x in expected]
+
+def test_group_by_aggregate_not_used():
+    query = IterableQuery(GROUP_ROWS).group_by(lambda x: x['k'])
+    for selector in [
+            lambda g: list(g),
+            lambda g: g.to_list(),
+            lambda g: g.count(lambda x: x['v'] > 1),
+            lambda g: g.sum(lambda x: x['v'] + g.key),
+            lambda g: g,
+        ]:
+        assert not isinstance(query.select(selector), GroupAggregateQuery)
+        expected = asq_query(GROUP_ROWS).group_by(lambda x: x['k']).select(selector).to_list()
+        assert query.select(selector).to_list() == expected
+    assert not isinstance(IterableQuery(GROUP_ROWS).group_by(lambda x: x['k'], result_selector=lambda k, g: list(g)),
+                          GroupAggregateQuery)
+    with pytest.raises(TypeError):
+        IterableQuery([[1]]).group_by().select(lambda g: g.count()).to_list()
+
+# many items have the same key, so the stability of the orders is tested.
+TOP_ROWS = [{'k': (i * 7) % 5, 'v': i} for i in range(40)]
+
+TOP_CHAINS = [
+    lambda q: q.order_by(lambda x: x['k']),
+    lambda q: q.order_by_descending(lambda x: x['k']),
+    lambda q: q.order_by(lambda x: x['k']).where(lambda x: x['v'] % 3).select(lambda x: x['v']),
+    lambda q: q.order_by_descending(lambda x: x['k']).select(lambda x: x['v']).where(lambda x: x > 20),
+    lambda q: q.select(lambda x: x['v'] % 9).order_by(),
+    lambda q: q.order_by(lambda x: x['k']).then_by_descending(lambda x: x['v'] % 3),
+    lambda q: q.order_by_descending(lambda x: x['k']).then_by_descending(lambda x: x['v'] % 4).select(lambda x: x['v']),
+]
+
+@pytest.mark.parametrize('chain', TOP_CHAINS)
+@pytest.mark.parametrize('count', [0, 1, 3, 10, 100, -1])
+def test_order_by_take(chain, count):
+    query = chain(IterableQuery(TOP_ROWS)).take(count)
+    assert isinstance(query, TopQuery)
+    assert query.to_list() == chain(asq_query(TOP_ROWS)).take(count).to_list()
+    query = chain(IterableQuery(TOP_ROWS, chunk_size=7)).take(count)
+    assert isinstance(query, TopQuery)
+    assert query.to_list() == chain(asq_query(TOP_ROWS)).take(count).to_list()
+
+@pytest.mark.parametrize('chain', TOP_CHAINS)
+def test_order_by_first_last(chain):
+    predicate = lambda x: x != 4
+    for items in (TOP_ROWS, []):
+        for name in ('first', 'last', 'first_or_default', 'last_or_default'):
+            for args in ((), (predicate, )):
+                if name.endswith('_or_default'):
+                    args = (None, ) + args
+                # the ordered queryable of `asq` can be iterated only once.
+                expected = lambda: getattr(chain(asq_query(items)), name)(*args)
+                if items or name.endswith('_or_default'):
+                    assert getattr(chain(IterableQuery(items)), name)(*args) == expected()
+                else:
+                    with pytest.raises(ValueError):
+                        getattr(chain(IterableQuery(items)), name)(*args)
+
+def test_order_by_top_not_used():
+    assert not isinstance(IterableQuery(TOP_ROWS).order_by(lambda x: x['k']).skip(1).take(2), TopQuery)
+    indexed = IterableQuery(TOP_ROWS).index_by(lambda x: x['k'], ordered=True)
+    assert not isinstance(indexed.order_by(lambda x: x['k']).take(2), TopQuery)
+    assert indexed.order_by(lambda x: x['k']).take(2).to_list() == \
+        asq_query(TOP_ROWS).order_by(lambda x: x['k']).take(2).to_list()
+    assert indexed.order_by(lambda x: x['k']).last() == asq_query(TOP_ROWS).order_by(lambda x: x['k']).last()
+    # let `asq` raise the error.
+    with pytest.raises(TypeError):
+        IterableQuery([{}, 1]).order_by().take(1).to_list()
+
+SORT_ROWS = [{'k': i % 3, 's': 'abcd'[i % 4], 'f': (i % 5) / 2, 'v': i} for i in range(30)]
+
+SORT_CHAINS = [
+    lambda q: q.order_by(lambda x: x['k']).then_by(lambda x: x['s']),
+    lambda q: q.order_by(lambda x: x['k']).then_by_descending(lambda x: x['s']),
+    lambda q: q.order_by_descending(lambda x: x['s']).then_by(lambda x: x['f']),
+    lambda q: q.order_by_descending(lambda x: x['k']).then_by_descending(lambda x: x['f']),
+    lambda q: q.order_by(lambda x: x['k']).then_by_descending(lambda x: x['f']).then_by(lambda x: -x['v']),
+    lambda q: q.order_by(lambda x: x['s']).then_by_descending(lambda x: (x['k'], x['s'])),
+    lambda q: q.order_by(lambda x: x['k']).order_by_descending(lambda x: x['s']),
+]
+
+@pytest.mark.parametrize('chain', SORT_CHAINS)
+def test_then_by(chain):
+    expected = chain(asq_query(SORT_ROWS)).to_list()
+    assert chain(IterableQuery(SORT_ROWS)).to_list() == expected
+    assert chain(enumerable(SORT_ROWS)).to_list() == expected
+    query = chain(IterableQuery(SORT_ROWS))
+    # the query can be executed many times
+    assert query.to_list() == query.to_list()
+    assert chain(IterableQuery(SORT_ROWS)).take(5).to_list() == expected[:5]
+    assert chain(IterableQuery(SORT_ROWS)).last() == expected[-1]
+
+def test_sort_generator_once():
+    for make_query in [
+            lambda q: q.order_by(lambda x: x['k']).then_by(lambda x: x['s']).select(lambda x: x['v']),
+            lambda q: q.order_by(lambda x: x['k']).take(3).select(lambda x: x['v']),
+            lambda q: IterableQuery(SORT_ROWS[:5]).join(q, lambda x: x['v'], lambda x: x['v']).select(lambda x: x),
+        ]:
+        expected = make_query(asq_query(SORT_ROWS)).to_list()
+        assert make_query(IterableQuery(iter(SORT_ROWS))).to_list() == expected
+        assert make_query(IterableQuery(iter(SORT_ROWS), sort_budget=4)).to_list() == expected
+
+def test_then_by_errors():
+    with pytest.raises(TypeError):
+        IterableQuery(SORT_ROWS).then_by(lambda x: x['k']).to_list()
+    with pytest.raises(TypeError):
+        IterableQuery(SORT_ROWS).order_by(lambda x: x['k']).where(lambda x: x).then_by(lambda x: x['k']).to_list()
+    with pytest.raises(TypeError):
+        enumerable(SORT_ROWS).then_by(lambda x: x['k'])
+    with pytest.raises(TypeError):
+        enumerable(SORT_ROWS).order_by(lambda x: x['k']).then_by(1)
+    with pytest.raises(TypeError):
+        IterableQuery([{}, 1]).order_by(lambda x: 1).then_by_descending(lambda x: x).to_list()
+
+@pytest.mark.parametrize('chain', SORT_CHAINS + TOP_CHAINS[:2])
+@pytest.mark.parametrize('sort_budget', [1, 4, 29, 30, 100])
+def test_external_sort(chain, sort_budget, monkeypatch):
+    # merge by many passes
+    monkeypatch.setattr(sorting, '_MAX_MERGE_RUNS', 3)
+    expected = chain(asq_query(SORT_ROWS)).to_list()
+    query = chain(IterableQuery(SORT_ROWS, sort_budget=sort_budget))
+    assert isinstance(query, ExternalOrderByQuery)
+    assert query.to_list() == expected
+    assert chain(IterableQuery(iter(SORT_ROWS), sort_budget=sort_budget, chunk_size=7)).to_list() == expected
+    assert query.where(lambda x: x['v'] % 2).select(lambda x: x['v']).to_list() == \
+        [x['v'] for x in expected if x['v'] % 2]
+    assert query.skip(3).take(sort_budget + 1).to_list() == expected[3:sort_budget + 4]
+    assert query.take(sort_budget + 1).to_list() == expected[:sort_budget + 1]
+    assert query.first() == expected[0]
+
+def test_external_sort_spill_files(monkeypatch):
+    files = []
+    create_file = tempfile.TemporaryFile
+    def temporary_file():
+        file = create_file()
+        files.append(file)
+        return file
+    monkeypatch.setattr(spill.tempfile, 'TemporaryFile', temporary_file)
+    query = IterableQuery(SORT_ROWS, sort_budget=8).order_by(lambda x: x['s'])
+    results = iter(query)
+    assert next(results) == asq_query(SORT_ROWS).order_by(lambda x: x['s']).first()
+    assert len(files) == 4 and not any(f.closed for f in files)
+    results.close()
+    assert all(f.closed for f in files)
+    # all items are in memory
+    files.clear()
+    assert IterableQuery(SORT_ROWS, sort_budget=31).order_by(lambda x: x['s']).to_list() == \
+        asq_query(SORT_ROWS).order_by(lambda x: x['s']).to_list()
+    assert not files
+
+def test_external_sort_errors():
+    with pytest.raises(ValueError):
+        IterableQuery(SORT_ROWS, sort_budget=0)
+    with pytest.raises(TypeError):
+        IterableQuery(SORT_ROWS, sort_budget=2).order_by(1).to_list()
+    with pytest.raises(TypeError):
+        IterableQuery([{}, 1], sort_budget=1).order_by().to_list()
+
+
+SPILL_ROWS = [{'k': (i * 7) % 23, 'v': i % 5, 's': str(i)} for i in range(60)]
+SECOND_ROWS = [{'k': (i * 5) % 31, 'v': i % 3, 's': str(i)} for i in range(40)]
+
+SPILL_CHAINS = [
+    lambda q: q.group_by(lambda x: x['k']).select(lambda g: (g.key, [x['s'] for x in g])),
+    lambda q: q.group_by(lambda x: x['k'], lambda x: x['v'], lambda k, g: (k, g.to_list())),
+    lambda q: q.group_by(lambda x: x['v']).select(lambda g: (g.key, g.count())),
+    lambda q: q.distinct(lambda x: x['k']),
+    lambda q: q.distinct(lambda x: (x['k'], x['v'])),
+    lambda q: q.union(SECOND_ROWS, lambda x: x['k']),
+    lambda q: q.intersect(SECOND_ROWS, lambda x: x['k']),
+    lambda q: q.intersect(iter(SECOND_ROWS), lambda x: x['v']),
+    lambda q: q.difference(SECOND_ROWS, lambda x: x['k']),
+    lambda q: q.difference(iter(SECOND_ROWS[:5]), lambda x: x['k']),
+    lambda q: q.join(SECOND_ROWS, lambda x: x['k'], lambda x: x['k'], lambda o, i: (o['s'], i['s'])),
+    lambda q: q.join(SECOND_ROWS, lambda x: x['v'], lambda x: x['v'], lambda o, i: (o['s'], i['s'])),
+    lambda q: q.group_join(iter(SECOND_ROWS), lambda x: x['k'], lambda x: x['k'],
+                           lambda o, g: (o['s'], g.key, [x['s'] for x in g])),
+    # the outer items without the inner items
+    lambda q: q.group_join([x for x in SECOND_ROWS if x['k'] % 3 == 0], lambda x: x['k'], lambda x: x['k'],
+                           lambda o, g: (o['s'], [x['s'] for x in g])),
+]
+
+@pytest.mark.parametrize('chain', SPILL_CHAINS)
+@pytest.mark.parametrize('spill_budget', [1, 3, 10, 100])
+def test_spill(chain, spill_budget, monkeypatch):
+    # partition by many passes
+    monkeypatch.setattr(spill, '_PARTITIONS', 3)
+    expected = chain(asq_query(SPILL_ROWS)).to_list()
+    query = chain(IterableQuery(SPILL_ROWS, spill_budget=spill_budget))
+    assert query.to_list() == expected
+    assert chain(IterableQuery(iter(SPILL_ROWS), spill_budget=spill_budget)).to_list() == expected
+    assert chain(IterableQuery(iter(SPILL_ROWS), spill_budget=spill_budget, chunk_size=7)).to_list() == expected
+    assert chain(IterableQuery(SPILL_ROWS, spill_budget=spill_budget)).take(3).to_list() == expected[:3]
+
+def test_spill_group_join_outer_only_partitions():
+    query = IterableQuery(range(40), spill_budget=1) \
+        .group_join(list(range(0, 80, 3)), lambda x: x, lambda y: y, lambda a, b: (a, list(b)))
+    expected = asq_query(range(40)) \
+        .group_join(list(range(0, 80, 3)), lambda x: x, lambda y: y, lambda a, b: (a, list(b))).to_list()
+    assert query.strategy == 'grace-hash'
+    assert query.to_list() == expected
+
+def test_spill_query():
+    query = IterableQuery(SPILL_ROWS, spill_budget=10)
+    assert isinstance(query.distinct(lambda x: x['k']), SpillQuery)
+    assert isinstance(query.group_by(lambda x: x['k']), SpillQuery)
+    assert query.join(SECOND_ROWS).strategy == 'grace-hash'
+    assert query.order_by(lambda x: x['k']).join(IterableQuery(SECOND_ROWS).order_by(lambda x: x['k']),
+                                                 lambda x: x['k'], lambda x: x['k']).strategy == 'merge'
+    # the aggregates are computed by the accumulators
+    assert isinstance(query.group_by(lambda x: x['k']).select(lambda g: g.count()), GroupAggregateQuery)
+    assert not isinstance(IterableQuery(SPILL_ROWS).distinct(lambda x: x['k']), SpillQuery)
+    assert IterableQuery(SPILL_ROWS).join(SECOND_ROWS).strategy != 'grace-hash'
+    # the queries can be executed many times
+    for make_query in SPILL_CHAINS[:7]:
+        spilled = make_query(IterableQuery(SPILL_ROWS, spill_budget=3))
+        assert spilled.to_list() == spilled.to_list() == make_query(asq_query(SPILL_ROWS)).to_list()
+
+def test_spill_stats(monkeypatch):
+    files = []
+    create_file = tempfile.TemporaryFile
+    def temporary_file():
+        file = create_file()
+        files.append(file)
+        return file
+    monkeypatch.setattr(spill.tempfile, 'TemporaryFile', temporary_file)
+    query = IterableQuery(SPILL_ROWS, spill_budget=30, sort_budget=30)
+    stats = query.provider.spill_stats
+    # the states are in the budget
+    assert query.distinct(lambda x: x['k']).count() == 23
+    assert query.join(SECOND_ROWS[:30], lambda x: x['s'], lambda x: x['s']).count() == 30
+    assert stats.spills == stats.files == stats.records == stats.bytes == 0
+    assert not files
+    # the states are larger than the budget
+    assert query.distinct(lambda x: x['s']).count() == 60
+    assert stats.spills == 1 and stats.files > 0 and stats.records >= 60 and stats.bytes > 0
+    assert all(f.closed for f in files)
+    query.order_by(lambda x: x['s']).to_list()
+    assert stats.spills == 2
+    assert 'spills=2' in repr(stats)
+    stats.reset()
+    assert stats.spills == stats.files == stats.records == stats.bytes == 0
+    # the temp files are closed even if the results are not exhausted
+    files.clear()
+    results = iter(query.group_by(lambda x: x['s']))
+    assert next(results).key == '0'
+    assert files and not all(f.closed for f in files)
+    results.close()
+    assert all(f.closed for f in files)
+
+def test_spill_errors():
+    with pytest.raises(ValueError):
+        IterableQuery(SPILL_ROWS, spill_budget=0)
+    with pytest.raises(TypeError):
+        IterableQuery(SPILL_ROWS, spill_budget=2).distinct(1).to_list()
+    with pytest.raises(TypeError):
+        IterableQuery(SPILL_ROWS, spill_budget=2).group_by(lambda x: x, result_selector=1).to_list()
+    with pytest.raises(TypeError):
+        IterableQuery(SPILL_ROWS, spill_budget=2).intersect(1).to_list()
+    # unhashable keys
+    with pytest.raises(TypeError):
+        IterableQuery(SPILL_ROWS, spill_budget=2).distinct().to_list()
+    with pytest.raises(TypeError):
+        IterableQuery(SPILL_ROWS, spill_budget=100).group_by().to_list()
+
+def test_spill_unpicklable_items():
+    items = [(i % 3, threading.Lock()) for i in range(10)]
+    # in the budget, the items are not pickled
+    assert IterableQuery(items, spill_budget=100).distinct(lambda x: x[0]).to_list() == items[:3]
+    assert IterableQuery(items, sort_budget=100).order_by(lambda x: x[0]).to_list()[0] is items[0]
+    with pytest.raises(TypeError, match='picklable'):
+        IterableQuery(items, spill_budget=2).group_by(lambda x: x[0]).to_list()
+    with pytest.raises(TypeError, match='picklable'):
+        IterableQuery(items, sort_budget=2).order_by(lambda x: x[0]).to_list()
+    # the spilled items are copies
+    rows = [{'k': i % 3} for i in range(10)]
+    result = IterableQuery(rows, sort_budget=2).order_by(lambda x: x['k']).to_list()
+    assert result == sorted(rows, key=lambda x: x['k'])
+    assert not any(r is x for r in result for x in rows)
+
 
 def main(argv=None):
     if argv is None:
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+#
+# ----------
+
+import sys
+import traceback
+import unittest
+import os
+import math
+import threading
+
+import pytest
+
+from asq import query as asq_query
+
+from lquery import enumerable
+from lquery.iterable import IterableQuery, iter_chunks
+from lquery import parallel
+from lquery.parallel import ParallelQueryProvider, dump_stages, combine_tree
+from lquery.funcs import LinqQuery
+
+ROWS = [{'k': i % 7, 'v': (i * 13) % 101, 's': str(i)} for i in range(500)]
+
+def get_pid(_):
+    return os.getpid()
+
+OFFSET = 5
+
+PARALLEL_CHAINS = [
+    lambda q: q.select(lambda x: x['v']),
+    lambda q: q.where(lambda x: x['k'] > 2).select(lambda x: (x['s'], math.sqrt(x['v']) + OFFSET)),
+    lambda q: q.where(lambda x: x['v'] > 1000),
+    lambda q: q.select(lambda x: x['v']).where(lambda x: x % 2).select(str),
+    lambda q: q.where(lambda x: x['k'] == 1).order_by(lambda x: x['v']).select(lambda x: x['s']),
+]
+
+@pytest.mark.parametrize('chain', PARALLEL_CHAINS)
+@pytest.mark.parametrize('chunk_size', [1, 64, 1000])
+def test_parallel(chain, chunk_size):
+    expected = chain(asq_query(ROWS)).to_list()
+    query = chain(IterableQuery(ROWS).as_parallel(workers=2, chunk_size=chunk_size))
+    assert query.to_list() == expected
+    assert list(query) == expected
+    assert chain(IterableQuery(iter(ROWS)).as_parallel(workers=2, chunk_size=chunk_size)).to_list() == expected
+    unordered = chain(IterableQuery(ROWS).as_parallel(workers=3, ordered=False, chunk_size=chunk_size))
+    assert sorted(unordered.to_list()) == sorted(expected)
+    assert query.take(3).to_list() == expected[:3]
+
+def test_parallel_in_workers():
+    pids = IterableQuery(range(100)).as_parallel(workers=2, chunk_size=10).select(get_pid).to_list()
+    assert os.getpid() not in pids
+    # the lambdas are sent as exprs
+    pids = IterableQuery(range(100)).as_parallel(workers=2, chunk_size=10).select(lambda x: os.getpid()).to_list()
+    assert os.getpid() not in pids
+
+def test_parallel_fallback():
+    lock = threading.Lock()
+    def use_lock(x):
+        with lock:
+            return x + 1
+    stages = [(LinqQuery.select, use_lock)]
+    assert dump_stages(stages) is None
+    query = IterableQuery(range(10)).as_parallel(workers=2, chunk_size=3)
+    assert query.select(use_lock).to_list() == list(range(1, 11))
+    assert query.select(use_lock).sum() == 55
+    # the closure value cannot be pickled
+    assert query.select(lambda x: (x, lock)[0]).to_list() == list(range(10))
+    # not a in-memory query
+    assert enumerable([1, 2]).as_parallel().select(lambda x: x + 1).to_list() == [2, 3]
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000])
+def test_parallel_reduce(chunk_size):
+    query = IterableQuery(ROWS).as_parallel(workers=2, chunk_size=chunk_size)
+    expected = asq_query(ROWS)
+    assert query.count() == expected.count()
+    assert query.count(lambda x: x['k'] == 3) == expected.count(lambda x: x['k'] == 3)
+    assert query.where(lambda x: x['k'] == 3).count() == expected.where(lambda x: x['k'] == 3).count()
+    assert query.sum(lambda x: x['v']) == expected.sum(lambda x: x['v'])
+    assert query.select(lambda x: x['v']).sum() == expected.sum(lambda x: x['v'])
+    assert query.min(lambda x: x['v']) == expected.min(lambda x: x['v'])
+    assert query.max(lambda x: (x['v'], x['s'])) == expected.max(lambda x: (x['v'], x['s']))
+    assert query.where(lambda x: x['v'] > 1000).count() == 0
+    assert query.where(lambda x: x['v'] > 1000).sum(lambda x: x['v']) == 0
+    with pytest.raises(ValueError):
+        query.where(lambda x: x['v'] > 1000).min(lambda x: x['v'])
+    with pytest.raises(TypeError):
+        query.sum(1)
+
+def test_parallel_reduce_without_stages(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError('the items should not be sent to the workers')
+    monkeypatch.setattr(parallel, 'ProcessPoolExecutor', no_pool)
+    assert IterableQuery(ROWS).as_parallel(workers=2).count() == len(ROWS)
+    assert IterableQuery(iter(ROWS)).as_parallel(workers=2).count() == len(ROWS)
+    assert IterableQuery(range(10)).as_parallel(workers=2).sum() == 45
+    assert IterableQuery(range(10)).as_parallel(workers=2).max() == 9
+
+def test_parallel_errors():
+    with pytest.raises(ValueError):
+        IterableQuery(ROWS).as_parallel(workers=0)
+    with pytest.raises(ValueError):
+        IterableQuery(ROWS).as_parallel(chunk_size=0)
+    # the errors in the workers
+    with pytest.raises(ZeroDivisionError):
+        IterableQuery([1, 0]).as_parallel(workers=2).select(lambda x: 1 / x).to_list()
+
+def test_parallel_provider():
+    query = IterableQuery(ROWS, sort_budget=10).as_parallel(workers=3, ordered=False, chunk_size=20)
+    provider = query.provider
+    assert isinstance(provider, ParallelQueryProvider)
+    assert (provider.workers, provider.ordered, provider.chunk_size, provider.sort_budget) == (3, False, 20, 10)
+    assert ParallelQueryProvider().workers == (os.cpu_count() or 1)
+    assert [len(c) for c in iter_chunks(query.select(lambda x: x['v']), 1)] == [20] * 25
+    assert combine_tree([1, 2, 3, 4, 5], lambda a, b: f'({a}+{b})') == '(((1+2)+(3+4))+5)'
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    try:
+        unittest.main()
+    except Exception:
+        traceback.print_exc()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2018~2999 - Cologler <skyoflw@gmail.com>
+# ----------
+#
+# ----------
+
+import sys
+import traceback
+import unittest
+import math
+import pickle
+import random
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from lquery import enumerable
+from lquery.iterable import IterableQuery
+from lquery.sketches import HyperLogLog, KLLSketch, hash64
+
+def make_values(count: int, keys: int, seed=0):
+    rand = random.Random(seed)
+    return [rand.randrange(keys) for _ in range(count)]
+
+def exact_quantile(values, q):
+    values = sorted(values)
+    return values[max(1, math.ceil(q * len(values))) - 1]
+
+def test_hash64():
+    assert hash64(1) == hash64(1.0) == hash64(True)
+    assert hash64('1') != hash64(1) != hash64(b'1')
+    assert hash64((1, 'a')) == hash64((1.0, 'a')) != hash64(('a', 1))
+    assert hash64(('ab', 'c')) != hash64(('a', 'bc'))
+    assert hash64(None) != hash64(0)
+    assert hash64(Decimal(1)) == hash64(Fraction(2, 2)) == hash64(1)
+    assert hash64(Decimal('1.5')) == hash64(Fraction(3, 2)) == hash64(1.5)
+    assert hash64(Decimal('0.1')) != hash64(0.1)
+    assert hash64(complex(2, 0)) == hash64(2) != hash64(complex(2, 1))
+    assert hash64(frozenset([1])) == hash64(frozenset([1]))
+    # same in all processes
+    assert hash64('a') == 1410542633125930404
+    with pytest.raises(TypeError):
+        hash64([1])
+
+@pytest.mark.parametrize('count,keys', [(0, 1), (10, 5), (1000, 1000), (50000, 20000), (200000, 200000)])
+def test_count_distinct(count, keys):
+    values = make_values(count, keys)
+    exact = len(set(values))
+    assert IterableQuery(values).count_distinct(approx=False) == exact
+    estimated = IterableQuery(values).count_distinct()
+    assert abs(estimated - exact) <= max(1, exact * 0.03)
+    rows = [{'k': x} for x in values]
+    assert enumerable(rows).count_distinct(lambda x: x['k']) == estimated
+    assert IterableQuery(iter(rows), chunk_size=7).count_distinct(lambda x: x['k']) == estimated
+
+def test_count_distinct_mixed_numbers():
+    values = [1, 1.0, Decimal(1), Fraction(1), True, 2, Decimal('2.0'), 2.5, Fraction(5, 2), Decimal('0.1'), 0.1]
+    assert len(set(values)) == 5
+    assert IterableQuery(values).count_distinct() == 5
+    assert IterableQuery(values).count_distinct(approx=False) == 5
+
+def test_count_distinct_errors():
+    with pytest.raises(TypeError):
+        IterableQuery([1]).count_distinct(1)
+    with pytest.raises(TypeError):
+        IterableQuery([[1]]).count_distinct()
+    with pytest.raises(TypeError):
+        IterableQuery([[1]]).count_distinct(approx=False)
+
+def test_hyperloglog_merge():
+    values = make_values(100000, 50000)
+    sketches = [HyperLogLog() for _ in range(4)]
+    for i, sketch in enumerate(sketches):
+        sketch.update(values[i::4])
+    merged = pickle.loads(pickle.dumps(sketches[0]))
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    whole = HyperLogLog()
+    whole.update(values)
+    assert len(merged) == len(whole)
+    with pytest.raises(ValueError):
+        HyperLogLog().merge(HyperLogLog(10))
+    with pytest.raises(ValueError):
+        HyperLogLog(3)
+
+@pytest.mark.parametrize('count', [1, 7, 199, 1000, 100000])
+@pytest.mark.parametrize('q', [0, 0.01, 0.25, 0.5, 0.9, 0.99, 1])
+def test_quantile(count, q):
+    values = make_values(count, 10000)
+    rows = [{'v': x} for x in values]
+    exact = exact_quantile(values, q)
+    assert IterableQuery(rows).quantile(lambda x: x['v'], q, approx=False) == exact
+    estimated = enumerable(rows).quantile(lambda x: x['v'], q)
+    if count < 200:
+        assert estimated == exact
+    else:
+        # the rank error
+        rank = sorted(values).index(estimated) / count
+        assert abs(rank - q) < 0.02 or estimated == exact
+    assert IterableQuery(iter(rows)).quantile(lambda x: x['v'], q) == estimated
+
+def test_quantile_errors():
+    with pytest.raises(ValueError):
+        IterableQuery([]).quantile(lambda x: x, 0.5)
+    with pytest.raises(ValueError):
+        IterableQuery([]).quantile(lambda x: x, 0.5, approx=False)
+    with pytest.raises(ValueError):
+        IterableQuery([1]).quantile(lambda x: x, 1.5)
+    with pytest.raises(TypeError):
+        IterableQuery([1]).quantile(0.5, 0.5)
+    with pytest.raises(ValueError):
+        KLLSketch(4)
+
+def test_kll_merge():
+    values = [float(x) for x in make_values(100000, 100000)]
+    sketches = [KLLSketch(seed=i) for i in range(4)]
+    for i, sketch in enumerate(sketches):
+        sketch.update(values[i * 25000:(i + 1) * 25000])
+    merged = pickle.loads(pickle.dumps(sketches[0]))
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    assert merged.count == len(values)
+    ordered = sorted(values)
+    for q in (0.1, 0.5, 0.9):
+        rank = ordered.index(merged.quantile(q)) / len(values)
+        assert abs(rank - q) < 0.02
+    # the state is not grown with the count of the values
+    assert sum(len(c) for c in merged._compactors) < 1000
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv
+    try:
+        unittest.main()
+    except Exception:
+        traceback.print_exc()
+
+if __name__ == '__main__':
+    main()